@@ -0,0 +1,237 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Declarative ACLs and quotas for directory trees in AFS. The tree is walked
+# lazily and processed in batches by a pool of workers which only call `fs
+# setacl` and `fs setquota` where the current state differs. `fs` uses the
+# tokens of the caller, so an administrator has to run `aklog` first.
+
+from __future__ import absolute_import
+import fnmatch
+import json
+import logging
+import os
+import time
+import plac
+from openafs_setup.openafs_setup_paths import PATH_MODES, openafs_paths
+from openafs_setup.openafs_setup_executor import EXECUTOR_LOCAL, parallel_default, step_timeout_default, Deadline, create_executor, run_parallel
+
+logger = logging.getLogger(__name__)
+
+batch_size_default = 1000
+RIGHTS_ALIASES = {
+    "all": "rlidwka",
+    "write": "rlidwk",
+    "read": "rl",
+    "none": "",
+}
+RIGHTS_ORDER = "rlidwkaABCDEFGH"
+
+def normalize_rights(rights):
+    """Converts `rights` (letters or one of `RIGHTS_ALIASES`) into the
+    canonical order of `fs listacl`."""
+    rights = RIGHTS_ALIASES.get(rights, rights)
+    unknown_rights = set(rights)-set(RIGHTS_ORDER)
+    if len(unknown_rights) > 0:
+        raise ValueError("rights '%s' contain unknown letters %s" % (rights, str(sorted(unknown_rights))))
+    return str.join("", [right for right in RIGHTS_ORDER if right in rights])
+
+def parse_fs_listacl(lines):
+    """Parses `fs listacl` output of a single directory into the tuple
+    `(normal, negative)` of dictionaries mapping users and groups to
+    rights."""
+    normal = {}
+    negative = {}
+    current = None
+    for line in lines:
+        stripped_line = line.strip()
+        if stripped_line == "Normal rights:":
+            current = normal
+        elif stripped_line == "Negative rights:":
+            current = negative
+        elif current is not None and stripped_line != "":
+            (name, rights) = stripped_line.rsplit(None, 1)
+            current[name] = normalize_rights(rights)
+    return (normal, negative)
+
+def parse_fs_listquota(lines):
+    """Returns the quota in KB of `fs listquota` output or `None` for volumes
+    without limit."""
+    for line in lines:
+        if line.startswith("Volume Name"):
+            continue
+        tokens = line.split()
+        if len(tokens) < 2:
+            continue
+        if tokens[1] == "no":
+            return None # `no limit`
+        return int(tokens[1])
+    raise ValueError("`fs listquota` output doesn't contain a volume line")
+
+def load_spec(spec_file_path):
+    """Loads and normalizes the JSON spec `{"rules": [{"pattern": <glob>,
+    "acl": {<name>: <rights>, ...}, "negative": {...}, "clear": <bool>,
+    "quota": <KB>}, ...]}`. Patterns are matched against paths relative to
+    the walked root (`.` for the root itself), the first matching rule
+    applies and `{name}` in ACL entries is replaced with the directory's
+    name. Rights `none` remove an entry, `clear` removes all entries which aren't part of the rule."""
+    with open(spec_file_path, "r") as spec_file:
+        spec = json.load(spec_file)
+    ret_value = []
+    for rule in spec.get("rules", []):
+        if not "pattern" in rule:
+            raise ValueError("rule %s doesn't have a pattern" % (str(rule),))
+        if rule.get("clear", False) and not rule.get("acl"):
+            raise ValueError("rule %s clears the ACL without specifying normal rights" % (str(rule),))
+        ret_value.append({
+            "pattern": rule["pattern"],
+            "acl": rule.get("acl"),
+            "negative": rule.get("negative"),
+            "clear": rule.get("clear", False),
+            "quota": rule.get("quota"),
+        })
+    return ret_value
+
+def match_rule(rules, relative_path):
+    for rule in rules:
+        if fnmatch.fnmatchcase(relative_path, rule["pattern"]):
+            return rule
+    return None
+
+def iter_tree(root_path, max_depth=None):
+    """Yields the tuple `(path, relative_path)` for `root_path` and all
+    directories below it, top-down and without reading the tree at once.
+    Symbolic links aren't followed."""
+    yield (root_path, ".")
+    for (dir_path, dir_names, file_names) in os.walk(root_path):
+        relative_dir_path = os.path.relpath(dir_path, root_path)
+        depth = 0 if relative_dir_path == "." else relative_dir_path.count(os.sep)+1
+        if max_depth is not None and depth >= max_depth:
+            del dir_names[:] # prevents `os.walk` from descending
+            continue
+        dir_names.sort()
+        for dir_name in dir_names:
+            yield (os.path.join(dir_path, dir_name), os.path.normpath(os.path.join(relative_dir_path, dir_name)))
+
+def iter_batches(iterable, batch_size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+def expand_acl(acl, name):
+    if acl is None:
+        return None
+    return dict([(entry.replace("{name}", name), normalize_rights(rights)) for (entry, rights) in acl.items()])
+
+def acl_matches(current, desired, clear):
+    """Checks whether the current ACL (normal or negative) satisfies the
+    desired one. Desired entries without rights mustn't exist, without
+    `clear` additional entries are kept."""
+    if desired is None:
+        return True
+    if clear:
+        return current == dict([(name, rights) for (name, rights) in desired.items() if rights != ""])
+    return all([current.get(name, "") == rights for (name, rights) in desired.items()])
+
+def setacl_cmds(fs, path, acl, negative=False, clear=False):
+    """Creates the `fs setacl` command for `acl`, entries with empty rights are
+    removed."""
+    ret_value = [fs, "setacl", "-dir", path, "-acl"]
+    for (name, rights) in sorted(acl.items()):
+        ret_value += [name, rights if rights != "" else "none"]
+    if clear:
+        ret_value.append("-clear")
+    if negative:
+        ret_value.append("-negative")
+    return ret_value
+
+def apply_rule(local_executor, fs, path, rule, dry_run=False):
+    """Applies `rule` to the directory `path` where it differs from the
+    current state. Returns the list of applied (or planned if `dry_run`)
+    commands."""
+    ret_value = []
+    name = os.path.basename(os.path.normpath(path))
+    desired_normal = expand_acl(rule["acl"], name)
+    desired_negative = expand_acl(rule["negative"], name)
+    if desired_normal is not None or desired_negative is not None:
+        (current_normal, current_negative) = parse_fs_listacl(local_executor.check_output([fs, "listacl", "-path", path]).splitlines())
+        if rule["clear"]:
+            # `-clear` removes the normal and negative entries, so both are set
+            if not acl_matches(current_normal, desired_normal, True) or not acl_matches(current_negative, desired_negative or {}, True):
+                ret_value.append(setacl_cmds(fs, path, desired_normal, clear=True))
+                if desired_negative:
+                    ret_value.append(setacl_cmds(fs, path, desired_negative, negative=True))
+        else:
+            if not acl_matches(current_normal, desired_normal, False):
+                ret_value.append(setacl_cmds(fs, path, desired_normal))
+            if not acl_matches(current_negative, desired_negative, False):
+                ret_value.append(setacl_cmds(fs, path, desired_negative, negative=True))
+    if rule["quota"] is not None:
+        if parse_fs_listquota(local_executor.check_output([fs, "listquota", "-path", path]).splitlines()) != rule["quota"]:
+            ret_value.append([fs, "setquota", "-path", path, "-max", str(rule["quota"])])
+    for cmds in ret_value:
+        if dry_run:
+            logger.info("would run '%s'" % (str.join(" ", cmds),))
+        else:
+            local_executor.check_call(cmds)
+    return ret_value
+
+@plac.annotations(path_mode=plac.Annotation("The path mode of the OpenAFS installation", "positional", type=str, choices=PATH_MODES),
+    spec_file_path=plac.Annotation("A JSON file containing the rules as `{\"rules\": [{\"pattern\": <glob relative to root>, \"acl\": {<name>: <rights>, ...}, \"negative\": {...}, \"clear\": <bool>, \"quota\": <KB>}, ...]}` (the first matching rule applies, `{name}` is replaced with the directory name)", "positional"),
+    root_path=plac.Annotation("The directory to walk", "positional"),
+    max_depth=plac.Annotation("The maximum depth below the root to walk (unlimited if omitted)", "option", type=int),
+    dry_run=plac.Annotation("A flag indicating that the changes ought to only be logged", "flag"),
+    parallel=plac.Annotation("The number of workers applying changes", "option", type=int),
+    batch_size=plac.Annotation("The number of directories read from the tree before they are handed to the workers", "option", type=int),
+    step_timeout=plac.Annotation("The time in seconds every command may take", "option", type=float),
+    timeout=plac.Annotation("The time in seconds the whole run may take (no limit if omitted)", "option", type=float),
+)
+def apply_acls(path_mode, spec_file_path, root_path, max_depth=None, dry_run=False, parallel=parallel_default, batch_size=batch_size_default, step_timeout=step_timeout_default, timeout=None):
+    fs = openafs_paths(path_mode)["fs"]
+    rules = load_spec(spec_file_path)
+    local_executor = create_executor(EXECUTOR_LOCAL, "localhost", deadline=Deadline(timeout), step_timeout=step_timeout)
+    start_time = time.time()
+    visited_count = 0
+    matched_count = 0
+    changed_count = 0
+    for batch in iter_batches(iter_tree(root_path, max_depth=max_depth), batch_size):
+        visited_count += len(batch)
+        matches = [(path, match_rule(rules, relative_path)) for (path, relative_path) in batch]
+        matches = dict([(path, rule) for (path, rule) in matches if rule is not None])
+        matched_count += len(matches)
+        results = run_parallel(lambda path: apply_rule(local_executor, fs, path, matches[path], dry_run=dry_run), sorted(matches.keys()), parallel=parallel)
+        changed_count += len([cmds_list for cmds_list in results.values() if len(cmds_list) > 0])
+        logger.info("processed %d directories, %d matched a rule, %d %s in %f s" % (visited_count, matched_count, changed_count, "need changes" if dry_run else "changed", time.time()-start_time))
+    return changed_count
@@ -0,0 +1,105 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Creation of `.backup` clones with `vos backupsys` sharded by server and
+# partition so that every shard only clones the volumes of its partition and
+# all shards run concurrently. The same shards can be installed as `bos` cron
+# instances for nightly clones.
+
+from __future__ import absolute_import
+import logging
+import time
+import plac
+from openafs_setup.openafs_setup_globals import split_list
+from openafs_setup.openafs_setup_paths import PATH_MODES, openafs_paths
+from openafs_setup.openafs_setup_executor import EXECUTOR_LOCAL, parallel_default, step_timeout_default, Deadline, create_executor, run_parallel
+from openafs_setup.openafs_setup_vos import parse_vos_listpart
+
+logger = logging.getLogger(__name__)
+
+cron_time_default = "2:00"
+cron_instance_prefix = "backupsys"
+
+def backupsys_cmds(vos, server, partition, prefixes, excludes, dry_run=False):
+    """Creates the `vos backupsys` command cloning the volumes on `partition`
+    of `server` whose names start with one of `prefixes` (all if empty)
+    except those starting with one of `excludes`."""
+    ret_value = [vos, "backupsys", "-server", server, "-partition", partition]
+    if len(prefixes) > 0:
+        ret_value += ["-prefix"]+prefixes
+    if len(excludes) > 0:
+        ret_value += ["-xprefix"]+excludes
+    if dry_run:
+        ret_value.append("-dryrun")
+    ret_value.append("-localauth")
+    return ret_value
+
+def cron_instance_name(partition):
+    return "%s-%s" % (cron_instance_prefix, partition.lstrip("/"))
+
+@plac.annotations(path_mode=plac.Annotation("The path mode of the OpenAFS installation", "positional", type=str, choices=PATH_MODES),
+    prefixes=plac.Annotation("A comma separated list of volume name prefixes to create backup volumes for (all volumes if omitted)", "option"),
+    excludes=plac.Annotation("A comma separated list of volume name prefixes to exclude", "option"),
+    install_cron=plac.Annotation("A flag indicating that a `bos` cron instance per server and partition ought to be created instead of cloning now", "flag"),
+    cron_time=plac.Annotation("The time of the day the cron instances run", "option"),
+    dry_run=plac.Annotation("A flag indicating that `vos backupsys` ought to only list the volumes it would clone", "flag"),
+    parallel=plac.Annotation("The maximum number of partitions to process concurrently", "option", type=int),
+    step_timeout=plac.Annotation("The time in seconds every command may take", "option", type=float),
+    timeout=plac.Annotation("The time in seconds all clones may take (no limit if omitted)", "option", type=float),
+    fileservers=plac.Annotation("The fileservers whose volumes ought to be cloned"),
+)
+def backup_volumes(path_mode, prefixes="", excludes="", install_cron=False, cron_time=cron_time_default, dry_run=False, parallel=parallel_default, step_timeout=step_timeout_default, timeout=None, *fileservers):
+    if len(fileservers) == 0:
+        raise ValueError("at least one fileserver has to be specified")
+    paths = openafs_paths(path_mode)
+    vos = paths["vos"]
+    bos = paths["bos"]
+    prefixes = split_list(prefixes)
+    excludes = split_list(excludes)
+    start_time = time.time()
+    local_executor = create_executor(EXECUTOR_LOCAL, "localhost", deadline=Deadline(timeout), step_timeout=step_timeout)
+    server_partitions = run_parallel(lambda fileserver: parse_vos_listpart(local_executor.check_output([vos, "listpart", fileserver, "-localauth"]).splitlines()), fileservers, parallel=parallel)
+    shards = [(fileserver, partition) for fileserver in fileservers for partition in server_partitions[fileserver]]
+    logger.info("processing %d partitions on %d fileservers" % (len(shards), len(fileservers)))
+    if install_cron:
+        def __install_cron__(shard):
+            (fileserver, partition) = shard
+            # `bos create` fails if the instance exists, so it's recreated in order to apply changed filters
+            local_executor.check_call([bos, "stop", fileserver, cron_instance_name(partition), "-localauth"], no_fail=True)
+            local_executor.check_call([bos, "delete", fileserver, cron_instance_name(partition), "-localauth"], no_fail=True)
+            local_executor.check_call([bos, "create", fileserver, cron_instance_name(partition), "cron",
+                "-cmd", str.join(" ", backupsys_cmds(vos, fileserver, partition, prefixes, excludes)), cron_time,
+                "-localauth"])
+        run_parallel(__install_cron__, shards, parallel=parallel)
+        logger.info("installed %d cron instances in %f s" % (len(shards), time.time()-start_time))
+    else:
+        run_parallel(lambda shard: local_executor.check_call(backupsys_cmds(vos, shard[0], shard[1], prefixes, excludes, dry_run=dry_run)), shards, parallel=parallel)
+        logger.info("cloned %d partitions in %f s" % (len(shards), time.time()-start_time))
+    return shards
@@ -0,0 +1,205 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Capacity report of the cell: partition usage, volume counts, growth since
+# the previous snapshot and the largest volumes, gathered from all fileservers
+# concurrently. The last snapshot is cached so that repeated reports don't
+# query the fileservers.
+
+from __future__ import absolute_import
+import csv
+import heapq
+import json
+import logging
+import os
+import sys
+import time
+import plac
+import openafs_setup.openafs_setup_globals as openafs_setup_globals
+from openafs_setup.openafs_setup_paths import PATH_MODES, openafs_paths
+from openafs_setup.openafs_setup_executor import EXECUTOR_LOCAL, parallel_default, step_timeout_default, Deadline, create_executor, run_parallel
+from openafs_setup.openafs_setup_vos import parse_vos_partinfo, iter_vos_listvol
+
+logger = logging.getLogger(__name__)
+
+snapshot_file_path_default = os.path.join(openafs_setup_globals.state_dir_path_default, "capacity.json")
+max_age_default = 300 # in seconds
+largest_count_default = 10
+FORMAT_TEXT = "text"
+FORMAT_JSON = "json"
+FORMAT_CSV = "csv"
+FORMATS = set([FORMAT_TEXT, FORMAT_JSON, FORMAT_CSV])
+
+def partition_key(server, partition):
+    return "%s:%s" % (server, partition)
+
+def gather(local_executor, vos, fileservers, largest_count=largest_count_default, parallel=parallel_default):
+    """Runs `vos partinfo` and `vos listvol` on all `fileservers` concurrently
+    and returns a snapshot dictionary with the keys `time`, `partitions`
+    (mapping `server:partition` to dictionaries with the keys `server`,
+    `partition`, `free`, `total`, `used` (all in KB) and `volume_count`) and
+    `largest` (the `largest_count` largest volumes)."""
+    def __gather_server__(fileserver):
+        partinfo = parse_vos_partinfo(local_executor.check_output([vos, "partinfo", fileserver, "-localauth"]).splitlines())
+        volume_counts = {}
+        # only the largest volumes of every server are kept
+        largest = []
+        for volume in iter_vos_listvol(local_executor.check_output([vos, "listvol", fileserver, "-localauth"]).splitlines()):
+            volume_counts[volume["partition"]] = volume_counts.get(volume["partition"], 0)+1
+            volume["server"] = fileserver
+            if len(largest) < largest_count:
+                heapq.heappush(largest, (volume["size"], volume["id"], volume))
+            elif volume["size"] > largest[0][0]:
+                heapq.heapreplace(largest, (volume["size"], volume["id"], volume))
+        return (partinfo, volume_counts, [volume for (size, volume_id, volume) in largest])
+    server_results = run_parallel(__gather_server__, fileservers, parallel=parallel)
+    partitions = {}
+    largest = []
+    for (fileserver, (partinfo, volume_counts, server_largest)) in server_results.items():
+        for (partition, (free, total)) in partinfo.items():
+            partitions[partition_key(fileserver, partition)] = {
+                "server": fileserver,
+                "partition": partition,
+                "free": free,
+                "total": total,
+                "used": total-free,
+                "volume_count": volume_counts.get(partition, 0),
+            }
+        largest += server_largest
+    return {
+        "time": time.time(),
+        "partitions": partitions,
+        "largest": heapq.nlargest(largest_count, largest, key=lambda volume: volume["size"]),
+    }
+
+def load_snapshots(snapshot_file_path):
+    """Returns the tuple `(current, previous)` of cached snapshots (`None` if
+    missing)."""
+    if not os.path.exists(snapshot_file_path):
+        return (None, None)
+    with open(snapshot_file_path, "r") as snapshot_file:
+        snapshots = json.load(snapshot_file)
+    return (snapshots.get("current"), snapshots.get("previous"))
+
+def save_snapshots(current, previous, snapshot_file_path):
+    snapshot_file_parent_path = os.path.dirname(snapshot_file_path)
+    if not os.path.exists(snapshot_file_parent_path):
+        os.makedirs(snapshot_file_parent_path)
+    tmp_file_path = "%s.tmp" % (snapshot_file_path,)
+    with open(tmp_file_path, "w") as tmp_file:
+        json.dump({"current": current, "previous": previous}, tmp_file, indent=2, sort_keys=True)
+    os.rename(tmp_file_path, snapshot_file_path)
+
+def report(current, previous):
+    """Creates the report dictionary of the snapshot `current` with the growth
+    since `previous` (`None` if there's none) added to every partition and the
+    totals of the cell."""
+    partitions = []
+    for (key, partition) in sorted(current["partitions"].items()):
+        partition = dict(partition)
+        partition["used_percent"] = 100.0*partition["used"]/partition["total"] if partition["total"] > 0 else 0.0
+        partition["growth"] = None
+        partition["growth_per_day"] = None
+        if previous is not None and key in previous["partitions"] and current["time"] > previous["time"]:
+            partition["growth"] = partition["used"]-previous["partitions"][key]["used"]
+            partition["growth_per_day"] = partition["growth"]*86400.0/(current["time"]-previous["time"])
+        partitions.append(partition)
+    total = sum([partition["total"] for partition in partitions])
+    used = sum([partition["used"] for partition in partitions])
+    return {
+        "time": current["time"],
+        "previous_time": None if previous is None else previous["time"],
+        "total": total,
+        "used": used,
+        "free": total-used,
+        "used_percent": 100.0*used/total if total > 0 else 0.0,
+        "volume_count": sum([partition["volume_count"] for partition in partitions]),
+        "partitions": partitions,
+        "largest": current["largest"],
+    }
+
+def __format_growth__(growth):
+    if growth is None:
+        return "-"
+    return "%+d" % (growth,)
+
+def write_report(capacity_report, output_format, output_file):
+    if output_format == FORMAT_JSON:
+        json.dump(capacity_report, output_file, indent=2, sort_keys=True)
+        output_file.write("\n")
+    elif output_format == FORMAT_CSV:
+        csv_fields = ["server", "partition", "total", "used", "free", "used_percent", "volume_count", "growth", "growth_per_day"]
+        csv_writer = csv.DictWriter(output_file, csv_fields, extrasaction="ignore")
+        csv_writer.writeheader()
+        for partition in capacity_report["partitions"]:
+            csv_writer.writerow(partition)
+    elif output_format == FORMAT_TEXT:
+        output_file.write("%-30s %-8s %14s %14s %6s %8s %14s\n" % ("server", "part", "total K", "used K", "used", "volumes", "growth K/day"))
+        for partition in capacity_report["partitions"]:
+            output_file.write("%-30s %-8s %14d %14d %5.1f%% %8d %14s\n" % (partition["server"], partition["partition"], partition["total"], partition["used"], partition["used_percent"], partition["volume_count"], __format_growth__(partition["growth_per_day"])))
+        output_file.write("%-39s %14d %14d %5.1f%% %8d\n" % ("total", capacity_report["total"], capacity_report["used"], capacity_report["used_percent"], capacity_report["volume_count"]))
+        output_file.write("\nlargest volumes:\n")
+        for volume in capacity_report["largest"]:
+            output_file.write("%-30s %-30s %-8s %14d K\n" % (volume["name"], volume["server"], volume["partition"], volume["size"]))
+    else:
+        raise ValueError("output_format '%s' isn't supported" % (output_format,))
+
+@plac.annotations(path_mode=plac.Annotation("The path mode of the OpenAFS installation", "positional", type=str, choices=PATH_MODES),
+    snapshot_file_path=plac.Annotation("The file caching the last two snapshots", "option"),
+    max_age=plac.Annotation("The age in seconds up to which the cached snapshot is reported instead of querying the fileservers", "option", type=float),
+    refresh=plac.Annotation("A flag indicating that the fileservers ought to be queried regardless of the age of the cached snapshot", "flag"),
+    largest_count=plac.Annotation("The number of largest volumes to report", "option", type=int),
+    output_format=plac.Annotation("The format of the report", "option", "format", type=str, choices=FORMATS),
+    output_file_path=plac.Annotation("The file to write the report to (stdout if omitted)", "option", "output"),
+    parallel=plac.Annotation("The maximum number of fileservers to query concurrently", "option", type=int),
+    step_timeout=plac.Annotation("The time in seconds every command may take", "option", type=float),
+    fileservers=plac.Annotation("The fileservers of the cell"),
+)
+def capacity(path_mode, snapshot_file_path=snapshot_file_path_default, max_age=max_age_default, refresh=False, largest_count=largest_count_default, output_format=FORMAT_TEXT, output_file_path=None, parallel=parallel_default, step_timeout=step_timeout_default, *fileservers):
+    (current, previous) = load_snapshots(snapshot_file_path)
+    # a snapshot of other fileservers isn't used
+    snapshot_stale = current is None or time.time()-current["time"] > max_age or (len(fileservers) > 0 and set([partition["server"] for partition in current["partitions"].values()]) != set(fileservers))
+    if refresh or snapshot_stale:
+        if len(fileservers) == 0:
+            raise ValueError("at least one fileserver has to be specified")
+        start_time = time.time()
+        local_executor = create_executor(EXECUTOR_LOCAL, "localhost", deadline=Deadline(), step_timeout=step_timeout)
+        (current, previous) = (gather(local_executor, openafs_paths(path_mode)["vos"], fileservers, largest_count=largest_count, parallel=parallel), current)
+        save_snapshots(current, previous, snapshot_file_path)
+        logger.info("gathered capacity of %d fileservers in %f s" % (len(fileservers), time.time()-start_time))
+    else:
+        logger.info("reporting cached snapshot of %d s ago" % (time.time()-current["time"],))
+    capacity_report = report(current, previous)
+    if output_file_path is None:
+        write_report(capacity_report, output_format, sys.stdout)
+    else:
+        with open(output_file_path, "w") as output_file:
+            write_report(capacity_report, output_format, output_file)
+    return capacity_report
@@ -0,0 +1,177 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Record and replay of the commands of a run. While recording, every command,
+# pipeline, background process and `pexpect` interaction is written to a
+# cassette file together with its output and return code. Replaying feeds the
+# recorded results back without running anything and fails on the first
+# command which differs from the recording, so that changes of the setup flow
+# can be checked in seconds.
+
+from __future__ import absolute_import
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_RECORD = "record"
+CASSETTE_REPLAY = "replay"
+CASSETTE_MODES = set([CASSETTE_RECORD, CASSETTE_REPLAY])
+cassette_version = 1
+secret_placeholder = "<secret>"
+
+# the cassette used by the executor functions (nothing is recorded or replayed
+# if `None`)
+active_cassette = None
+
+# the fields identifying an interaction
+KEY_FIELDS = ["cmds", "cmds_list", "capture_output", "command", "pattern", "line", "name"]
+
+class CassetteMismatch(RuntimeError):
+    """Raised when a replayed run issues a command which isn't the next one of
+    the recording or leaves recorded commands unused."""
+
+def __is_main_thread__():
+    return threading.current_thread().name == "MainThread"
+
+def __describe__(kind, entry):
+    return "%s %s" % (kind, json.dumps(dict([(name, value) for (name, value) in entry.items() if name in KEY_FIELDS]), sort_keys=True))
+
+class Cassette(object):
+    """The recording of a run in `cassette_file_path`. `secrets` (e.g.
+    passwords) are replaced with a placeholder before anything is recorded
+    and compared.
+
+    Replay is strict for commands of the main thread. Commands of worker
+    threads (e.g. of `run_parallel`) are matched with any unused recorded
+    command of a worker thread because their order isn't deterministic."""
+
+    def __init__(self, mode, cassette_file_path, secrets=()):
+        if not mode in CASSETTE_MODES:
+            raise ValueError("mode '%s' isn't supported" % (mode,))
+        self.mode = mode
+        self.cassette_file_path = cassette_file_path
+        self.secrets = [secret for secret in secrets if secret]
+        self.lock = threading.Lock()
+        if mode == CASSETTE_REPLAY:
+            with open(cassette_file_path, "r") as cassette_file:
+                cassette = json.load(cassette_file)
+            if cassette.get("version") != cassette_version:
+                raise ValueError("cassette '%s' has version %s, but only version %d is supported" % (cassette_file_path, str(cassette.get("version")), cassette_version))
+            self.entries = cassette["entries"]
+        else:
+            self.entries = []
+        self.used = [False]*len(self.entries)
+
+    def redact(self, value):
+        """Replaces the secrets in `value` (a string, a list of strings or
+        `None`)."""
+        if value is None:
+            return None
+        if isinstance(value, list):
+            return [self.redact(item) for item in value]
+        for secret in self.secrets:
+            value = value.replace(secret, secret_placeholder)
+        return value
+
+    def record(self, kind, key, result):
+        """Appends the entry of a `kind` interaction identified by the
+        dictionary `key` with the dictionary `result`."""
+        entry = dict(key)
+        entry.update(result)
+        entry["kind"] = kind
+        entry["main_thread"] = __is_main_thread__()
+        with self.lock:
+            self.entries.append(entry)
+
+    def replay(self, kind, key):
+        """Returns the recorded entry of the `kind` interaction identified by
+        `key`. Raises `CassetteMismatch` if it isn't the expected one."""
+        main_thread = __is_main_thread__()
+        with self.lock:
+            for (index, entry) in enumerate(self.entries):
+                if self.used[index]:
+                    continue
+                matches = entry["kind"] == kind and all([entry.get(name) == value for (name, value) in key.items()])
+                if main_thread:
+                    if not matches:
+                        raise CassetteMismatch("unexpected %s at position %d of cassette '%s' which continues with %s" % (__describe__(kind, key), index, self.cassette_file_path, __describe__(entry["kind"], entry)))
+                elif not matches or entry["main_thread"]:
+                    continue
+                self.used[index] = True
+                return entry
+        raise CassetteMismatch("unexpected %s after the end of the recording in cassette '%s'" % (__describe__(kind, key), self.cassette_file_path))
+
+    def close(self, succeeded=True):
+        """Writes the recording or checks that the replay used all entries if
+        the run `succeeded`."""
+        if self.mode == CASSETTE_RECORD:
+            cassette_file_parent_path = os.path.dirname(self.cassette_file_path)
+            if cassette_file_parent_path != "" and not os.path.exists(cassette_file_parent_path):
+                os.makedirs(cassette_file_parent_path)
+            tmp_file_path = "%s.tmp" % (self.cassette_file_path,)
+            with open(tmp_file_path, "w") as tmp_file:
+                json.dump({"version": cassette_version, "entries": self.entries}, tmp_file, indent=1, sort_keys=True)
+            os.rename(tmp_file_path, self.cassette_file_path)
+            logger.info("recorded %d interactions in cassette '%s'" % (len(self.entries), self.cassette_file_path))
+        elif succeeded:
+            unused_count = len([used for used in self.used if not used])
+            if unused_count > 0:
+                first_unused_entry = self.entries[self.used.index(False)]
+                raise CassetteMismatch("replay finished without %d recorded interactions of cassette '%s' starting with %s" % (unused_count, self.cassette_file_path, __describe__(first_unused_entry["kind"], first_unused_entry)))
+            logger.info("replayed %d interactions of cassette '%s'" % (len(self.entries), self.cassette_file_path))
+
+def recording():
+    """Returns the active cassette if it's recording, otherwise `None`."""
+    if active_cassette is not None and active_cassette.mode == CASSETTE_RECORD:
+        return active_cassette
+    return None
+
+def replaying():
+    """Returns the active cassette if it's replaying, otherwise `None`."""
+    if active_cassette is not None and active_cassette.mode == CASSETTE_REPLAY:
+        return active_cassette
+    return None
+
+def recorded_value(name, func):
+    """Returns the result of `func` which depends on the host (e.g. its number
+    of cores) and records it as value `name`. A replay returns the recorded
+    value instead of calling `func` in order to issue the same commands on
+    another host."""
+    cassette = replaying()
+    if cassette is not None:
+        return cassette.replay("value", {"name": name})["value"]
+    value = func()
+    cassette = recording()
+    if cassette is not None:
+        cassette.record("value", {"name": name}, {"value": value})
+    return value
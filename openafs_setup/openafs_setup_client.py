@@ -0,0 +1,155 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Client-only configuration through prebuilt bundles. A bundle is built once
+# per cell and contains the content of all client configuration files as well
+# as a version which is the hash of the content. Applying a bundle only writes
+# the files whose content differs and doesn't touch Kerberos or the bosserver
+# which makes it suitable for mass client rollout.
+
+from __future__ import absolute_import
+import subprocess as sp
+import logging
+import hashlib
+import json
+import os
+import time
+import plac
+from openafs_setup.openafs_setup_paths import PATH_MODES, openafs_paths, service
+import openafs_setup.openafs_setup_cellservdb as openafs_setup_cellservdb
+
+logger = logging.getLogger(__name__)
+
+cache_dir_path_default = "/var/cache/openafs"
+cache_size_default = 50000 # in 1K blocks
+bundle_format_version = 1
+
+# maps the file names in bundles to keys of `openafs_paths`
+BUNDLE_FILES = {
+    "ThisCell": "thiscell_client_file_path",
+    "CellServDB": "cellservdb_client_file_path",
+    "cacheinfo": "cacheinfo_file_path",
+}
+
+def __sha256__(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def client_file_contents(cell_name, db_servers, cache_dir_path=cache_dir_path_default, cache_size=cache_size_default):
+    """Returns a dictionary mapping the names of `BUNDLE_FILES` to their
+    content."""
+    return {
+        "ThisCell": "%s\n" % (cell_name,),
+        "CellServDB": openafs_setup_cellservdb.cellservdb_content(cell_name, db_servers),
+        "cacheinfo": "/afs:%s:%d\n" % (cache_dir_path, cache_size),
+    }
+
+def create_client_bundle(cell_name, db_servers, cache_dir_path=cache_dir_path_default, cache_size=cache_size_default):
+    """Creates a bundle dictionary whose `version` is the hash over the names
+    and hashes of all files and thus changes iff a file content changes."""
+    files = {}
+    for (file_name, content) in client_file_contents(cell_name, db_servers, cache_dir_path=cache_dir_path, cache_size=cache_size).items():
+        files[file_name] = {"content": content, "sha256": __sha256__(content)}
+    version = __sha256__(str.join("\n", ["%s:%s" % (file_name, files[file_name]["sha256"]) for file_name in sorted(files.keys())]))
+    return {
+        "format": bundle_format_version,
+        "cell_name": cell_name,
+        "version": version,
+        "cache_dir_path": cache_dir_path,
+        "files": files,
+    }
+
+def __file_sha256__(file_path):
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, "rb") as file_obj:
+        return hashlib.sha256(file_obj.read()).hexdigest()
+
+def __write_file_atomically__(file_path, content):
+    file_parent_path = os.path.dirname(file_path)
+    if not os.path.exists(file_parent_path):
+        os.makedirs(file_parent_path)
+    tmp_file_path = "%s.tmp.%d" % (file_path, os.getpid())
+    with open(tmp_file_path, "wb") as tmp_file:
+        tmp_file.write(content.encode("utf-8"))
+    os.rename(tmp_file_path, file_path)
+
+def apply_client_bundle_dict(bundle, paths, cache_dir_path=None):
+    """Writes the files of `bundle` which differ from the installed ones to
+    the pathes in `paths` (see `openafs_paths`) and creates the cache
+    directory (`cache_dir_path` which defaults to the one of the bundle).
+    Returns the list of written file pathes."""
+    if bundle.get("format") != bundle_format_version:
+        raise ValueError("bundle format '%s' isn't supported (expected %d)" % (str(bundle.get("format")), bundle_format_version))
+    changed_file_paths = []
+    for file_name in sorted(bundle["files"].keys()):
+        if not file_name in BUNDLE_FILES:
+            raise ValueError("bundle contains unknown file '%s'" % (file_name,))
+        file_path = paths[BUNDLE_FILES[file_name]]
+        bundle_file = bundle["files"][file_name]
+        if __file_sha256__(file_path) == bundle_file["sha256"]:
+            continue
+        __write_file_atomically__(file_path, bundle_file["content"])
+        changed_file_paths.append(file_path)
+    if cache_dir_path is None:
+        cache_dir_path = bundle["cache_dir_path"]
+    if not os.path.exists(cache_dir_path):
+        os.makedirs(cache_dir_path)
+    elif os.path.isfile(cache_dir_path):
+        raise ValueError("cache directory '%s' is a file" % (cache_dir_path,))
+    return changed_file_paths
+
+@plac.annotations(cell_name=plac.Annotation("The cell name clients ought to use", "positional"),
+    bundle_file_path=plac.Annotation("The file to write the bundle to", "positional"),
+    cache_dir_path=plac.Annotation("The client cache directory", "option"),
+    cache_size=plac.Annotation("The client cache size in 1K blocks", "option", type=int),
+    db_servers=plac.Annotation("The database servers of the cell as `ip[:hostname]`"),
+)
+def build_client_bundle(cell_name, bundle_file_path, cache_dir_path=cache_dir_path_default, cache_size=cache_size_default, *db_servers):
+    if cell_name is None:
+        raise ValueError("cell_name musn't be None")
+    bundle = create_client_bundle(cell_name, [openafs_setup_cellservdb.parse_db_server(db_server) for db_server in db_servers], cache_dir_path=cache_dir_path, cache_size=cache_size)
+    with open(bundle_file_path, "w") as bundle_file:
+        json.dump(bundle, bundle_file, indent=2, sort_keys=True)
+    logger.info("wrote client bundle version %s for cell %s to '%s'" % (bundle["version"], cell_name, bundle_file_path))
+    return bundle["version"]
+
+@plac.annotations(path_mode=plac.Annotation("The path mode of the OpenAFS client installation", "positional", type=str, choices=PATH_MODES),
+    bundle_file_path=plac.Annotation("The bundle created with `build-client-bundle`", "positional"),
+    restart_client=plac.Annotation("A flag indicating that the `openafs-client` service ought to be restarted if a file changed", "flag"),
+)
+def apply_client_bundle(path_mode, bundle_file_path, restart_client=False):
+    start_time = time.time()
+    with open(bundle_file_path, "r") as bundle_file:
+        bundle = json.load(bundle_file)
+    changed_file_paths = apply_client_bundle_dict(bundle, openafs_paths(path_mode))
+    logger.info("applied client bundle version %s in %f s (changed files: %s)" % (bundle["version"], time.time()-start_time, str(changed_file_paths)))
+    if restart_client and len(changed_file_paths) > 0:
+        sp.check_call([service, "openafs-client", "restart"])
+    return changed_file_paths
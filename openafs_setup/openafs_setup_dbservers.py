@@ -0,0 +1,102 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Adding database servers to an existing cell: all servers learn about the new
+# ones through `bos addhost`, the new ones get the ubik database instances and
+# the existing database instances are restarted one at a time in order to read
+# the changed server CellServDB. The command finishes once every database
+# server reports the same database version. Afterwards protection and volume
+# location lookups are spread over all database servers.
+
+from __future__ import absolute_import
+import logging
+import time
+import plac
+from openafs_setup.openafs_setup_globals import split_list
+from openafs_setup.openafs_setup_paths import PATH_MODES, openafs_paths
+from openafs_setup.openafs_setup_executor import EXECUTOR_LOCAL, parallel_default, step_timeout_default, Deadline, create_executor, run_parallel
+import openafs_setup.openafs_setup_ubik as openafs_setup_ubik
+
+logger = logging.getLogger(__name__)
+
+DB_SERVICES = ["buserver", "ptserver", "vlserver"]
+
+def addhost_cmds(bos, server, db_servers):
+    return [bos, "addhost", server]+list(db_servers)+["-localauth"]
+
+@plac.annotations(path_mode=plac.Annotation("The path mode of the OpenAFS installation on all servers", "positional", type=str, choices=PATH_MODES),
+    db_servers=plac.Annotation("A comma separated list of the existing database servers", "option"),
+    fileservers=plac.Annotation("A comma separated list of servers which aren't database servers, but ought to get the new database servers in their server CellServDB", "option"),
+    parallel=plac.Annotation("The maximum number of servers to update concurrently (the database instances are restarted one at a time)", "option", type=int),
+    step_timeout=plac.Annotation("The time in seconds every command may take", "option", type=float),
+    timeout=plac.Annotation("The time in seconds to wait for the ubik quorum at most", "option", type=float),
+    new_db_servers=plac.Annotation("The new database servers (their `bosserver` has to run with the cell's KeyFile)"),
+)
+def add_db_servers(path_mode, db_servers="", fileservers="", parallel=parallel_default, step_timeout=step_timeout_default, timeout=openafs_setup_ubik.quorum_timeout_default, *new_db_servers):
+    db_servers = split_list(db_servers)
+    fileservers = split_list(fileservers)
+    new_db_servers = [new_db_server for new_db_server in new_db_servers if not new_db_server in db_servers]
+    if len(db_servers) == 0:
+        raise ValueError("at least one existing database server has to be specified")
+    if len(new_db_servers) == 0:
+        logger.info("all database servers are already part of the cell, nothing to do")
+        return
+    paths = openafs_paths(path_mode)
+    bos = paths["bos"]
+    deadline = Deadline()
+    local_executor = create_executor(EXECUTOR_LOCAL, "localhost", deadline=deadline, step_timeout=step_timeout)
+    start_time = time.time()
+    all_db_servers = db_servers+new_db_servers
+    # the new servers need the complete list, the others only the additions;
+    # `bos addhost` ignores hosts which are already listed
+    def __addhost__(server):
+        if server in new_db_servers:
+            local_executor.check_call(addhost_cmds(bos, server, all_db_servers))
+        else:
+            local_executor.check_call(addhost_cmds(bos, server, new_db_servers))
+    run_parallel(__addhost__, all_db_servers+[fileserver for fileserver in fileservers if not fileserver in all_db_servers], parallel=parallel)
+    logger.info("updated server CellServDB in %f s" % (time.time()-start_time,))
+    def __create_db_instances__(new_db_server):
+        for db_service in DB_SERVICES:
+            local_executor.check_call([bos, "create", new_db_server, db_service, "simple", paths[db_service], "-localauth"], no_fail=True) # fails if the instance exists
+    run_parallel(__create_db_instances__, new_db_servers, parallel=parallel)
+    # ubik reads the list of its peers only at startup; the servers are
+    # restarted one after another so that the others keep the quorum
+    election_times = {}
+    for db_server in db_servers:
+        restart_time = time.time()
+        local_executor.check_call([bos, "restart", db_server]+DB_SERVICES+["-localauth"])
+        election_times[db_server] = openafs_setup_ubik.wait_for_quorum(paths["udebug"], all_db_servers, DB_SERVICES, deadline=deadline, step_timeout=step_timeout, timeout=timeout, restart_time=restart_time)
+        logger.info("restarted database server %s (elections took %s)" % (db_server, str.join(", ", ["%s %f s" % (service, election_time) for (service, election_time) in sorted(election_times[db_server].items())])))
+    # the new servers only count once the sync site distributed its database
+    # to them
+    openafs_setup_ubik.wait_for_quorum(paths["udebug"], all_db_servers, DB_SERVICES, deadline=deadline, step_timeout=step_timeout, timeout=timeout, converged=True)
+    logger.info("added %d database servers in %f s, distribute the client CellServDB with `build-client-bundle`" % (len(new_db_servers), time.time()-start_time))
+    return election_times
@@ -0,0 +1,284 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Streaming volume dumps and restores. `vos dump` writes to a pipe into a
+# (parallel) compressor and the compressed stream into the dump file, restores
+# read the decompressed stream through a pipe, migrations pipe `vos dump` into
+# `vos restore` directly, so that no uncompressed or temporary copies are
+# written. Full restores go into a temporary volume which replaces the target
+# only after the whole stream has been restored, so that a failed transfer
+# doesn't leave a truncated target (the target partition needs room for a
+# second copy of the volume meanwhile). Migrations only go to other cells,
+# `vos move` moves volumes within a cell keeping their IDs and replicas. Several volumes are processed concurrently
+# with a limit per server.
+# Replacing `vos` by a stub in `PATH` (path mode `source`) allows to test this
+# without a cell.
+
+from __future__ import absolute_import
+import logging
+import hashlib
+import os
+import re
+import time
+import plac
+from openafs_setup.openafs_setup_paths import PATH_MODES, openafs_paths
+from openafs_setup.openafs_setup_executor import EXECUTOR_LOCAL, parallel_default, step_timeout_default, Deadline, create_executor, run_command, run_parallel, run_pipeline, ServerLimiter
+from openafs_setup.openafs_setup_output import create_output_buffer, format_tail
+from openafs_setup.openafs_setup_vos import parse_vos_examine, normalize_partition
+
+logger = logging.getLogger(__name__)
+
+COMPRESSOR_PIGZ = "pigz"
+COMPRESSOR_GZIP = "gzip"
+COMPRESSOR_ZSTD = "zstd"
+COMPRESSOR_NONE = "none"
+# maps compressors to their compression and decompression commands and file
+# name extension; `pigz` and `zstd -T0` use all cores
+COMPRESSORS = {
+    COMPRESSOR_PIGZ: (["pigz", "-c"], ["pigz", "-dc"], ".gz"),
+    COMPRESSOR_GZIP: (["gzip", "-c"], ["gzip", "-dc"], ".gz"),
+    COMPRESSOR_ZSTD: (["zstd", "-q", "-T0", "-c"], ["zstd", "-q", "-dc"], ".zst"),
+    COMPRESSOR_NONE: (None, None, ""),
+}
+per_server_default = 2
+dump_step_timeout_default = 24*3600 # dumps of large volumes take hours
+# `vos` refuses longer names of read-write volumes because `.readonly` has to
+# fit in the volume name field
+volume_name_length_max = 22
+
+def dump_file_name(volume, compressor, time_value=None):
+    """The file name of the dump of `volume` (an incremental dump if
+    `time_value` isn't `None`) compressed with `compressor`."""
+    if time_value is None:
+        return "%s.dump%s" % (volume, COMPRESSORS[compressor][2])
+    return "%s.%s.dump%s" % (volume, re.sub("[^0-9A-Za-z]+", "-", time_value), COMPRESSORS[compressor][2])
+
+def vos_dump_cmds(vos, volume, time_value=None, cell=None):
+    """`vos dump` writing to stdout because `-file` is omitted."""
+    ret_value = [vos, "dump", "-id", volume]
+    if time_value is not None:
+        ret_value += ["-time", time_value]
+    if cell is not None:
+        ret_value += ["-cell", cell]
+    return ret_value+["-localauth"]
+
+def __auth_args__(cell):
+    if cell is not None:
+        # `-localauth` only authenticates for the local cell, foreign cells need tokens
+        return ["-cell", cell]
+    return ["-localauth"]
+
+def vos_restore_cmds(vos, server, partition, volume, incremental=False, cell=None):
+    """`vos restore` reading from stdin because `-file` is omitted. `-overwrite`
+    is always passed because `vos` prompts for it otherwise."""
+    return [vos, "restore", "-server", server, "-partition", partition, "-name", volume, "-overwrite", "incremental" if incremental else "full"]+__auth_args__(cell)
+
+def restore_tmp_volume_name(volume, suffix="restore"):
+    """The name of the temporary volume a full restore of `volume` is written
+    to (or the target is renamed to with `suffix` `old`), a hash of the name
+    if the suffix doesn't fit."""
+    ret_value = "%s.%s" % (volume, suffix)
+    if len(ret_value) <= volume_name_length_max:
+        return ret_value
+    return "%s.%s" % (suffix, hashlib.sha1(volume.encode("utf-8")).hexdigest()[:12])
+
+def __run_pipeline__(cmds_list, step_name, stdin=None, stdout=None, deadline=None, step_timeout=dump_step_timeout_default):
+    """Runs `run_pipeline` with captured error output and raises a
+    `RuntimeError` containing its tail if a command fails."""
+    output_buffer = create_output_buffer(step_name)
+    try:
+        returncodes = run_pipeline(cmds_list, stdin=stdin, stdout=stdout, deadline=deadline, step_timeout=step_timeout, step_name=step_name, output_buffer=output_buffer)
+    finally:
+        output_buffer.close()
+    for (returncode, cmds) in zip(returncodes, cmds_list):
+        if returncode != 0:
+            raise RuntimeError("'%s' returned non-zero code %d, %s" % (str.join(" ", cmds), returncode, format_tail(output_buffer)))
+
+def __vos_call__(cmds, deadline=None):
+    __run_pipeline__([cmds], str.join(" ", cmds), deadline=deadline, step_timeout=step_timeout_default)
+
+def __volume_server__(local_executor, vos, volume):
+    volume_info = parse_vos_examine(local_executor.check_output([vos, "examine", volume, "-localauth"]).splitlines())
+    rw_sites = [site["server"] for site in volume_info["sites"] if site["type"] == "RW"]
+    if len(rw_sites) == 0:
+        return None
+    return rw_sites[0]
+
+def dump_volume(vos, volume, dump_dir_path, compressor=COMPRESSOR_PIGZ, time_value=None, deadline=None, step_timeout=dump_step_timeout_default):
+    """Streams the dump of `volume` through `compressor` into a file in
+    `dump_dir_path` which is only renamed to its final name after the dump
+    succeeded. Returns the file path."""
+    dump_file_path = os.path.join(dump_dir_path, dump_file_name(volume, compressor, time_value=time_value))
+    tmp_file_path = "%s.part" % (dump_file_path,)
+    cmds_list = [vos_dump_cmds(vos, volume, time_value=time_value)]
+    if COMPRESSORS[compressor][0] is not None:
+        cmds_list.append(COMPRESSORS[compressor][0])
+    with open(tmp_file_path, "wb") as dump_file:
+        try:
+            __run_pipeline__(cmds_list, "dump of %s" % (volume,), stdout=dump_file, deadline=deadline, step_timeout=step_timeout)
+        except Exception:
+            os.remove(tmp_file_path)
+            raise
+    os.rename(tmp_file_path, dump_file_path)
+    return dump_file_path
+
+def __restore__(vos, server, partition, volume, cmds_list, step_name, stdin=None, incremental=False, cell=None, deadline=None, step_timeout=dump_step_timeout_default):
+    """Runs the pipeline `cmds_list` followed by `vos restore` of `volume`.
+    Incremental restores are applied to `volume` directly because they need
+    its content, full restores go into a temporary volume (which requires
+    room for a second copy of the volume on `partition`) which replaces
+    `volume` only after all commands of the pipeline succeeded and is removed
+    if one failed. The read-only sites of a replaced volume are created for
+    the new one and released."""
+    if incremental:
+        __run_pipeline__(cmds_list+[vos_restore_cmds(vos, server, partition, volume, incremental=True, cell=cell)], step_name, stdin=stdin, deadline=deadline, step_timeout=step_timeout)
+        return
+    tmp_volume = restore_tmp_volume_name(volume)
+    try:
+        __run_pipeline__(cmds_list+[vos_restore_cmds(vos, server, partition, tmp_volume, cell=cell)], step_name, stdin=stdin, deadline=deadline, step_timeout=step_timeout)
+    except Exception:
+        # a deadline of its own because the run's might be exceeded already
+        run_command([vos, "remove", "-server", server, "-partition", partition, "-id", tmp_volume]+__auth_args__(cell), deadline=Deadline())
+        raise
+    (returncode, output) = run_command([vos, "examine", "-id", volume]+__auth_args__(cell), capture_output=True, deadline=deadline)
+    if returncode != 0:
+        __vos_call__([vos, "rename", "-oldname", tmp_volume, "-newname", volume]+__auth_args__(cell), deadline=deadline)
+        return
+    # the replaced volume is renamed aside first because `vos remove` keeps
+    # the name of a volume with read-only sites
+    old_volume = restore_tmp_volume_name(volume, suffix="old")
+    __vos_call__([vos, "rename", "-oldname", volume, "-newname", old_volume]+__auth_args__(cell), deadline=deadline)
+    try:
+        __vos_call__([vos, "rename", "-oldname", tmp_volume, "-newname", volume]+__auth_args__(cell), deadline=deadline)
+    except Exception:
+        __vos_call__([vos, "rename", "-oldname", old_volume, "-newname", volume]+__auth_args__(cell), deadline=Deadline())
+        raise
+    ro_sites = [site for site in parse_vos_examine(output.splitlines())["sites"] if site["type"] == "RO"]
+    for site in ro_sites:
+        __vos_call__([vos, "remove", "-server", site["server"], "-partition", site["partition"], "-id", "%s.readonly" % (old_volume,)]+__auth_args__(cell), deadline=deadline)
+    __vos_call__([vos, "remove", "-id", old_volume]+__auth_args__(cell), deadline=deadline)
+    if len(ro_sites) == 0:
+        return
+    for site in ro_sites:
+        __vos_call__([vos, "addsite", "-server", site["server"], "-partition", site["partition"], "-id", volume]+__auth_args__(cell), deadline=deadline)
+    __run_pipeline__([[vos, "release", "-id", volume]+__auth_args__(cell)], "release of %s" % (volume,), deadline=deadline, step_timeout=step_timeout)
+
+def restore_volume(vos, server, partition, volume, dump_file_path, compressor=COMPRESSOR_PIGZ, incremental=False, deadline=None, step_timeout=dump_step_timeout_default):
+    """Streams the decompressed content of `dump_file_path` into `vos restore`
+    (see `__restore__`)."""
+    cmds_list = []
+    if COMPRESSORS[compressor][1] is not None:
+        cmds_list.append(COMPRESSORS[compressor][1])
+    with open(dump_file_path, "rb") as dump_file:
+        __restore__(vos, server, partition, volume, cmds_list, "restore of %s" % (volume,), stdin=dump_file, incremental=incremental, deadline=deadline, step_timeout=step_timeout)
+
+def migrate_volume(vos, server, partition, volume, target_cell, time_value=None, deadline=None, step_timeout=dump_step_timeout_default):
+    """Pipes `vos dump` of `volume` into `vos restore` on `server` of the
+    foreign cell `target_cell` (see `__restore__`)."""
+    if target_cell is None:
+        raise ValueError("migrations require a target cell, use `vos move` to move volumes within the cell")
+    __restore__(vos, server, partition, volume, [vos_dump_cmds(vos, volume, time_value=time_value)], "migration of %s" % (volume,), incremental=time_value is not None, cell=target_cell, deadline=deadline, step_timeout=step_timeout)
+
+@plac.annotations(path_mode=plac.Annotation("The path mode of the OpenAFS installation", "positional", type=str, choices=PATH_MODES),
+    dump_dir_path=plac.Annotation("The directory to write the dump files to", "positional"),
+    time_value=plac.Annotation("Create incremental dumps of the changes since this date (`mm/dd/yyyy [hh:MM]`, see `vos dump -time`)", "option", "time"),
+    compressor=plac.Annotation("The compressor to stream the dumps through", "option", type=str, choices=sorted(COMPRESSORS.keys())),
+    parallel=plac.Annotation("The maximum number of volumes to dump concurrently", "option", type=int),
+    per_server=plac.Annotation("The maximum number of volumes to dump concurrently from one fileserver", "option", type=int),
+    step_timeout=plac.Annotation("The time in seconds the dump of one volume may take", "option", type=float),
+    timeout=plac.Annotation("The time in seconds all dumps may take (no limit if omitted)", "option", type=float),
+    volumes=plac.Annotation("The volumes to dump"),
+)
+def dump_volumes(path_mode, dump_dir_path, time_value=None, compressor=COMPRESSOR_PIGZ, parallel=parallel_default, per_server=per_server_default, step_timeout=dump_step_timeout_default, timeout=None, *volumes):
+    vos = openafs_paths(path_mode)["vos"]
+    if not os.path.exists(dump_dir_path):
+        os.makedirs(dump_dir_path)
+    deadline = Deadline(timeout)
+    local_executor = create_executor(EXECUTOR_LOCAL, "localhost", deadline=deadline)
+    server_limiter = ServerLimiter(per_server)
+    start_time = time.time()
+    def __dump__(volume):
+        with server_limiter.semaphore(__volume_server__(local_executor, vos, volume)):
+            return dump_volume(vos, volume, dump_dir_path, compressor=compressor, time_value=time_value, deadline=deadline, step_timeout=step_timeout)
+    dump_file_paths = run_parallel(__dump__, volumes, parallel=parallel)
+    logger.info("dumped %d volumes (%d bytes compressed) in %f s" % (len(volumes), sum([os.path.getsize(dump_file_path) for dump_file_path in dump_file_paths.values()]), time.time()-start_time))
+    return dump_file_paths
+
+@plac.annotations(path_mode=plac.Annotation("The path mode of the OpenAFS installation", "positional", type=str, choices=PATH_MODES),
+    server=plac.Annotation("The fileserver to restore the volumes on", "positional"),
+    partition=plac.Annotation("The partition to restore the volumes on", "positional"),
+    dump_dir_path=plac.Annotation("The directory containing the dump files written by `dump-volumes`", "positional"),
+    time_value=plac.Annotation("Restore the incremental dumps created with this `-time` value", "option", "time"),
+    compressor=plac.Annotation("The compressor the dumps have been created with", "option", type=str, choices=sorted(COMPRESSORS.keys())),
+    parallel=plac.Annotation("The maximum number of volumes to restore concurrently", "option", type=int),
+    step_timeout=plac.Annotation("The time in seconds the restore of one volume may take", "option", type=float),
+    timeout=plac.Annotation("The time in seconds all restores may take (no limit if omitted)", "option", type=float),
+    volumes=plac.Annotation("The volumes to restore"),
+)
+def restore_volumes(path_mode, server, partition, dump_dir_path, time_value=None, compressor=COMPRESSOR_PIGZ, parallel=parallel_default, step_timeout=dump_step_timeout_default, timeout=None, *volumes):
+    vos = openafs_paths(path_mode)["vos"]
+    partition = normalize_partition(partition)
+    deadline = Deadline(timeout)
+    start_time = time.time()
+    run_parallel(lambda volume: restore_volume(vos, server, partition, volume, os.path.join(dump_dir_path, dump_file_name(volume, compressor, time_value=time_value)), compressor=compressor, incremental=time_value is not None, deadline=deadline, step_timeout=step_timeout), volumes, parallel=parallel)
+    logger.info("restored %d volumes in %f s" % (len(volumes), time.time()-start_time))
+
+@plac.annotations(path_mode=plac.Annotation("The path mode of the OpenAFS installation", "positional", type=str, choices=PATH_MODES),
+    server=plac.Annotation("The fileserver to restore the volumes on", "positional"),
+    partition=plac.Annotation("The partition to restore the volumes on", "positional"),
+    target_cell=plac.Annotation("The cell to restore the volumes in (requires tokens for it), has to differ from the local cell (use `vos move` within a cell)", "option"),
+    time_value=plac.Annotation("Transfer only the changes since this date (`vos dump -time`) as incremental restore", "option", "time"),
+    parallel=plac.Annotation("The maximum number of volumes to transfer concurrently", "option", type=int),
+    per_server=plac.Annotation("The maximum number of volumes to dump concurrently from one fileserver", "option", type=int),
+    step_timeout=plac.Annotation("The time in seconds the transfer of one volume may take", "option", type=float),
+    timeout=plac.Annotation("The time in seconds all transfers may take (no limit if omitted)", "option", type=float),
+    volumes=plac.Annotation("The volumes to transfer"),
+)
+def migrate_volumes(path_mode, server, partition, target_cell=None, time_value=None, parallel=parallel_default, per_server=per_server_default, step_timeout=dump_step_timeout_default, timeout=None, *volumes):
+    paths = openafs_paths(path_mode)
+    vos = paths["vos"]
+    # restoring into the local cell would replace the source volumes (with
+    # new IDs and without their replicas)
+    if target_cell is None:
+        raise ValueError("-target-cell has to be specified, use `vos move` to move volumes within the cell")
+    if os.path.isfile(paths["thiscell_server_file_path"]):
+        with open(paths["thiscell_server_file_path"], "r") as thiscell_file:
+            if thiscell_file.read().strip() == target_cell:
+                raise ValueError("target cell '%s' is the local cell, use `vos move` to move volumes within the cell" % (target_cell,))
+    partition = normalize_partition(partition)
+    deadline = Deadline(timeout)
+    local_executor = create_executor(EXECUTOR_LOCAL, "localhost", deadline=deadline)
+    server_limiter = ServerLimiter(per_server)
+    start_time = time.time()
+    def __migrate__(volume):
+        with server_limiter.semaphore(__volume_server__(local_executor, vos, volume)):
+            migrate_volume(vos, server, partition, volume, target_cell=target_cell, time_value=time_value, deadline=deadline, step_timeout=step_timeout)
+    run_parallel(__migrate__, volumes, parallel=parallel)
+    logger.info("migrated %d volumes in %f s" % (len(volumes), time.time()-start_time))
@@ -0,0 +1,573 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Executors run commands for a server of the cell. `LocalExecutor` runs them on
+# this machine which is sufficient for single host cells and serves as
+# stand-in for remote servers in tests, `SSHExecutor` runs them on the server
+# through `ssh`.
+
+from __future__ import absolute_import
+import subprocess as sp
+import logging
+import shutil
+import os
+import time
+import threading
+import contextlib
+import signal
+import pexpect
+from multiprocessing.pool import ThreadPool
+from openafs_setup.openafs_setup_output import create_output_buffer, format_tail, start_pipe_reader
+import openafs_setup.openafs_setup_cassette as openafs_setup_cassette
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_LOCAL = "local"
+EXECUTOR_SSH = "ssh"
+EXECUTORS = set([EXECUTOR_LOCAL, EXECUTOR_SSH])
+
+ssh_default = "ssh"
+scp_default = "scp"
+parallel_default = 8
+step_timeout_default = 600 # in seconds; generous for `kdb5_util create` waiting for entropy, but a stuck prompt doesn't block a host for hours
+poll_interval_max = 0.1
+# the time in seconds the output of an exited command is still read if a
+# background process (e.g. of a `service ... restart` script) keeps the pipe
+# open
+reader_grace_period = 2.0
+
+class DeadlineExceeded(RuntimeError):
+    """Raised when a step exceeds its timeout, the run exceeds its deadline or
+    the deadline is canceled. `pending_steps` contains the names of the steps
+    which were running at that time."""
+
+    def __init__(self, message, pending_steps):
+        RuntimeError.__init__(self, "%s (pending steps: %s)" % (message, str.join(", ", ["'%s'" % (pending_step,) for pending_step in pending_steps])))
+        self.pending_steps = pending_steps
+
+class Deadline(object):
+    """The time budget of a run which is shared by all of its steps (including
+    steps running in parallel). A step's timeout is limited by the remaining
+    time of the run and waits return early when the deadline is canceled."""
+
+    def __init__(self, timeout=None):
+        if timeout is None:
+            self.end_time = None
+        else:
+            self.end_time = time.time()+timeout
+        self.cancel_event = threading.Event()
+        self.pending_steps = []
+        self.lock = threading.Lock()
+
+    def remaining(self):
+        """Returns the remaining time in seconds or `None` if the run has no
+        deadline."""
+        if self.end_time is None:
+            return None
+        return max(0, self.end_time-time.time())
+
+    def timeout_for(self, step_timeout):
+        """Returns the timeout of a step with `step_timeout` (`None` for no
+        limit) which is limited by the remaining time."""
+        remaining = self.remaining()
+        if remaining is None:
+            return step_timeout
+        if step_timeout is None:
+            return remaining
+        return min(remaining, step_timeout)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def is_canceled(self):
+        return self.cancel_event.is_set()
+
+    def is_expired(self):
+        return self.is_canceled() or self.remaining() == 0
+
+    def wait(self, interval):
+        """Waits `interval` seconds at most, but returns immediately if the
+        deadline is canceled. Returns `True` if the deadline is expired."""
+        wait_timeout = self.timeout_for(interval)
+        if wait_timeout > 0:
+            self.cancel_event.wait(wait_timeout)
+        return self.is_expired()
+
+    def exceeded(self, message):
+        """Creates a `DeadlineExceeded` for `message` containing the currently
+        pending steps."""
+        with self.lock:
+            pending_steps = list(self.pending_steps)
+        return DeadlineExceeded(message, pending_steps)
+
+    def check(self):
+        if self.is_canceled():
+            raise self.exceeded("run has been canceled")
+        if self.remaining() == 0:
+            raise self.exceeded("run exceeded its deadline")
+
+    @contextlib.contextmanager
+    def step(self, name, step_timeout=None):
+        """Context manager registering `name` as pending step which yields
+        the timeout of the step."""
+        self.check()
+        with self.lock:
+            self.pending_steps.append(name)
+        try:
+            yield self.timeout_for(step_timeout)
+        finally:
+            with self.lock:
+                self.pending_steps.remove(name)
+
+def cancel_on_signals(deadline, signal_numbers=(signal.SIGINT, signal.SIGTERM)):
+    """Installs handlers which cancel `deadline` when one of `signal_numbers`
+    is received, which kills the running commands and raises
+    `DeadlineExceeded` in the main thread. Returns the previous handlers for
+    `restore_signal_handlers` (empty if not called from the main thread
+    which is the only one allowed to install handlers)."""
+    def __handler__(signal_number, frame):
+        deadline.cancel()
+        raise deadline.exceeded("run has been canceled by signal %d" % (signal_number,))
+    ret_value = {}
+    if threading.current_thread().name == "MainThread":
+        for signal_number in signal_numbers:
+            ret_value[signal_number] = signal.signal(signal_number, __handler__)
+    return ret_value
+
+def restore_signal_handlers(previous_handlers):
+    for (signal_number, previous_handler) in previous_handlers.items():
+        signal.signal(signal_number, previous_handler)
+
+def run_command(cmds, capture_output=False, deadline=None, step_timeout=step_timeout_default, step_name=None, output_buffer=None):
+    """Runs `cmds` as step `step_name` (defaults to the command line) of
+    `deadline` and returns a tuple of the return code and the output (`None`
+    if `capture_output` is `False`). Output which isn't returned goes to
+    `output_buffer` (see `openafs_setup_output`) or the inherited streams if
+    it's `None`. The process is killed if it exceeds the step timeout or the
+    deadline is canceled. The command is recorded or replayed if a cassette
+    is active (see `openafs_setup_cassette`)."""
+    cassette = openafs_setup_cassette.replaying()
+    if cassette is not None:
+        entry = cassette.replay("command", {"cmds": cassette.redact(cmds), "capture_output": capture_output})
+        if output_buffer is not None:
+            output_buffer.write(entry["log"])
+        return (entry["returncode"], entry["output"])
+    (returncode, output) = __run_command__(cmds, capture_output=capture_output, deadline=deadline, step_timeout=step_timeout, step_name=step_name, output_buffer=output_buffer)
+    cassette = openafs_setup_cassette.recording()
+    if cassette is not None:
+        cassette.record("command", {"cmds": cassette.redact(cmds), "capture_output": capture_output}, {"returncode": returncode, "output": cassette.redact(output), "log": "" if output_buffer is None else cassette.redact(output_buffer.tail())})
+    return (returncode, output)
+
+def __run_command__(cmds, capture_output=False, deadline=None, step_timeout=step_timeout_default, step_name=None, output_buffer=None):
+    if deadline is None:
+        deadline = Deadline()
+    if step_name is None:
+        step_name = str.join(" ", cmds)
+    with deadline.step(step_name, step_timeout) as timeout:
+        start_time = time.time()
+        reader_threads = []
+        stop_event = threading.Event()
+        if capture_output:
+            proc = sp.Popen(cmds, stdout=sp.PIPE, stderr=None if output_buffer is None else sp.PIPE)
+            output_chunks = []
+            reader_threads.append(start_pipe_reader(proc.stdout, output_chunks.append, stop_event=stop_event))
+            if output_buffer is not None:
+                reader_threads.append(output_buffer.start_reader(proc.stderr, stop_event=stop_event))
+        elif output_buffer is not None:
+            proc = sp.Popen(cmds, stdout=sp.PIPE, stderr=sp.STDOUT)
+            reader_threads.append(output_buffer.start_reader(proc.stdout, stop_event=stop_event))
+        else:
+            proc = sp.Popen(cmds)
+        # start with a short poll interval in order to not delay fast commands
+        poll_interval = 0.001
+        try:
+            while proc.poll() is None:
+                if deadline.is_canceled():
+                    raise deadline.exceeded("'%s' has been canceled" % (step_name,))
+                if timeout is not None and time.time()-start_time >= timeout:
+                    raise deadline.exceeded("'%s' didn't finish within %s s" % (step_name, str(timeout)))
+                deadline.wait(poll_interval)
+                poll_interval = min(poll_interval*2, poll_interval_max)
+        finally:
+            # also kills the process if a signal handler raised (see
+            # `cancel_on_signals`)
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            __join_readers__(reader_threads, stop_event, deadline, timeout, start_time, step_name)
+        if capture_output:
+            return (proc.returncode, b"".join(output_chunks).decode("utf-8", "replace"))
+        return (proc.returncode, None)
+
+def __join_readers__(reader_threads, stop_event, deadline, timeout, start_time, step_name):
+    """Waits for the threads reading the output of an exited command, but at
+    most `reader_grace_period` or until the step timeout or the deadline
+    expire. Stops the readers (which close the pipes) if they didn't reach
+    EOF by then because a process which outlives the command keeps the pipe
+    open."""
+    end_time = time.time()+reader_grace_period
+    if timeout is not None:
+        end_time = min(end_time, start_time+timeout)
+    for reader_thread in reader_threads:
+        while reader_thread.is_alive() and time.time() < end_time and not deadline.is_canceled():
+            reader_thread.join(min(poll_interval_max, max(0, end_time-time.time())))
+    if any([reader_thread.is_alive() for reader_thread in reader_threads]):
+        logger.warning("stopped reading the output of '%s' because a process keeps its output open" % (step_name,))
+    stop_event.set()
+
+def run_pipeline(cmds_list, stdin=None, stdout=None, deadline=None, step_timeout=step_timeout_default, step_name=None, output_buffer=None):
+    """Runs the commands of `cmds_list` connected through pipes like a shell
+    pipeline as step `step_name` of `deadline`. The first command reads from
+    the file object `stdin` and the last writes to `stdout` (the inherited
+    streams if `None`), data is streamed between the processes without
+    intermediate copies. The error output of all processes (and the output
+    of the last if `stdout` is `None`) goes to `output_buffer` unless it's
+    `None`. Returns the list of return codes. All processes are killed if
+    the step exceeds its timeout or the deadline is canceled. Only the return
+    codes and the output in `output_buffer` are recorded or replayed if a
+    cassette is active, not the data written to `stdout`."""
+    cassette = openafs_setup_cassette.replaying()
+    if cassette is not None:
+        entry = cassette.replay("pipeline", {"cmds_list": [cassette.redact(cmds) for cmds in cmds_list]})
+        if output_buffer is not None:
+            output_buffer.write(entry["log"])
+        return entry["returncodes"]
+    returncodes = __run_pipeline__(cmds_list, stdin=stdin, stdout=stdout, deadline=deadline, step_timeout=step_timeout, step_name=step_name, output_buffer=output_buffer)
+    cassette = openafs_setup_cassette.recording()
+    if cassette is not None:
+        cassette.record("pipeline", {"cmds_list": [cassette.redact(cmds) for cmds in cmds_list]}, {"returncodes": returncodes, "log": "" if output_buffer is None else cassette.redact(output_buffer.tail())})
+    return returncodes
+
+def __run_pipeline__(cmds_list, stdin=None, stdout=None, deadline=None, step_timeout=step_timeout_default, step_name=None, output_buffer=None):
+    if deadline is None:
+        deadline = Deadline()
+    if step_name is None:
+        step_name = str.join(" | ", [str.join(" ", cmds) for cmds in cmds_list])
+    with deadline.step(step_name, step_timeout) as timeout:
+        start_time = time.time()
+        procs = []
+        reader_threads = []
+        stop_event = threading.Event()
+        proc_stdin = stdin
+        for (index, cmds) in enumerate(cmds_list):
+            if index < len(cmds_list)-1 or (stdout is None and output_buffer is not None):
+                proc_stdout = sp.PIPE
+            else:
+                proc_stdout = stdout
+            proc = sp.Popen(cmds, stdin=proc_stdin, stdout=proc_stdout, stderr=None if output_buffer is None else sp.PIPE)
+            if len(procs) > 0:
+                # allows the previous process to receive SIGPIPE if this one exits
+                procs[-1].stdout.close()
+            if output_buffer is not None:
+                reader_threads.append(output_buffer.start_reader(proc.stderr, stop_event=stop_event))
+                if index == len(cmds_list)-1 and stdout is None:
+                    reader_threads.append(output_buffer.start_reader(proc.stdout, stop_event=stop_event))
+            procs.append(proc)
+            proc_stdin = proc.stdout
+        poll_interval = 0.001
+        try:
+            while any([proc.poll() is None for proc in procs]):
+                if deadline.is_canceled():
+                    raise deadline.exceeded("'%s' has been canceled" % (step_name,))
+                if timeout is not None and time.time()-start_time >= timeout:
+                    raise deadline.exceeded("'%s' didn't finish within %s s" % (step_name, str(timeout)))
+                deadline.wait(poll_interval)
+                poll_interval = min(poll_interval*2, poll_interval_max)
+        finally:
+            for proc in procs:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+            __join_readers__(reader_threads, stop_event, deadline, timeout, start_time, step_name)
+        return [proc.returncode for proc in procs]
+
+class DeadlineSpawn(pexpect.spawn):
+    """A `pexpect.spawn` whose `expect` calls are steps of `deadline` with a
+    timeout of `step_timeout` each."""
+
+    def __init__(self, command, deadline=None, step_timeout=step_timeout_default):
+        pexpect.spawn.__init__(self, command)
+        if deadline is None:
+            deadline = Deadline()
+        self.deadline = deadline
+        self.step_timeout = step_timeout
+        self.step_name = command
+
+    def expect(self, pattern, *args, **kwargs):
+        with self.deadline.step(self.step_name, self.step_timeout) as timeout:
+            self.timeout = timeout
+            try:
+                return pexpect.spawn.expect(self, pattern, *args, **kwargs)
+            except pexpect.TIMEOUT:
+                self.close(force=True)
+                message = "'%s' didn't produce expected output %s within %s s" % (self.step_name, str(pattern), str(timeout))
+                if hasattr(self.logfile_read, "tail"):
+                    message = "%s, %s" % (message, format_tail(self.logfile_read))
+                raise self.deadline.exceeded(message)
+
+def __pattern_key__(pattern):
+    if isinstance(pattern, list):
+        return [__pattern_key__(item) for item in pattern]
+    if pattern is pexpect.EOF:
+        return "<EOF>"
+    if pattern is pexpect.TIMEOUT:
+        return "<TIMEOUT>"
+    return str(pattern)
+
+def __text__(value):
+    if isinstance(value, bytes) and not isinstance(value, str):
+        return value.decode("utf-8", "replace")
+    if value is None or not isinstance(value, str):
+        return None
+    return value
+
+class RecordingSpawn(DeadlineSpawn):
+    """A `DeadlineSpawn` recording its interactions in `cassette`."""
+
+    def __init__(self, command, cassette, deadline=None, step_timeout=step_timeout_default):
+        DeadlineSpawn.__init__(self, command, deadline=deadline, step_timeout=step_timeout)
+        self.cassette = cassette
+        cassette.record("spawn", {"command": cassette.redact(command)}, {})
+
+    def expect(self, pattern, *args, **kwargs):
+        ret_value = DeadlineSpawn.expect(self, pattern, *args, **kwargs)
+        self.cassette.record("expect", {"pattern": self.cassette.redact(__pattern_key__(pattern))}, {"index": ret_value, "before": self.cassette.redact(__text__(self.before)), "after": self.cassette.redact(__text__(self.after))})
+        return ret_value
+
+    def sendline(self, line=""):
+        self.cassette.record("sendline", {"line": self.cassette.redact(line)}, {})
+        return DeadlineSpawn.sendline(self, line)
+
+    def close(self, force=True):
+        DeadlineSpawn.close(self, force=force)
+        self.cassette.record("close", {}, {"exitstatus": self.exitstatus, "signalstatus": self.signalstatus})
+
+class ReplaySpawn(object):
+    """Plays back the interactions of a `pexpect` process from `cassette`
+    without starting it."""
+
+    def __init__(self, command, cassette):
+        self.cassette = cassette
+        self.logfile_read = None
+        self.before = None
+        self.after = None
+        self.exitstatus = None
+        self.signalstatus = None
+        cassette.replay("spawn", {"command": cassette.redact(command)})
+
+    def expect(self, pattern, *args, **kwargs):
+        entry = self.cassette.replay("expect", {"pattern": self.cassette.redact(__pattern_key__(pattern))})
+        self.before = entry["before"]
+        self.after = entry["after"]
+        if self.logfile_read is not None:
+            for value in [self.before, self.after]:
+                if value is not None:
+                    self.logfile_read.write(value)
+        return entry["index"]
+
+    def sendline(self, line=""):
+        self.cassette.replay("sendline", {"line": self.cassette.redact(line)})
+
+    def close(self, force=True):
+        entry = self.cassette.replay("close", {})
+        self.exitstatus = entry["exitstatus"]
+        self.signalstatus = entry["signalstatus"]
+
+def create_spawn(command, deadline=None, step_timeout=step_timeout_default):
+    """Creates a `DeadlineSpawn` for `command` or its recording or replay
+    counterpart if a cassette is active."""
+    cassette = openafs_setup_cassette.replaying()
+    if cassette is not None:
+        return ReplaySpawn(command, cassette)
+    cassette = openafs_setup_cassette.recording()
+    if cassette is not None:
+        return RecordingSpawn(command, cassette, deadline=deadline, step_timeout=step_timeout)
+    return DeadlineSpawn(command, deadline=deadline, step_timeout=step_timeout)
+
+class ReplayProcess(object):
+    """Stands in for a background process during replay, it keeps running
+    until it's terminated."""
+
+    def __init__(self):
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self):
+        return self.returncode
+
+    def send_signal(self, signal_number):
+        self.returncode = -signal_number
+
+    def terminate(self):
+        self.returncode = -15
+
+    def kill(self):
+        self.returncode = -9
+
+def start_background(cmds):
+    """Starts `cmds` as background process with the inherited streams and
+    returns the `subprocess.Popen`. Only the start is recorded or replayed if
+    a cassette is active."""
+    cassette = openafs_setup_cassette.replaying()
+    if cassette is not None:
+        cassette.replay("background", {"cmds": cassette.redact(cmds)})
+        return ReplayProcess()
+    cassette = openafs_setup_cassette.recording()
+    if cassette is not None:
+        cassette.record("background", {"cmds": cassette.redact(cmds)}, {})
+    return sp.Popen(cmds)
+
+class LocalExecutor(object):
+    """Runs commands for `host` on the local machine."""
+
+    def __init__(self, host, deadline=None, step_timeout=step_timeout_default):
+        self.host = host
+        if deadline is None:
+            deadline = Deadline()
+        self.deadline = deadline
+        self.step_timeout = step_timeout
+
+    def __wrap_cmds__(self, cmds):
+        return cmds
+
+    def __run__(self, cmds, capture_output):
+        if type(cmds) != type([]):
+            raise ValueError("cmds has to be a list, but is a %s" % (str(type(cmds),)))
+        logger.info("executing '%s' for host %s" % (str(cmds), self.host))
+        wrapped_cmds = self.__wrap_cmds__(cmds)
+        step_name = "%s: %s" % (self.host, str.join(" ", cmds))
+        output_buffer = create_output_buffer(step_name)
+        try:
+            (returncode, output) = run_command(wrapped_cmds, capture_output=capture_output, deadline=self.deadline, step_timeout=self.step_timeout, step_name=step_name, output_buffer=output_buffer)
+        finally:
+            output_buffer.close()
+        if returncode != 0:
+            logger.error("'%s' failed with return code %d, %s" % (step_name, returncode, format_tail(output_buffer)))
+            raise sp.CalledProcessError(returncode, wrapped_cmds, output=output if capture_output else output_buffer.tail())
+        return output
+
+    def check_call(self, cmds, no_fail=False):
+        try:
+            self.__run__(cmds, capture_output=False)
+        except sp.CalledProcessError as ex:
+            if no_fail:
+                logger.warn(str(ex))
+            else:
+                raise ex
+
+    def check_output(self, cmds):
+        return self.__run__(cmds, capture_output=True)
+
+    def put_file(self, local_file_path, remote_file_path):
+        """Makes the content of `local_file_path` available at
+        `remote_file_path` on `host`."""
+        if os.path.abspath(local_file_path) == os.path.abspath(remote_file_path):
+            return
+        remote_file_parent_path = os.path.dirname(remote_file_path)
+        if remote_file_parent_path != "" and not os.path.exists(remote_file_parent_path):
+            os.makedirs(remote_file_parent_path)
+        shutil.copy(local_file_path, remote_file_path)
+
+class SSHExecutor(LocalExecutor):
+    """Runs commands on `host` through `ssh` (which needs to be configured for
+    non-interactive authentication)."""
+
+    def __init__(self, host, deadline=None, step_timeout=step_timeout_default, ssh=ssh_default, scp=scp_default):
+        LocalExecutor.__init__(self, host, deadline=deadline, step_timeout=step_timeout)
+        self.ssh = ssh
+        self.scp = scp
+
+    def __wrap_cmds__(self, cmds):
+        return [self.ssh, "-o", "BatchMode=yes", self.host, "--"]+[quote(cmd) for cmd in cmds]
+
+    def put_file(self, local_file_path, remote_file_path):
+        logger.info("copying '%s' to %s:%s" % (local_file_path, self.host, remote_file_path))
+        scp_cmds = [self.scp, "-o", "BatchMode=yes", "-p", local_file_path, "%s:%s" % (self.host, remote_file_path)]
+        output_buffer = create_output_buffer(str.join(" ", scp_cmds))
+        try:
+            (returncode, output) = run_command(scp_cmds, deadline=self.deadline, step_timeout=self.step_timeout, output_buffer=output_buffer)
+        finally:
+            output_buffer.close()
+        if returncode != 0:
+            raise sp.CalledProcessError(returncode, scp_cmds, output=output_buffer.tail())
+
+def create_executor(executor, host, deadline=None, step_timeout=step_timeout_default):
+    if executor == EXECUTOR_LOCAL:
+        return LocalExecutor(host, deadline=deadline, step_timeout=step_timeout)
+    elif executor == EXECUTOR_SSH:
+        return SSHExecutor(host, deadline=deadline, step_timeout=step_timeout)
+    else:
+        raise ValueError("executor '%s' isn't supported" % (executor,))
+
+class ServerLimiter(object):
+    """Limits the number of concurrent operations per server (or any other
+    key, e.g. a partition) of `run_parallel` calls."""
+
+    def __init__(self, per_server):
+        self.per_server = per_server
+        self.semaphores = {}
+        self.lock = threading.Lock()
+
+    def semaphore(self, server):
+        with self.lock:
+            if not server in self.semaphores:
+                self.semaphores[server] = threading.BoundedSemaphore(self.per_server)
+            return self.semaphores[server]
+
+def run_parallel(func, items, parallel=parallel_default):
+    """Calls `func` for every item of `items` on a pool of at most `parallel`
+    threads and returns a dictionary mapping items to the return values.
+    Failures don't abort the remaining calls, but cause a `RuntimeError`
+    listing all failed items after all calls finished."""
+    items = list(items)
+    if len(items) == 0:
+        return {}
+    def __call__(item):
+        try:
+            return (item, func(item), None)
+        except Exception as ex:
+            logger.error("processing %s failed: %s" % (str(item), str(ex)))
+            return (item, None, ex)
+    pool = ThreadPool(max(1, min(parallel, len(items))))
+    try:
+        results = pool.map(__call__, items)
+    finally:
+        pool.close()
+        pool.join()
+    failed = [(item, ex) for (item, result, ex) in results if ex is not None]
+    if len(failed) > 0:
+        raise RuntimeError("processing failed for %s" % (str.join(", ", ["%s (%s)" % (str(item), str(ex)) for (item, ex) in failed]),))
+    return dict([(item, result) for (item, result, ex) in results])
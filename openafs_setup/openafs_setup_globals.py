@@ -30,3 +30,13 @@
 from __future__ import absolute_import
 
 app_name = "openafs-setup"
+# directory for state kept between runs of maintenance commands (release
+# state, snapshots, indices)
+state_dir_path_default = "/var/lib/%s" % (app_name,)
+
+def split_list(value):
+    """Splits a comma separated command line option value into a list (`None`
+    stays `None`)."""
+    if value is None:
+        return None
+    return [item for item in value.split(",") if item != ""]
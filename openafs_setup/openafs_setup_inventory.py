@@ -0,0 +1,332 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# A local SQLite index of the VLDB and the volume headers of the fileservers.
+# `vos listvldb` and `vos listvol -long` are written to temporary files and
+# parsed line by line so that large cells don't need to fit into memory. Only
+# entries which changed are written on refresh. Volume headers are keyed by
+# ID, server and partition because all RO replicas share one ID.
+
+from __future__ import absolute_import
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import time
+import plac
+import openafs_setup.openafs_setup_globals as openafs_setup_globals
+from openafs_setup.openafs_setup_paths import PATH_MODES, openafs_paths
+from openafs_setup.openafs_setup_executor import parallel_default, step_timeout_default, Deadline, run_parallel, run_pipeline
+from openafs_setup.openafs_setup_vos import parse_vldb_site
+from openafs_setup.openafs_setup_output import create_output_buffer, format_tail
+
+logger = logging.getLogger(__name__)
+
+inventory_file_path_default = os.path.join(openafs_setup_globals.state_dir_path_default, "inventory.sqlite")
+vos_date_format = "%a %b %d %H:%M:%S %Y"
+
+REPLICA_STATE_UNREPLICATED = "unreplicated"
+REPLICA_STATE_REPLICATED = "replicated"
+REPLICA_STATE_UNRELEASED = "unreleased"
+REPLICA_STATES = set([REPLICA_STATE_UNREPLICATED, REPLICA_STATE_REPLICATED, REPLICA_STATE_UNRELEASED])
+
+SCHEMA = [
+    "create table if not exists vldb_entries (name text primary key, rw_id integer, ro_id integer, bk_id integer, locked integer, ro_count integer, unreleased integer, refreshed real)",
+    "create table if not exists vldb_sites (name text, server text, partition text, type text, flags text)",
+    "create index if not exists vldb_sites_name on vldb_sites (name)",
+    "create index if not exists vldb_sites_server_partition on vldb_sites (server, partition)",
+    "create table if not exists volume_headers (id integer, name text, type text, server text, partition text, size integer, status text, max_quota integer, last_update integer, refreshed real, primary key (id, server, partition))",
+    "create index if not exists volume_headers_name on volume_headers (name)",
+    "create index if not exists volume_headers_server_partition on volume_headers (server, partition)",
+    "create index if not exists volume_headers_size on volume_headers (size)",
+    "create table if not exists server_refreshes (server text primary key, refreshed real)",
+]
+
+def parse_vos_date(date):
+    """Converts a date of `vos` output to seconds since the epoch (`0` for
+    `Never` or unparsable dates)."""
+    try:
+        return int(time.mktime(time.strptime(date.strip(), vos_date_format)))
+    except ValueError:
+        return 0
+
+def iter_vos_listvldb(lines):
+    """Parses `vos listvldb` output from the iterable `lines` and yields a
+    dictionary with the keys `name`, `rw_id`, `ro_id`, `bk_id` (`None` if
+    missing), `locked` and `sites` (see `parse_vldb_site`) per entry."""
+    entry = None
+    for line in lines:
+        line = line.rstrip("\n")
+        name_match = re.match("^(?P<name>\\S+)\\s*$", line)
+        if name_match is not None:
+            if entry is not None:
+                yield entry
+            entry = {"name": name_match.group("name"), "rw_id": None, "ro_id": None, "bk_id": None, "locked": False, "sites": []}
+            continue
+        if entry is None:
+            continue
+        ids = dict(re.findall("(RWrite|ROnly|Backup):\\s*([0-9]+)", line))
+        if len(ids) > 0:
+            for (key, id_key) in [("RWrite", "rw_id"), ("ROnly", "ro_id"), ("Backup", "bk_id")]:
+                if key in ids:
+                    entry[id_key] = int(ids[key])
+            continue
+        if "Volume is currently LOCKED" in line:
+            entry["locked"] = True
+            continue
+        site = parse_vldb_site(line)
+        if site is not None:
+            entry["sites"].append(site)
+    if entry is not None:
+        yield entry
+
+def iter_vos_listvol_long(lines):
+    """Parses `vos listvol -long` output from the iterable `lines` and yields a
+    dictionary with the keys `name`, `id`, `type`, `size` (in KB), `status`,
+    `server`, `partition`, `max_quota` (in KB) and `last_update` (seconds
+    since the epoch) per volume header."""
+    header = None
+    for line in lines:
+        line = line.rstrip("\n")
+        header_match = re.match("^(?P<name>\\S+)\\s+(?P<id>[0-9]+)\\s+(?P<type>RW|RO|BK)\\s+(?P<size>[0-9]+) K\\s+(?P<status>\\S+)", line)
+        if header_match is not None:
+            if header is not None:
+                yield header
+            header = {"name": header_match.group("name"), "id": int(header_match.group("id")), "type": header_match.group("type"), "size": int(header_match.group("size")), "status": header_match.group("status"), "server": None, "partition": None, "max_quota": None, "last_update": 0}
+            continue
+        if header is None:
+            continue
+        if line.strip() == "":
+            # volumes are separated by empty lines, the totals follow the last one
+            yield header
+            header = None
+            continue
+        location_match = re.match("^\\s+(?P<server>\\S+)\\s+(?P<partition>/vicep[a-z]{1,2})\\s*$", line)
+        if location_match is not None:
+            header["server"] = location_match.group("server")
+            header["partition"] = location_match.group("partition")
+            continue
+        max_quota_match = re.match("^\\s+MaxQuota\\s+(?P<max_quota>[0-9]+) K", line)
+        if max_quota_match is not None:
+            header["max_quota"] = int(max_quota_match.group("max_quota"))
+            continue
+        last_update_match = re.match("^\\s+Last Update\\s+(?P<date>.+?)\\s*$", line)
+        if last_update_match is not None:
+            header["last_update"] = parse_vos_date(last_update_match.group("date"))
+    if header is not None:
+        yield header
+
+def open_inventory(inventory_file_path):
+    inventory_file_parent_path = os.path.dirname(inventory_file_path)
+    if inventory_file_parent_path != "" and not os.path.exists(inventory_file_parent_path):
+        os.makedirs(inventory_file_parent_path)
+    connection = sqlite3.connect(inventory_file_path)
+    volume_header_keys = [row[1] for row in connection.execute("pragma table_info(volume_headers)").fetchall() if row[5] > 0]
+    if volume_header_keys == ["id"]:
+        # inventories of older versions kept one header per ID only, the
+        # headers are read again on the next refresh
+        logger.info("dropping volume headers of inventory '%s' with an outdated schema" % (inventory_file_path,))
+        connection.execute("drop table volume_headers")
+        connection.execute("delete from server_refreshes")
+        connection.commit()
+    for statement in SCHEMA:
+        connection.execute(statement)
+    return connection
+
+def __run_to_file__(cmds, deadline, step_timeout):
+    """Runs `cmds` with its output written to a temporary file and returns the
+    file's path."""
+    (output_file_fd, output_file_path) = tempfile.mkstemp(prefix="%s-inventory-" % (openafs_setup_globals.app_name,))
+    output_buffer = create_output_buffer(str.join(" ", cmds))
+    with os.fdopen(output_file_fd, "w") as output_file:
+        returncodes = run_pipeline([cmds], stdout=output_file, deadline=deadline, step_timeout=step_timeout, output_buffer=output_buffer)
+    output_buffer.close()
+    if returncodes != [0]:
+        os.remove(output_file_path)
+        raise RuntimeError("'%s' failed with return code %d, %s" % (str.join(" ", cmds), returncodes[0], format_tail(output_buffer)))
+    return output_file_path
+
+def store_vldb_entries(connection, entries, refreshed):
+    """Writes the VLDB `entries` (an iterable) into the inventory and deletes
+    the stored entries which aren't part of it. Returns the tuple
+    `(changed_count, deleted_count)`."""
+    changed_count = 0
+    connection.execute("create temporary table if not exists seen_names (name text primary key)")
+    connection.execute("delete from seen_names")
+    for entry in entries:
+        ro_sites = [site for site in entry["sites"] if site["type"] == "RO"]
+        unreleased = len([site for site in entry["sites"] if site["flags"] is not None]) > 0
+        row = (entry["rw_id"], entry["ro_id"], entry["bk_id"], int(entry["locked"]), len(ro_sites), int(unreleased))
+        sites = sorted([(site["server"], site["partition"], site["type"], site["flags"]) for site in entry["sites"]], key=lambda site: tuple([str(value) for value in site]))
+        connection.execute("insert or ignore into seen_names values (?)", (entry["name"],))
+        stored_row = connection.execute("select rw_id, ro_id, bk_id, locked, ro_count, unreleased from vldb_entries where name = ?", (entry["name"],)).fetchone()
+        stored_sites = sorted([tuple(stored_site) for stored_site in connection.execute("select server, partition, type, flags from vldb_sites where name = ?", (entry["name"],))], key=lambda site: tuple([str(value) for value in site]))
+        if stored_row is not None and tuple(stored_row) == row and stored_sites == sites:
+            continue
+        connection.execute("insert or replace into vldb_entries values (?, ?, ?, ?, ?, ?, ?, ?)", (entry["name"],)+row+(refreshed,))
+        connection.execute("delete from vldb_sites where name = ?", (entry["name"],))
+        connection.executemany("insert into vldb_sites values (?, ?, ?, ?, ?)", [(entry["name"],)+site for site in sites])
+        changed_count += 1
+    stale_names = [row[0] for row in connection.execute("select name from vldb_entries where name not in (select name from seen_names)").fetchall()]
+    for stale_name in stale_names:
+        connection.execute("delete from vldb_entries where name = ?", (stale_name,))
+        connection.execute("delete from vldb_sites where name = ?", (stale_name,))
+    return (changed_count, len(stale_names))
+
+def store_volume_headers(connection, headers, server, refreshed):
+    """Writes the volume `headers` (an iterable) of `server` into the
+    inventory, skipping those whose update time and size didn't change, and
+    deletes the stored headers of `server` which aren't part of it. Returns
+    the tuple `(changed_count, deleted_count)`."""
+    changed_count = 0
+    connection.execute("create temporary table if not exists seen_ids (id integer, server text, partition text, primary key (id, server, partition))")
+    connection.execute("delete from seen_ids")
+    for header in headers:
+        if header["server"] is None:
+            header["server"] = server
+        key = (header["id"], header["server"], header["partition"])
+        connection.execute("insert or ignore into seen_ids values (?, ?, ?)", key)
+        row = (header["name"], header["type"], header["server"], header["partition"], header["size"], header["status"], header["max_quota"], header["last_update"])
+        stored_row = connection.execute("select name, type, server, partition, size, status, max_quota, last_update from volume_headers where id = ? and server = ? and partition = ?", key).fetchone()
+        if stored_row is not None and tuple(stored_row) == row:
+            continue
+        connection.execute("insert or replace into volume_headers values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", (header["id"],)+row+(refreshed,))
+        changed_count += 1
+    deleted_count = connection.execute("delete from volume_headers where server = ? and not exists (select 1 from seen_ids s where s.id = volume_headers.id and s.server = volume_headers.server and s.partition = volume_headers.partition)", (server,)).rowcount
+    connection.execute("insert or replace into server_refreshes values (?, ?)", (server, refreshed))
+    return (changed_count, deleted_count)
+
+def refresh(connection, vos, fileservers, vldb=True, max_age=None, parallel=parallel_default, deadline=None, step_timeout=step_timeout_default):
+    """Refreshes the VLDB entries (unless `vldb` is `False`) and the volume
+    headers of `fileservers` whose last refresh is older than `max_age`
+    seconds (all if `None`). The `vos` commands run concurrently while the
+    inventory is written by the calling thread."""
+    if deadline is None:
+        deadline = Deadline()
+    start_time = time.time()
+    if max_age is not None:
+        refresh_times = dict(connection.execute("select server, refreshed from server_refreshes").fetchall())
+        fileservers = [fileserver for fileserver in fileservers if start_time-refresh_times.get(fileserver, 0) > max_age]
+    # `None` stands for the VLDB
+    jobs = {fileserver: [vos, "listvol", fileserver, "-long", "-localauth"] for fileserver in fileservers}
+    if vldb:
+        jobs[None] = [vos, "listvldb", "-localauth"]
+    output_file_paths = run_parallel(lambda fileserver: __run_to_file__(jobs[fileserver], deadline, step_timeout), list(jobs.keys()), parallel=parallel)
+    try:
+        for fileserver in jobs.keys():
+            with open(output_file_paths[fileserver], "r") as output_file:
+                if fileserver is None:
+                    (changed_count, deleted_count) = store_vldb_entries(connection, iter_vos_listvldb(output_file), start_time)
+                    logger.info("refreshed VLDB entries: %d changed, %d deleted" % (changed_count, deleted_count))
+                else:
+                    (changed_count, deleted_count) = store_volume_headers(connection, iter_vos_listvol_long(output_file), fileserver, start_time)
+                    logger.info("refreshed volume headers of %s: %d changed, %d deleted" % (fileserver, changed_count, deleted_count))
+            connection.commit()
+    finally:
+        for output_file_path in output_file_paths.values():
+            os.remove(output_file_path)
+    logger.info("refreshed inventory in %f s" % (time.time()-start_time,))
+
+def query(connection, prefix=None, server=None, partition=None, min_size=None, max_size=None, replica_state=None):
+    """Returns the list of tuples `(name, id, type, server, partition, size,
+    status)` of the volume headers matching all given criteria. Volumes
+    without known header aren't returned."""
+    conditions = []
+    args = []
+    if prefix is not None:
+        # `like` would treat `_` in volume names as wildcard
+        conditions.append("substr(h.name, 1, ?) = ?")
+        args += [len(prefix), prefix]
+    if server is not None:
+        conditions.append("h.server = ?")
+        args.append(server)
+    if partition is not None:
+        conditions.append("h.partition = ?")
+        args.append(partition)
+    if min_size is not None:
+        conditions.append("h.size >= ?")
+        args.append(min_size)
+    if max_size is not None:
+        conditions.append("h.size <= ?")
+        args.append(max_size)
+    if replica_state is not None:
+        if not replica_state in REPLICA_STATES:
+            raise ValueError("replica_state '%s' isn't supported (has to be one of %s)" % (replica_state, str(sorted(REPLICA_STATES))))
+        # replicas and backups are named after the RW volume with a suffix
+        base_name = "case when h.type = 'RW' then h.name else substr(h.name, 1, length(h.name)-case when h.type = 'RO' then 9 else 7 end) end"
+        if replica_state == REPLICA_STATE_UNREPLICATED:
+            conditions.append("exists (select 1 from vldb_entries v where v.name = %s and v.ro_count = 0)" % (base_name,))
+        elif replica_state == REPLICA_STATE_REPLICATED:
+            conditions.append("exists (select 1 from vldb_entries v where v.name = %s and v.ro_count > 0 and v.unreleased = 0)" % (base_name,))
+        else:
+            conditions.append("exists (select 1 from vldb_entries v where v.name = %s and v.unreleased = 1)" % (base_name,))
+    statement = "select h.name, h.id, h.type, h.server, h.partition, h.size, h.status from volume_headers h"
+    if len(conditions) > 0:
+        statement += " where %s" % (str.join(" and ", conditions),)
+    statement += " order by h.name, h.type"
+    return connection.execute(statement, args).fetchall()
+
+@plac.annotations(path_mode=plac.Annotation("The path mode of the OpenAFS installation", "positional", type=str, choices=PATH_MODES),
+    inventory_file_path=plac.Annotation("The SQLite database file of the inventory", "option"),
+    skip_vldb=plac.Annotation("A flag indicating that only the volume headers of the fileservers ought to be refreshed", "flag"),
+    max_age=plac.Annotation("Only refreshes fileservers whose last refresh is older than this many seconds (all if omitted)", "option", type=float),
+    parallel=plac.Annotation("The maximum number of `vos` commands to run concurrently", "option", type=int),
+    step_timeout=plac.Annotation("The time in seconds every command may take", "option", type=float),
+    timeout=plac.Annotation("The time in seconds the whole refresh may take (no limit if omitted)", "option", type=float),
+    fileservers=plac.Annotation("The fileservers whose volume headers ought to be refreshed"),
+)
+def refresh_inventory(path_mode, inventory_file_path=inventory_file_path_default, skip_vldb=False, max_age=None, parallel=parallel_default, step_timeout=step_timeout_default, timeout=None, *fileservers):
+    connection = open_inventory(inventory_file_path)
+    try:
+        refresh(connection, openafs_paths(path_mode)["vos"], fileservers, vldb=not skip_vldb, max_age=max_age, parallel=parallel, deadline=Deadline(timeout), step_timeout=step_timeout)
+    finally:
+        connection.close()
+
+@plac.annotations(inventory_file_path=plac.Annotation("The SQLite database file of the inventory", "option"),
+    prefix=plac.Annotation("Only lists volumes whose name starts with this prefix", "option"),
+    server=plac.Annotation("Only lists volumes on this server", "option"),
+    partition=plac.Annotation("Only lists volumes on this partition", "option"),
+    min_size=plac.Annotation("Only lists volumes with at least this size in KB", "option", type=int),
+    max_size=plac.Annotation("Only lists volumes with at most this size in KB", "option", type=int),
+    replica_state=plac.Annotation("Only lists volumes in this replication state", "option", type=str, choices=REPLICA_STATES),
+)
+def query_inventory(inventory_file_path=inventory_file_path_default, prefix=None, server=None, partition=None, min_size=None, max_size=None, replica_state=None):
+    if not os.path.exists(inventory_file_path):
+        raise ValueError("inventory '%s' doesn't exist, create it with `refresh-inventory`" % (inventory_file_path,))
+    connection = open_inventory(inventory_file_path)
+    try:
+        start_time = time.time()
+        rows = query(connection, prefix=prefix, server=server, partition=partition, min_size=min_size, max_size=max_size, replica_state=replica_state)
+        for (name, volume_id, volume_type, volume_server, volume_partition, size, status) in rows:
+            print("%s\t%d\t%s\t%s\t%s\t%d\t%s" % (name, volume_id, volume_type, volume_server, volume_partition, size, status))
+        logger.info("found %d volumes in %f s" % (len(rows), time.time()-start_time))
+    finally:
+        connection.close()
@@ -0,0 +1,304 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Journal of the artifacts created by the setup and the `reset` command which
+# undoes them. The setup records every file, directory, key, database and
+# daemon before creating it, so that `reset` stops the daemons and removes
+# exactly these artifacts (files which existed before are restored from a
+# backup) instead of requiring the host to be reimaged.
+
+from __future__ import absolute_import
+import errno
+import json
+import logging
+import os
+import shutil
+import signal
+import plac
+import openafs_setup.openafs_setup_globals as openafs_setup_globals
+from openafs_setup.openafs_setup_paths import openafs_paths, kdb5_util, service
+from openafs_setup.openafs_setup_executor import EXECUTOR_LOCAL, step_timeout_default, Deadline, create_executor
+from openafs_setup.openafs_setup_namespace import namespace_root_path, namespace_cmds
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FILE = "file"
+ARTIFACT_DIRECTORY = "directory"
+ARTIFACT_PARTITION = "partition"
+ARTIFACT_KEY = "key"
+ARTIFACT_KDC_DATABASE = "kdc_database"
+ARTIFACT_SERVICE = "service"
+ARTIFACT_PROCESS = "process"
+ARTIFACT_BOSSERVER = "bosserver"
+# artifacts which are running daemons and are stopped before anything is
+# removed
+DAEMON_ARTIFACTS = set([ARTIFACT_SERVICE, ARTIFACT_PROCESS, ARTIFACT_BOSSERVER])
+journal_file_name = "setup-journal.json"
+journal_file_path_default = os.path.join(openafs_setup_globals.state_dir_path_default, journal_file_name)
+process_stop_interval = 0.05
+
+class Journal(object):
+    """The artifacts created by the setup in `journal_file_path` in the order
+    of their creation. The journal is saved after every entry in order to
+    allow the reset of a failed setup. Recording an artifact twice (e.g. in a
+    second setup run) keeps the first entry, so that the state before the
+    first run is restored.
+
+    Pathes are recorded as seen from outside the mount namespace of
+    `namespace`, the commands of `reset` run inside it."""
+
+    def __init__(self, journal_file_path, path_mode, krb_path_mode, namespace=None, mount_paths=None):
+        self.journal_file_path = journal_file_path
+        self.backup_dir_path = "%s.backup" % (journal_file_path,)
+        self.content = load_journal(journal_file_path)
+        if self.content is None:
+            self.content = {"path_mode": path_mode, "krb_path_mode": krb_path_mode, "namespace": namespace, "mount_paths": mount_paths, "entries": []}
+        elif self.content["path_mode"] != path_mode or self.content["krb_path_mode"] != krb_path_mode:
+            raise ValueError("journal '%s' has been recorded with path mode %s and Kerberos path mode %s, reset it before running the setup with other path modes" % (journal_file_path, self.content["path_mode"], self.content["krb_path_mode"]))
+
+    def __record__(self, entry):
+        if entry in self.content["entries"]:
+            return
+        self.content["entries"].append(entry)
+        save_journal(self.content, self.journal_file_path)
+
+    def __has_path__(self, kind, path):
+        return any([entry["kind"] == kind and entry["path"] == path for entry in self.content["entries"]])
+
+    def file(self, path):
+        """Records that `path` is about to be created or overwritten. An
+        existing file is backed up in order to be restored by `reset`."""
+        if self.__has_path__(ARTIFACT_FILE, path):
+            return
+        backup_path = None
+        if os.path.isfile(path):
+            if not os.path.exists(self.backup_dir_path):
+                os.makedirs(self.backup_dir_path)
+            backup_path = os.path.join(self.backup_dir_path, "%d-%s" % (len(self.content["entries"]), os.path.basename(path)))
+            shutil.copy2(path, backup_path)
+        self.__record__({"kind": ARTIFACT_FILE, "path": path, "backup_path": backup_path})
+
+    def directory(self, path):
+        """Records the topmost missing directory of `path` which is about to be
+        created with `os.makedirs` (nothing if `path` exists)."""
+        created_path = None
+        path = os.path.abspath(path)
+        while not os.path.exists(path):
+            created_path = path
+            path = os.path.dirname(path)
+        if created_path is not None and not self.__has_path__(ARTIFACT_DIRECTORY, created_path):
+            self.__record__({"kind": ARTIFACT_DIRECTORY, "path": created_path})
+
+    def partition(self, path):
+        """Records the entries of the vice partition `path` before the
+        fileserver starts. `reset` removes everything else (volume headers
+        and `AFSIDat`) while leaving the partition mounted."""
+        if os.path.isdir(path) and not self.__has_path__(ARTIFACT_PARTITION, path):
+            self.__record__({"kind": ARTIFACT_PARTITION, "path": path, "existing": sorted(os.listdir(path))})
+
+    def key(self, kvno):
+        """Records a server key added to the KeyFile with `asetkey add`."""
+        self.__record__({"kind": ARTIFACT_KEY, "kvno": kvno})
+
+    def kdc_database(self, krb_realm):
+        self.__record__({"kind": ARTIFACT_KDC_DATABASE, "krb_realm": krb_realm})
+
+    def service(self, name):
+        """Records a system service which has been (re)started."""
+        self.__record__({"kind": ARTIFACT_SERVICE, "name": name})
+
+    def process(self, name, pid_file_path):
+        """Records a daemon started from `name` which writes its PID to
+        `pid_file_path`."""
+        self.__record__({"kind": ARTIFACT_PROCESS, "name": name, "pid_file_path": pid_file_path})
+
+    def bosserver(self, machine_name, pid_file_path):
+        """Records a bosserver which is shut down with `bos shutdown` before
+        it's stopped."""
+        self.__record__({"kind": ARTIFACT_BOSSERVER, "machine_name": machine_name, "pid_file_path": pid_file_path})
+
+def journal_file_path_for(namespace):
+    """Returns the default journal file of `namespace` (which can be
+    `None`)."""
+    if namespace is None:
+        return journal_file_path_default
+    return os.path.join(namespace_root_path(namespace), journal_file_name)
+
+def load_journal(journal_file_path):
+    """Returns the content of the journal or `None` if it doesn't exist."""
+    if not os.path.exists(journal_file_path):
+        return None
+    with open(journal_file_path, "r") as journal_file:
+        return json.load(journal_file)
+
+def save_journal(content, journal_file_path):
+    journal_file_parent_path = os.path.dirname(journal_file_path)
+    if not os.path.exists(journal_file_parent_path):
+        os.makedirs(journal_file_parent_path)
+    tmp_file_path = "%s.tmp" % (journal_file_path,)
+    with open(tmp_file_path, "w") as tmp_file:
+        json.dump(content, tmp_file, indent=2, sort_keys=True)
+    os.rename(tmp_file_path, journal_file_path)
+
+def describe_entry(entry):
+    if entry["kind"] == ARTIFACT_FILE:
+        if entry["backup_path"] is not None:
+            return "restore %s" % (entry["path"],)
+        return "remove %s" % (entry["path"],)
+    elif entry["kind"] in [ARTIFACT_DIRECTORY, ARTIFACT_PARTITION]:
+        return "remove %s %s" % (entry["kind"], entry["path"])
+    elif entry["kind"] == ARTIFACT_KEY:
+        return "delete key %s" % (entry["kvno"],)
+    elif entry["kind"] == ARTIFACT_KDC_DATABASE:
+        return "destroy KDC database of %s" % (entry["krb_realm"],)
+    elif entry["kind"] in [ARTIFACT_SERVICE, ARTIFACT_PROCESS]:
+        return "stop %s" % (entry["name"],)
+    elif entry["kind"] == ARTIFACT_BOSSERVER:
+        return "stop bosserver on %s" % (entry["machine_name"],)
+    raise ValueError("unknown journal entry kind '%s'" % (entry["kind"],))
+
+def __process_running__(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as ex:
+        if ex.errno == errno.ESRCH:
+            return False
+        raise ex
+    # a zombie has exited already, but is still listed until its parent
+    # collects it
+    try:
+        with open("/proc/%d/stat" % (pid,), "r") as stat_file:
+            return stat_file.read().rsplit(")", 1)[-1].split()[0] != "Z"
+    except (IOError, OSError):
+        return True # no `/proc`
+
+def stop_process(name, pid_file_path, deadline=None, step_timeout=step_timeout_default):
+    """Terminates the daemon whose PID is in `pid_file_path` and waits for it
+    to exit (kills it after `step_timeout`). A PID which has been reused by
+    another program (according to `/proc`) is left alone."""
+    if deadline is None:
+        deadline = Deadline()
+    if not os.path.exists(pid_file_path):
+        logger.warn("PID file '%s' of %s doesn't exist, assuming it isn't running" % (pid_file_path, name))
+        return
+    with open(pid_file_path, "r") as pid_file:
+        pid = int(pid_file.read().strip())
+    comm_file_path = "/proc/%d/comm" % (pid,)
+    if os.path.exists(comm_file_path):
+        with open(comm_file_path, "r") as comm_file:
+            comm = comm_file.read().strip()
+        if not os.path.basename(name).startswith(comm): # `comm` is truncated to 15 characters
+            logger.warn("process %d of PID file '%s' is %s instead of %s, not stopping it" % (pid, pid_file_path, comm, name))
+            return
+    if not __process_running__(pid):
+        return
+    os.kill(pid, signal.SIGTERM)
+    stop_deadline = Deadline(deadline.timeout_for(step_timeout))
+    while __process_running__(pid):
+        if stop_deadline.wait(process_stop_interval):
+            logger.warn("%s (PID %d) didn't exit after SIGTERM, killing it" % (name, pid))
+            os.kill(pid, signal.SIGKILL)
+            break
+
+def reset_entry(entry, paths, executor, namespace=None, mount_paths=None, deadline=None, step_timeout=step_timeout_default):
+    """Undoes the artifact of the journal entry `entry`. Commands run in the
+    mount namespace of `namespace` with `mount_paths`."""
+    def __check_call__(cmds):
+        executor.check_call(namespace_cmds(cmds, namespace, mount_paths), no_fail=True)
+    kind = entry["kind"]
+    if kind == ARTIFACT_FILE:
+        if entry["backup_path"] is not None:
+            shutil.copy2(entry["backup_path"], entry["path"])
+        elif os.path.lexists(entry["path"]):
+            os.remove(entry["path"])
+    elif kind == ARTIFACT_DIRECTORY:
+        if os.path.exists(entry["path"]):
+            shutil.rmtree(entry["path"])
+    elif kind == ARTIFACT_PARTITION:
+        if os.path.isdir(entry["path"]):
+            for name in sorted(set(os.listdir(entry["path"]))-set(entry["existing"])):
+                path = os.path.join(entry["path"], name)
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+    elif kind == ARTIFACT_KEY:
+        __check_call__([paths["asetkey"], "delete", entry["kvno"]]) # fails if the key has been deleted otherwise
+    elif kind == ARTIFACT_KDC_DATABASE:
+        __check_call__([kdb5_util, "-r", entry["krb_realm"], "destroy", "-f"]) # fails if the database doesn't exist anymore
+    elif kind == ARTIFACT_SERVICE:
+        __check_call__([service, entry["name"], "stop"])
+    elif kind == ARTIFACT_PROCESS:
+        stop_process(entry["name"], entry["pid_file_path"], deadline=deadline, step_timeout=step_timeout)
+    elif kind == ARTIFACT_BOSSERVER:
+        # stops the server processes cleanly before the bosserver exits
+        __check_call__([paths["bos"], "shutdown", entry["machine_name"], "-wait", "-localauth"])
+        stop_process(paths["bosserver"], entry["pid_file_path"], deadline=deadline, step_timeout=step_timeout)
+    else:
+        raise ValueError("unknown journal entry kind '%s'" % (kind,))
+
+def reset_journal(journal_file_path, dry_run=False, deadline=None, step_timeout=step_timeout_default):
+    """Stops the daemons of the journal and then removes the other artifacts
+    in reverse order of their creation. Every undone entry is removed from
+    the journal immediately, so that a failed reset can be continued. The
+    journal and its backups are deleted at the end."""
+    content = load_journal(journal_file_path)
+    if content is None:
+        logger.info("journal '%s' doesn't exist, nothing to reset" % (journal_file_path,))
+        return
+    paths = openafs_paths(content["path_mode"])
+    executor = create_executor(EXECUTOR_LOCAL, "localhost", deadline=deadline, step_timeout=step_timeout)
+    entries = list(reversed(content["entries"]))
+    entries = [entry for entry in entries if entry["kind"] in DAEMON_ARTIFACTS]+[entry for entry in entries if not entry["kind"] in DAEMON_ARTIFACTS]
+    for entry in entries:
+        logger.info("%s%s" % ("would " if dry_run else "", describe_entry(entry)))
+        if dry_run:
+            continue
+        reset_entry(entry, paths, executor, namespace=content.get("namespace"), mount_paths=content.get("mount_paths"), deadline=deadline, step_timeout=step_timeout)
+        content["entries"].remove(entry)
+        save_journal(content, journal_file_path)
+    if dry_run:
+        return
+    backup_dir_path = "%s.backup" % (journal_file_path,)
+    if os.path.exists(backup_dir_path):
+        shutil.rmtree(backup_dir_path)
+    os.remove(journal_file_path)
+    logger.info("reset %d artifacts of journal '%s'" % (len(entries), journal_file_path))
+
+@plac.annotations(journal_file_path=plac.Annotation("The journal of the artifacts created by the setup (defaults to the journal of the namespace)", "option"),
+    namespace=plac.Annotation("The namespace of the cell to reset", "option"),
+    dry_run=plac.Annotation("A flag indicating that the artifacts ought to be listed only", "flag"),
+    step_timeout=plac.Annotation("The time in seconds every command or daemon shutdown may take", "option", type=float),
+    timeout=plac.Annotation("The time in seconds the whole reset may take (no limit if omitted)", "option", type=float),
+)
+def reset(journal_file_path=None, namespace=None, dry_run=False, step_timeout=step_timeout_default, timeout=None):
+    if journal_file_path is None:
+        journal_file_path = journal_file_path_for(namespace)
+    reset_journal(journal_file_path, dry_run=dry_run, deadline=Deadline(timeout), step_timeout=step_timeout)
@@ -0,0 +1,209 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+# Replica KDCs: the master creates host keys for all replicas, merges them into
+# the host keytabs of the replicas, copies the master key stash and
+# `kpropd.acl` to them, dumps its database once with `kdb5_util dump` and
+# pushes the dump with `kprop` to all replicas concurrently. The local executor
+# together with stand-ins for the Kerberos binaries in `PATH` allows to test
+# this on one machine (the host keys of the stand-in replicas are added to the
+# master's host keytab and only one `kpropd` and `krb5kdc` are started then).
+
+from __future__ import absolute_import
+import logging
+import os
+import tempfile
+import time
+import plac
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+import openafs_setup.openafs_setup_globals as openafs_setup_globals
+from openafs_setup.openafs_setup_globals import split_list
+from openafs_setup.openafs_setup_paths import KRB_PATH_MODES, KRB_PATH_MODE_UBUNTU, krb_paths, stash_file_path, kadmin_local, kdb5_util, kprop, kpropd, krb5kdc, klist, ktutil, service
+from openafs_setup.openafs_setup_executor import EXECUTOR_LOCAL, EXECUTORS, parallel_default, step_timeout_default, Deadline, create_executor, run_parallel
+
+logger = logging.getLogger(__name__)
+
+dump_file_path_default = os.path.join(openafs_setup_globals.state_dir_path_default, "kdc", "replica_datatrans")
+keytab_dir_path_default = os.path.join(openafs_setup_globals.state_dir_path_default, "kdc")
+cron_file_path = "/etc/cron.d/%s-kprop" % (openafs_setup_globals.app_name,)
+propagation_interval_default = 10 # in minutes
+
+def host_principal(host, krb_realm):
+    return "host/%s@%s" % (host, krb_realm)
+
+def kpropd_acl_content(master, replicas, krb_realm):
+    """Every KDC accepts propagations from all others so that a replica can be
+    promoted to master without changing the ACLs."""
+    return str.join("", ["%s\n" % (host_principal(host, krb_realm),) for host in [master]+list(replicas)])
+
+def create_host_principal(local_executor, host, krb_realm):
+    """Creates the host principal of `host` with a random key unless it
+    exists."""
+    local_executor.check_call([kadmin_local, "-q", "addprinc -randkey %s" % (host_principal(host, krb_realm),)], no_fail=True) # fails if the principal exists
+
+def keytab_has_principal(executor, keytab_file_path, principal):
+    """Checks whether `keytab_file_path` on the host of `executor` contains a
+    key of `principal` (a missing keytab doesn't)."""
+    klist_output = executor.check_output(["sh", "-c", "%s -k %s 2>/dev/null || true" % (klist, quote(keytab_file_path))])
+    return any([line.split()[-1] == principal for line in klist_output.splitlines() if len(line.split()) >= 2])
+
+def merge_keytab_cmds(source_keytab_file_path, target_keytab_file_path):
+    """Appends the keys of `source_keytab_file_path` to
+    `target_keytab_file_path` keeping the other keys of the target with
+    `ktutil` and removes the source."""
+    return ["sh", "-c", "printf '%%s\\n' %s %s quit | %s && rm -f %s" % (quote("rkt %s" % (source_keytab_file_path,)), quote("wkt %s" % (target_keytab_file_path,)), ktutil, quote(source_keytab_file_path))]
+
+def cron_schedule(interval):
+    """The cron schedule (the five time fields) running every `interval`
+    minutes which has to be less than an hour, a whole number of hours less
+    than a day or a day."""
+    if interval >= 1 and interval < 60:
+        return "*/%d * * * *" % (interval,)
+    if interval >= 60 and interval % 60 == 0 and interval//60 < 24:
+        return "0 */%d * * *" % (interval//60,)
+    if interval == 24*60:
+        return "0 0 * * *"
+    raise ValueError("interval %d can't be expressed as cron schedule (has to be less than 60 minutes, whole hours less than a day or 1440)" % (interval,))
+
+def add_host_key(local_executor, host, krb_realm, keytab_file_path):
+    """Adds the current key of the host principal of `host` to
+    `keytab_file_path` (`ktadd` appends to an existing keytab) unless the
+    keytab contains it already. `-norandkey` keeps the key, so that repeated
+    runs don't invalidate keytabs which have been distributed before."""
+    if keytab_has_principal(local_executor, keytab_file_path, host_principal(host, krb_realm)):
+        return
+    local_executor.check_call([kadmin_local, "-q", "ktadd -norandkey -k %s %s" % (keytab_file_path, host_principal(host, krb_realm))])
+
+def propagate(local_executor, replicas, dump_file_path, parallel=parallel_default):
+    """Dumps the KDC database once and pushes it to all `replicas`
+    concurrently. Returns a dictionary mapping replicas to the time in seconds
+    their propagation took."""
+    start_time = time.time()
+    dump_file_parent_path = os.path.dirname(dump_file_path)
+    if not os.path.exists(dump_file_parent_path):
+        os.makedirs(dump_file_parent_path)
+    local_executor.check_call([kdb5_util, "dump", dump_file_path])
+    logger.info("dumped KDC database in %f s" % (time.time()-start_time,))
+    def __kprop__(replica):
+        kprop_start_time = time.time()
+        local_executor.check_call([kprop, "-f", dump_file_path, replica])
+        return time.time()-kprop_start_time
+    ret_value = run_parallel(__kprop__, replicas, parallel=parallel)
+    logger.info("propagated KDC database to %d replicas in %f s" % (len(replicas), time.time()-start_time))
+    return ret_value
+
+@plac.annotations(krb_path_mode=plac.Annotation("The pathes to use for kerberos on the master and the replicas", "positional", type=str, choices=KRB_PATH_MODES),
+    krb_realm=plac.Annotation("The kerberos realm", "positional"),
+    master=plac.Annotation("The hostname of the master KDC (this machine)", "positional"),
+    executor=plac.Annotation("How to run commands on the replicas (`local` runs everything on this machine which is useful as stand-in for tests)", "option", type=str, choices=EXECUTORS),
+    keytab_dir_path=plac.Annotation("The directory on the master to keep the host keytabs of the replicas in", "option"),
+    dump_file_path=plac.Annotation("The file to dump the KDC database to", "option"),
+    parallel=plac.Annotation("The maximum number of replicas to provision concurrently", "option", type=int),
+    step_timeout=plac.Annotation("The time in seconds every command may take", "option", type=float),
+    replicas=plac.Annotation("The hostnames of the replica KDCs (their host key is added to their host keytab)"),
+)
+def provision_replica_kdcs(krb_path_mode, krb_realm, master, executor=EXECUTOR_LOCAL, keytab_dir_path=keytab_dir_path_default, dump_file_path=dump_file_path_default, parallel=parallel_default, step_timeout=step_timeout_default, *replicas):
+    replicas = split_list(str.join(",", replicas))
+    if len(replicas) == 0:
+        raise ValueError("at least one replica has to be specified")
+    paths = krb_paths(krb_path_mode)
+    deadline = Deadline()
+    local_executor = create_executor(EXECUTOR_LOCAL, master, deadline=deadline, step_timeout=step_timeout)
+    start_time = time.time()
+    if not os.path.exists(keytab_dir_path):
+        os.makedirs(keytab_dir_path)
+    # `kprop` authenticates with the master's host key which is added to the
+    # other keys of the master's host keytab
+    create_host_principal(local_executor, master, krb_realm)
+    add_host_key(local_executor, master, krb_realm, paths["host_keytab_file_path"])
+    kpropd_acl_file = tempfile.NamedTemporaryFile(mode="w", suffix=".acl", delete=False)
+    try:
+        kpropd_acl_file.write(kpropd_acl_content(master, replicas, krb_realm))
+        kpropd_acl_file.close()
+        def __provision__(replica):
+            replica_keytab_file_path = os.path.join(keytab_dir_path, "%s.keytab" % (replica,))
+            # the host keys are created sequentially by `kadmin.local` below
+            replica_executor = create_executor(executor, replica, deadline=deadline, step_timeout=step_timeout)
+            if executor != EXECUTOR_LOCAL and not keytab_has_principal(replica_executor, paths["host_keytab_file_path"], host_principal(replica, krb_realm)):
+                # the other keys of the replica's host keytab are kept
+                replica_tmp_keytab_file_path = "%s.%s" % (paths["host_keytab_file_path"], openafs_setup_globals.app_name)
+                replica_executor.put_file(replica_keytab_file_path, replica_tmp_keytab_file_path)
+                replica_executor.check_call(merge_keytab_cmds(replica_tmp_keytab_file_path, paths["host_keytab_file_path"]))
+            replica_executor.put_file(stash_file_path(krb_path_mode, krb_realm), stash_file_path(krb_path_mode, krb_realm))
+            replica_executor.put_file(kpropd_acl_file.name, paths["kpropd_acl_file_path"])
+            if executor != EXECUTOR_LOCAL:
+                replica_executor.check_call([kpropd]) # detaches in standalone mode
+        for replica in replicas:
+            create_host_principal(local_executor, replica, krb_realm)
+            if executor == EXECUTOR_LOCAL:
+                # the stand-in replicas share the master's host keytab
+                add_host_key(local_executor, replica, krb_realm, paths["host_keytab_file_path"])
+            else:
+                replica_keytab_file_path = os.path.join(keytab_dir_path, "%s.keytab" % (replica,))
+                if os.path.exists(replica_keytab_file_path):
+                    os.remove(replica_keytab_file_path) # avoids duplicate entries
+                add_host_key(local_executor, replica, krb_realm, replica_keytab_file_path)
+        run_parallel(__provision__, replicas, parallel=parallel)
+        if executor == EXECUTOR_LOCAL:
+            # the stand-in replicas share one `kpropd` listening on port 754
+            local_executor.check_call([kpropd]) # detaches in standalone mode
+    finally:
+        os.remove(kpropd_acl_file.name)
+    propagate(local_executor, replicas, dump_file_path, parallel=parallel)
+    def __start_kdc__(replica):
+        replica_executor = create_executor(executor, replica, deadline=deadline, step_timeout=step_timeout)
+        if krb_path_mode == KRB_PATH_MODE_UBUNTU:
+            replica_executor.check_call([service, "krb5-kdc", "restart"])
+        else:
+            replica_executor.check_call([krb5kdc]) # detaches
+    # the stand-in replicas share one KDC as well
+    run_parallel(__start_kdc__, replicas if executor != EXECUTOR_LOCAL else replicas[:1], parallel=parallel)
+    logger.info("provisioned %d replica KDCs in %f s, list them with `krb5-conf -kdcs` on clients" % (len(replicas), time.time()-start_time))
+
+@plac.annotations(dump_file_path=plac.Annotation("The file to dump the KDC database to", "option"),
+    parallel=plac.Annotation("The maximum number of replicas to propagate to concurrently", "option", type=int),
+    install_cron=plac.Annotation("A flag indicating that a cron job propagating periodically ought to be installed instead of propagating now", "flag"),
+    interval=plac.Annotation("The interval of the cron job in minutes (less than 60, whole hours less than a day or 1440)", "option", type=int),
+    step_timeout=plac.Annotation("The time in seconds every command may take", "option", type=float),
+    replicas=plac.Annotation("The hostnames of the replica KDCs"),
+)
+def propagate_kdcs(dump_file_path=dump_file_path_default, parallel=parallel_default, install_cron=False, interval=propagation_interval_default, step_timeout=step_timeout_default, *replicas):
+    replicas = split_list(str.join(",", replicas))
+    if len(replicas) == 0:
+        raise ValueError("at least one replica has to be specified")
+    if install_cron:
+        schedule = cron_schedule(interval)
+        with open(cron_file_path, "w") as cron_file:
+            cron_file.write("%s root %s propagate-kdcs -dump-file-path %s -parallel %d %s\n" % (schedule, openafs_setup_globals.app_name, dump_file_path, parallel, str.join(" ", replicas)))
+        logger.info("installed cron job '%s' propagating every %d minutes" % (cron_file_path, interval))
+        return
+    propagate(create_executor(EXECUTOR_LOCAL, "localhost", deadline=Deadline(), step_timeout=step_timeout), replicas, dump_file_path, parallel=parallel)
@@ -0,0 +1,138 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Rotation of the `afs/<cell>` key: a new key version is created with
+# `kadmin.local ktadd`, installed with `asetkey` on all servers in parallel and
+# verified with `asetkey list` before old key versions are retired.
+
+from __future__ import absolute_import
+import subprocess as sp
+import logging
+import re
+import time
+import plac
+from openafs_setup.openafs_setup_paths import PATH_MODES, openafs_paths, kadmin_local, klist
+from openafs_setup.openafs_setup_executor import EXECUTOR_LOCAL, EXECUTORS, parallel_default, step_timeout_default, Deadline, create_executor, run_parallel
+
+logger = logging.getLogger(__name__)
+
+afs_princ_name = "afs"
+
+def keytab_kvnos(local_executor, keytab_file_path, principal):
+    """Returns the set of key version numbers of `principal` (with or without
+    realm) in the keytab at `keytab_file_path`."""
+    klist_output = local_executor.check_output([klist, "-k", keytab_file_path])
+    return parse_klist_kvnos(klist_output, principal)
+
+def parse_klist_kvnos(klist_output, principal):
+    ret_value = set()
+    for line in klist_output.splitlines():
+        line_match = re.match("^\\s*(?P<kvno>[0-9]+)\\s+(?P<principal>\\S+)", line)
+        if line_match is None:
+            continue
+        if line_match.group("principal").split("@")[0] == principal.split("@")[0]:
+            ret_value.add(int(line_match.group("kvno")))
+    return ret_value
+
+def parse_asetkey_list_kvnos(asetkey_list_output):
+    """Parses the key version numbers from `asetkey list` output of both the
+    `KeyFile` (`kvno    3: key is: ...`) and the `KeyFileExt` (`rxkad_krb5 kvno
+    3 enctype 18; key is: ...`) format."""
+    return set([int(kvno_match) for kvno_match in re.findall("kvno\\s+([0-9]+)", asetkey_list_output)])
+
+def __kadmin_local_query__(local_executor, query):
+    local_executor.check_call([kadmin_local, "-q", query])
+
+@plac.annotations(path_mode=plac.Annotation("The path mode of the OpenAFS installation on the servers", "positional", type=str, choices=PATH_MODES),
+    cell_name=plac.Annotation("The cell name whose `afs/<cell>` key ought to be rotated", "positional"),
+    krb_realm=plac.Annotation("The kerberos realm of the `afs/<cell>` principal in the KeyFile (defaults to the cell name like in the initial setup)", "option"),
+    executor=plac.Annotation("How to run commands on the servers (`local` runs everything on this machine which is useful as stand-in for tests)", "option", type=str, choices=EXECUTORS),
+    parallel=plac.Annotation("The maximum number of servers to install the key on concurrently", "option", type=int),
+    retire_old=plac.Annotation("A flag indicating that old key versions ought to be removed from the KeyFiles and the keytab after all servers report the new key version", "flag"),
+    step_timeout=plac.Annotation("The time in seconds every command may take", "option", type=float),
+    timeout=plac.Annotation("The time in seconds the whole rotation may take (no limit if omitted)", "option", type=float),
+    servers=plac.Annotation("The servers to install the new key on (defaults to the local machine)"),
+)
+def rotate_keys(path_mode, cell_name, krb_realm=None, executor=EXECUTOR_LOCAL, parallel=parallel_default, retire_old=False, step_timeout=step_timeout_default, timeout=None, *servers):
+    if not path_mode in PATH_MODES:
+        raise ValueError("path_mode has to be one of %s" % (str(PATH_MODES),))
+    if cell_name is None:
+        raise ValueError("cell_name musn't be None")
+    if krb_realm is None:
+        krb_realm = cell_name
+    if len(servers) == 0:
+        servers = ["localhost"]
+    paths = openafs_paths(path_mode)
+    asetkey = paths["asetkey"]
+    keytab_file_path = paths["keytab_file_path"]
+    keytab_file_encryption = paths["keytab_file_encryption"]
+    principal = "%s/%s" % (afs_princ_name, cell_name)
+    start_time = time.time()
+    deadline = Deadline(timeout)
+    local_executor = create_executor(EXECUTOR_LOCAL, "localhost", deadline=deadline, step_timeout=step_timeout)
+
+    try:
+        old_kvnos = keytab_kvnos(local_executor, keytab_file_path, principal)
+    except sp.CalledProcessError:
+        old_kvnos = set() # keytab doesn't exist yet
+    keytab_encryption_option = ""
+    if keytab_file_encryption != None:
+        keytab_encryption_option = "-e %s" % (keytab_file_encryption,)
+    # `ktadd` randomizes the key and increments the kvno unless `-norandkey` is passed
+    __kadmin_local_query__(local_executor, "ktadd -k %s %s %s" % (keytab_file_path, keytab_encryption_option, principal))
+    new_kvnos = keytab_kvnos(local_executor, keytab_file_path, principal)-old_kvnos
+    if len(new_kvnos) == 0:
+        raise RuntimeError("ktadd didn't add a new key version of %s to '%s'" % (principal, keytab_file_path))
+    new_kvno = max(new_kvnos)
+    logger.info("created key version %d of %s" % (new_kvno, principal))
+
+    def __install_key__(server):
+        server_executor = create_executor(executor, server, deadline=deadline, step_timeout=step_timeout)
+        server_executor.put_file(keytab_file_path, keytab_file_path)
+        server_executor.check_call([asetkey, "add", str(new_kvno), keytab_file_path, "%s@%s" % (principal, krb_realm)])
+        server_kvnos = parse_asetkey_list_kvnos(server_executor.check_output([asetkey, "list"]))
+        if not new_kvno in server_kvnos:
+            raise RuntimeError("server %s doesn't report key version %d after installation (reports %s)" % (server, new_kvno, str(sorted(server_kvnos))))
+        return server_kvnos
+    servers_kvnos = run_parallel(__install_key__, servers, parallel=parallel)
+    logger.info("all %d servers report key version %d after %f s" % (len(servers), new_kvno, time.time()-start_time))
+
+    if retire_old:
+        # only reached after all servers converged because `run_parallel` raises otherwise
+        def __retire_keys__(server):
+            server_executor = create_executor(executor, server, deadline=deadline, step_timeout=step_timeout)
+            for old_kvno in sorted(servers_kvnos[server]):
+                if old_kvno < new_kvno:
+                    server_executor.check_call([asetkey, "delete", str(old_kvno)])
+        run_parallel(__retire_keys__, servers, parallel=parallel)
+        __kadmin_local_query__(local_executor, "ktremove -k %s %s old" % (keytab_file_path, principal))
+        logger.info("retired key versions older than %d" % (new_kvno,))
+    logger.info("key rotation finished after %f s" % (time.time()-start_time,))
+    return new_kvno
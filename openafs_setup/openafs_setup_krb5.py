@@ -0,0 +1,205 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# `krb5.conf` generation from a structured model. The model is a list of
+# `(section, entries)` tuples where entries are lists of `(key, value)` tuples
+# and `value` is either a string or again a list of entries (for realm
+# blocks). Keys can occur multiple times (e.g. `kdc`). Comments and
+# `include`/`includedir`/`module` directives are kept as `(None, line)` tuples
+# (directives always in the list of sections because they have to start at the
+# beginning of a line) and written back unchanged. Existing files are parsed
+# into the same model which allows merging instead of overwriting.
+
+from __future__ import absolute_import
+import logging
+import os
+import plac
+from openafs_setup.openafs_setup_globals import split_list
+import template_helper
+from openafs_setup.openafs_setup_paths import KRB_PATH_MODES, krb_paths
+
+logger = logging.getLogger(__name__)
+
+# libdefaults which avoid per request lookups; `kdc_timeout` and
+# `max_retries` are only written if specified because only Heimdal evaluates
+# them, MIT Kerberos ignores them
+TUNED_LIBDEFAULTS = [
+    ("rdns", "false"),
+]
+KRB5_CONF_DIRECTIVES = ["include", "includedir", "module"]
+
+def parse_krb5_conf(content):
+    """Parses `krb5.conf` content into the model. Empty lines are dropped,
+    comments and directives are kept."""
+    ret_value = []
+    stack = [] # entries lists of the open `{` blocks
+    for line in content.splitlines():
+        line = line.strip()
+        if line == "":
+            continue
+        if line.split(None, 1)[0] in KRB5_CONF_DIRECTIVES:
+            # directives aren't part of a section, the following entries
+            # still belong to the open section
+            ret_value.append((None, line))
+            continue
+        if line.startswith("#") or line.startswith(";"):
+            if len(stack) == 0:
+                ret_value.append((None, line))
+            else:
+                stack[-1].append((None, line))
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            ret_value.append((line[1:-1].strip(), []))
+            stack = [ret_value[-1][1]]
+            continue
+        if line == "}":
+            if len(stack) > 1:
+                stack.pop()
+            continue
+        if len(stack) == 0 or not "=" in line:
+            raise ValueError("unexpected line '%s' in krb5.conf" % (line,))
+        (key, value) = [part.strip() for part in line.split("=", 1)]
+        if value == "{":
+            entries = []
+            stack[-1].append((key, entries))
+            stack.append(entries)
+        else:
+            stack[-1].append((key, value))
+    return ret_value
+
+def render_krb5_conf(model):
+    ret_value = ""
+    for (section, entries) in model:
+        if section is None:
+            ret_value += "%s\n" % (entries,)
+            continue
+        if ret_value != "":
+            ret_value += "\n"
+        ret_value += "[%s]\n" % (section,)
+        ret_value += __render_entries__(entries, 1)
+    return ret_value
+
+def __render_entries__(entries, depth):
+    ret_value = ""
+    for (key, value) in entries:
+        if key is None:
+            ret_value += "%s%s\n" % ("\t"*depth, value)
+        elif isinstance(value, list):
+            ret_value += "%s%s = {\n%s%s}\n" % ("\t"*depth, key, __render_entries__(value, depth+1), "\t"*depth)
+        else:
+            ret_value += "%s%s = %s\n" % ("\t"*depth, key, value)
+    return ret_value
+
+def __section__(model, section):
+    for (model_section, entries) in model:
+        if model_section == section:
+            return entries
+    entries = []
+    model.append((section, entries))
+    return entries
+
+def set_entries(entries, key, values):
+    """Replaces all entries of `key` by one entry per value of `values` at the
+    position of the first existing entry (or at the end)."""
+    positions = [index for (index, (entry_key, entry_value)) in enumerate(entries) if entry_key == key]
+    position = positions[0] if len(positions) > 0 else len(entries)
+    for index in reversed(positions):
+        del entries[index]
+    for (offset, value) in enumerate(values):
+        entries.insert(position+offset, (key, value))
+
+def merge_krb5_conf(base_model, overlay_model):
+    """Merges `overlay_model` into `base_model` (in place). Keys of the overlay
+    replace all entries with that key in the same section, keys and sections
+    which are only in the base are kept."""
+    for (section, overlay_entries) in overlay_model:
+        if section is None:
+            continue
+        base_entries = __section__(base_model, section)
+        overlay_keys = []
+        for (key, value) in overlay_entries:
+            if key is not None and not key in overlay_keys:
+                overlay_keys.append(key)
+        for key in overlay_keys:
+            set_entries(base_entries, key, [value for (entry_key, value) in overlay_entries if entry_key == key])
+    return base_model
+
+def krb5_conf_model(krb_realm, kdcs=None, admin_servers=None, dns_lookup=False, udp_preference_limit=None, kdc_timeout=None, max_retries=None, rcache_name=None):
+    """Creates the model for `krb_realm` with the KDCs `kdcs` and admin servers
+    `admin_servers` (both default to the realm name which is used as
+    hostname). DNS lookups are turned off unless `dns_lookup` is `True`
+    because the KDCs are listed statically."""
+    if kdcs is None or len(kdcs) == 0:
+        kdcs = [krb_realm]
+    if admin_servers is None or len(admin_servers) == 0:
+        admin_servers = [krb_realm]
+    dns_lookup_value = "true" if dns_lookup else "false"
+    # needs `allow_weak_crypto = true`<ref>http://docs.openafs.org/ReleaseNotesWindows/Kerberos_v5_Requirements.html</ref>
+    libdefaults = [
+        ("default_realm", krb_realm),
+        ("allow_weak_crypto", "true"),
+        ("dns_lookup_realm", dns_lookup_value),
+        ("dns_lookup_kdc", dns_lookup_value),
+    ]
+    if not dns_lookup:
+        libdefaults += TUNED_LIBDEFAULTS
+    for (key, value) in [("udp_preference_limit", udp_preference_limit), ("kdc_timeout", kdc_timeout), ("max_retries", max_retries), ("default_rcache_name", rcache_name)]:
+        if value is not None:
+            set_entries(libdefaults, key, [str(value)])
+    realm_entries = [("kdc", kdc) for kdc in kdcs]+[("admin_server", admin_server) for admin_server in admin_servers]+[("default_domain", krb_realm)]
+    return [
+        ("libdefaults", libdefaults),
+        ("realms", [(krb_realm, realm_entries)]),
+        ("logging", [("kdc", "CONSOLE")]),
+    ]
+
+def write_krb5_conf(model, krb5_conf_file_path, merge=False, check_output=True):
+    """Writes `model` to `krb5_conf_file_path`, merged into the existing file
+    if `merge` is `True`."""
+    if merge and os.path.exists(krb5_conf_file_path):
+        with open(krb5_conf_file_path, "r") as krb5_conf_file:
+            model = merge_krb5_conf(parse_krb5_conf(krb5_conf_file.read()), model)
+    template_helper.write_template_file(render_krb5_conf(model), krb5_conf_file_path, check_output=check_output)
+
+@plac.annotations(krb_path_mode=plac.Annotation("The pathes to use for kerberos", "positional", type=str, choices=KRB_PATH_MODES),
+    krb_realm=plac.Annotation("The kerberos realm", "positional"),
+    kdcs=plac.Annotation("A comma separated list of KDCs in the order they ought to be tried (defaults to the realm name)", "option"),
+    admin_servers=plac.Annotation("A comma separated list of admin servers (defaults to the realm name)", "option"),
+    dns_lookup=plac.Annotation("A flag indicating that realms and KDCs ought to be looked up in DNS", "flag"),
+    udp_preference_limit=plac.Annotation("Messages larger than this size in bytes are sent over TCP", "option", type=int),
+    kdc_timeout=plac.Annotation("The `kdc_timeout` libdefault in seconds (only evaluated by Heimdal, ignored by MIT Kerberos)", "option", type=int),
+    max_retries=plac.Annotation("The `max_retries` libdefault (only evaluated by Heimdal, ignored by MIT Kerberos)", "option", type=int),
+    rcache_name=plac.Annotation("The default replay cache (e.g. `none:` to turn it off, `dfl:` for the file cache)", "option"),
+    merge=plac.Annotation("A flag indicating that the configuration ought to be merged into an existing krb5.conf instead of replacing it", "flag"),
+    skip_check_output=plac.Annotation("A flag indicating that the output ought not to be checked with a difftool", "flag"),
+)
+def krb5_conf(krb_path_mode, krb_realm, kdcs=None, admin_servers=None, dns_lookup=False, udp_preference_limit=None, kdc_timeout=None, max_retries=None, rcache_name=None, merge=False, skip_check_output=False):
+    model = krb5_conf_model(krb_realm, kdcs=split_list(kdcs), admin_servers=split_list(admin_servers), dns_lookup=dns_lookup, udp_preference_limit=udp_preference_limit, kdc_timeout=kdc_timeout, max_retries=max_retries, rcache_name=rcache_name)
+    write_krb5_conf(model, krb_paths(krb_path_mode)["krb5_conf_file_path"], merge=merge, check_output=not skip_check_output)
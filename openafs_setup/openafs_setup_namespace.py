@@ -0,0 +1,134 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Namespaces allowing several independent cells on one host. The
+# configuration, database, partition and cache directories of a namespace are
+# kept under its own root and every command of the setup runs in a private
+# mount namespace (`unshare --mount`) in which these directories are bind
+# mounted over the static pathes of the path modes. This works for binaries
+# with compiled-in pathes (e.g. `bosserver`) and is inherited by the daemons.
+# Since AFS servers listen on fixed ports, every namespace binds its servers to
+# its own IPv4 address (e.g. a loopback address like `127.0.1.2`), so that each
+# cell has its own set of ports.
+
+from __future__ import absolute_import
+import logging
+import os
+import openafs_setup.openafs_setup_globals as openafs_setup_globals
+from openafs_setup.openafs_setup_paths import openafs_paths, krb_paths, stash_file_path
+from openafs_setup.openafs_setup_krb5 import render_krb5_conf
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+logger = logging.getLogger(__name__)
+
+namespaces_dir_path_default = os.path.join(openafs_setup_globals.state_dir_path_default, "namespaces")
+unshare = "unshare"
+
+def namespace_root_path(namespace):
+    if namespace == "" or os.sep in namespace or namespace in [".", ".."]:
+        raise ValueError("namespace '%s' isn't a valid directory name" % (namespace,))
+    return os.path.join(namespaces_dir_path_default, namespace)
+
+def namespace_path(namespace, path):
+    """Returns the path under which `path` is found outside the mount
+    namespace of `namespace` (`path` itself if `namespace` is `None`)."""
+    if namespace is None:
+        return path
+    return os.path.join(namespace_root_path(namespace), os.path.relpath(os.path.abspath(path), "/"))
+
+def namespace_mount_paths(path_mode, krb_path_mode, cache_dir_path, partition_paths):
+    """Returns the `(path, is_file)` pairs of the directories and files which
+    are bind mounted in a namespace. Pathes inside another mounted directory
+    are omitted."""
+    paths = openafs_paths(path_mode)
+    kerberos_paths = krb_paths(krb_path_mode)
+    file_paths = [kerberos_paths["krb_acl_file_path"], kerberos_paths["krb5_conf_file_path"]]
+    dir_paths = []
+    for path in [os.path.dirname(paths["cellservdb_client_file_path"]),
+            os.path.dirname(paths["cellservdb_server_file_path"]),
+            os.path.dirname(paths["keytab_file_path"]),
+            os.path.dirname(paths["bosconfig_file_path"]),
+            paths["local_dir_path"],
+            paths["db_dir_path"],
+            kerberos_paths["kdc_dir_path"],
+            kerberos_paths["kdc_db_dir_path"],
+            cache_dir_path]+list(partition_paths):
+        if not path in dir_paths:
+            dir_paths.append(path)
+    return [(path, path in file_paths) for path in dir_paths+file_paths if not any([path.startswith("%s/" % (dir_path,)) for dir_path in dir_paths])]
+
+def prepare_namespace(namespace, mount_paths):
+    """Creates the sources of the bind mounts under the namespace root and
+    missing mount points on the host (empty directories and files which are
+    left in place by `reset` because other namespaces might use them)."""
+    for (path, is_file) in mount_paths:
+        source_path = namespace_path(namespace, path)
+        if is_file:
+            for file_path in [source_path, path]:
+                if not os.path.exists(os.path.dirname(file_path)):
+                    os.makedirs(os.path.dirname(file_path))
+                if not os.path.exists(file_path):
+                    open(file_path, "a").close()
+        else:
+            for dir_path in [source_path, path]:
+                if not os.path.exists(dir_path):
+                    os.makedirs(dir_path)
+
+def namespace_cmds(cmds, namespace, mount_paths):
+    """Wraps `cmds` so that they run in a new private mount namespace with the
+    bind mounts of `namespace` (`cmds` if `namespace` is `None`)."""
+    if namespace is None:
+        return cmds
+    mounts = ["mount --bind %s %s" % (quote(namespace_path(namespace, path)), quote(path)) for (path, is_file) in mount_paths]
+    return [unshare, "--mount", "--propagation", "private", "--", "sh", "-c", str.join(" && ", mounts+['exec "$@"']), "sh"]+cmds
+
+def kdc_conf_content(krb_path_mode, krb_realm, address):
+    """Creates a `kdc.conf` binding the KDC, kadmind and kpasswd of the
+    namespace to `address`. The database, stash and ACL pathes are the ones
+    of `krb_path_mode` (which are mounted in the namespace)."""
+    kerberos_paths = krb_paths(krb_path_mode)
+    return render_krb5_conf([
+        ("kdcdefaults", [
+            ("kdc_listen", address),
+            ("kdc_tcp_listen", address),
+        ]),
+        ("realms", [
+            (krb_realm, [
+                ("database_name", os.path.join(kerberos_paths["kdc_db_dir_path"], "principal")),
+                ("key_stash_file", stash_file_path(krb_path_mode, krb_realm)),
+                ("acl_file", kerberos_paths["krb_acl_file_path"]),
+                ("kadmind_listen", address),
+                ("kpasswd_listen", address),
+            ]),
+        ]),
+    ])
@@ -0,0 +1,244 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Captured command output. Every command writes into its own `OutputBuffer`
+# which keeps only the last bytes in memory for error reports, so neither
+# parallel runs interleave on the terminal nor does a slow terminal throttle
+# the commands. The complete output can be written to compressed per-step log
+# files by a single background thread through a bounded queue; chunks which
+# don't fit because the disk or the compression fall behind are dropped and
+# counted in the log instead of blocking the commands.
+
+from __future__ import absolute_import
+import atexit
+import collections
+import gzip
+import logging
+import os
+import re
+import select
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+logger = logging.getLogger(__name__)
+
+tail_bytes_default = 64*1024
+report_lines_default = 20
+read_chunk_size = 64*1024
+log_queue_size_max = 1024 # in chunks, i.e. at most 64 MB with `read_chunk_size`
+reader_poll_interval = 0.1 # in seconds
+# directory to write compressed per-step logs to (none are written if `None`)
+output_log_dir_path = None
+
+class LogWriter(object):
+    """Writes log file chunks handed over by `write` in a background thread
+    so that the commands never wait for the disk or the compression. Chunks
+    which don't fit into the queue of `max_chunks` are dropped, the number of
+    dropped bytes is written at the end of the log file."""
+
+    def __init__(self, max_chunks=log_queue_size_max):
+        self.queue = queue.Queue(maxsize=max_chunks)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.dropped_bytes = {} # log file path -> number of dropped bytes
+
+    def __start__(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.__run__)
+                self.thread.daemon = True
+                self.thread.start()
+
+    def __run__(self):
+        log_files = {}
+        while True:
+            (log_file_path, data) = self.queue.get()
+            try:
+                if log_file_path is None:
+                    for (open_log_file_path, log_file) in log_files.items():
+                        self.__close_log_file__(open_log_file_path, log_file)
+                    log_files.clear()
+                elif data is None:
+                    if log_file_path in log_files:
+                        self.__close_log_file__(log_file_path, log_files.pop(log_file_path))
+                else:
+                    if not log_file_path in log_files:
+                        log_files[log_file_path] = gzip.open(log_file_path, "wb")
+                    log_files[log_file_path].write(data)
+            except Exception as ex:
+                # losing a log mustn't fail the command
+                logger.error("writing log file '%s' failed: %s" % (log_file_path, str(ex)))
+            finally:
+                self.queue.task_done()
+
+    def __close_log_file__(self, log_file_path, log_file):
+        with self.lock:
+            dropped_bytes = self.dropped_bytes.pop(log_file_path, 0)
+        if dropped_bytes > 0:
+            log_file.write(("\n[%d bytes of output dropped because the log writer fell behind]\n" % (dropped_bytes,)).encode("utf-8"))
+            logger.warning("dropped %d bytes of log file '%s'" % (dropped_bytes, log_file_path))
+        log_file.close()
+
+    def write(self, log_file_path, data):
+        self.__start__()
+        try:
+            self.queue.put_nowait((log_file_path, data))
+        except queue.Full:
+            with self.lock:
+                self.dropped_bytes[log_file_path] = self.dropped_bytes.get(log_file_path, 0)+len(data)
+
+    def close(self, log_file_path):
+        # waits for room because the file would never be closed otherwise
+        self.__start__()
+        self.queue.put((log_file_path, None))
+
+    def flush(self):
+        """Waits until all handed over chunks are written."""
+        if self.thread is not None:
+            self.queue.join()
+
+    def close_all(self):
+        """Closes the log files which haven't been closed (e.g. of `pexpect`
+        processes) and waits until everything is written."""
+        if self.thread is not None:
+            self.queue.put((None, None))
+            self.queue.join()
+
+log_writer = LogWriter()
+atexit.register(log_writer.close_all)
+
+def __to_bytes__(data):
+    if isinstance(data, bytes):
+        return data
+    return data.encode("utf-8", "replace")
+
+class OutputBuffer(object):
+    """A file-like ring buffer keeping the last `max_bytes` of the data written
+    to it (usable as `logfile_read` of `pexpect`). If `log_file_path` isn't
+    `None` all data is written there compressed by `log_writer`."""
+
+    def __init__(self, max_bytes=tail_bytes_default, log_file_path=None):
+        self.max_bytes = max_bytes
+        self.log_file_path = log_file_path
+        self.chunks = collections.deque()
+        self.size = 0
+        self.total_size = 0
+        self.lock = threading.Lock()
+
+    def write(self, data):
+        data = __to_bytes__(data)
+        if len(data) == 0:
+            return
+        with self.lock:
+            self.chunks.append(data)
+            self.size += len(data)
+            self.total_size += len(data)
+            while self.size-len(self.chunks[0]) >= self.max_bytes:
+                self.size -= len(self.chunks.popleft())
+        if self.log_file_path is not None:
+            log_writer.write(self.log_file_path, data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.log_file_path is not None:
+            log_writer.close(self.log_file_path)
+
+    def tail(self):
+        """Returns the last `max_bytes` of the output as text."""
+        with self.lock:
+            data = b"".join(self.chunks)
+        return data[-self.max_bytes:].decode("utf-8", "replace")
+
+    def read_from(self, file_obj, stop_event=None):
+        """Copies the content of `file_obj` (e.g. a pipe) until EOF without
+        waiting for lines to complete (see `read_pipe`)."""
+        read_pipe(file_obj, self.write, stop_event=stop_event)
+
+    def start_reader(self, file_obj, stop_event=None):
+        """Starts a thread running `read_from` and returns it."""
+        return start_pipe_reader(file_obj, self.write, stop_event=stop_event)
+
+def read_pipe(file_obj, write, stop_event=None):
+    """Passes the content of `file_obj` to `write` in chunks until EOF or
+    until `stop_event` is set (e.g. because a background process of the
+    command keeps the pipe open) and closes `file_obj` afterwards."""
+    file_fd = file_obj.fileno()
+    try:
+        while stop_event is None or not stop_event.is_set():
+            if stop_event is not None:
+                (readable, writable, exceptional) = select.select([file_fd], [], [], reader_poll_interval)
+                if len(readable) == 0:
+                    continue
+            data = os.read(file_fd, read_chunk_size)
+            if len(data) == 0:
+                break
+            write(data)
+    finally:
+        file_obj.close()
+
+def start_pipe_reader(file_obj, write, stop_event=None):
+    """Starts a daemon thread running `read_pipe` and returns it."""
+    ret_value = threading.Thread(target=read_pipe, args=(file_obj, write), kwargs={"stop_event": stop_event})
+    ret_value.daemon = True
+    ret_value.start()
+    return ret_value
+
+step_counter_lock = threading.Lock()
+step_counter = [0]
+
+def create_output_buffer(step_name, log_dir_path=None, max_bytes=tail_bytes_default):
+    """Creates the `OutputBuffer` of step `step_name` whose log is written to
+    `log_dir_path` (defaults to `output_log_dir_path`)."""
+    if log_dir_path is None:
+        log_dir_path = output_log_dir_path
+    if log_dir_path is None:
+        return OutputBuffer(max_bytes=max_bytes)
+    if not os.path.exists(log_dir_path):
+        os.makedirs(log_dir_path)
+    with step_counter_lock:
+        step_counter[0] += 1
+        step_number = step_counter[0]
+    log_file_name = "%05d-%s.log.gz" % (step_number, re.sub("[^A-Za-z0-9._-]+", "_", step_name)[:80])
+    return OutputBuffer(max_bytes=max_bytes, log_file_path=os.path.join(log_dir_path, log_file_name))
+
+def format_tail(output_buffer, report_lines=report_lines_default):
+    """Formats the last `report_lines` lines of `output_buffer` for error
+    messages."""
+    lines = output_buffer.tail().rstrip().splitlines()
+    if len(lines) == 0:
+        return "no output"
+    if len(lines) > report_lines or output_buffer.total_size > output_buffer.max_bytes:
+        return "output ended with:\n%s" % (str.join("\n", lines[-report_lines:]),)
+    return "output:\n%s" % (str.join("\n", lines),)
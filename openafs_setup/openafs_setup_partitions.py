@@ -0,0 +1,304 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Preparation of vice partitions. Unused block devices (or loop files standing
+# in for them in tests) are formatted with an ext4 profile chosen by the
+# expected volume size, mounted as the next free `/vicepX` and registered in
+# `fstab` (with `nofail`, so that a missing device doesn't block the boot) once
+# it's mounted, so that every fileserver gets the same storage layout. Devices and
+# files which are already registered are skipped, so the command can be
+# repeated.
+
+from __future__ import absolute_import
+import json
+import logging
+import os
+import re
+import subprocess as sp
+import time
+import plac
+import template_helper
+import openafs_setup.openafs_setup_globals as openafs_setup_globals
+from openafs_setup.openafs_setup_globals import split_list
+from openafs_setup.openafs_setup_executor import EXECUTOR_LOCAL, parallel_default, Deadline, create_executor, run_parallel
+
+logger = logging.getLogger(__name__)
+
+lsblk = "lsblk"
+mkfs_ext4 = "mkfs.ext4"
+blkid = "blkid"
+wipefs = "wipefs"
+blockdev = "blockdev"
+mount = "mount"
+fstab_file_path_default = "/etc/fstab"
+readahead_rules_file_path_default = "/etc/udev/rules.d/60-openafs-vicep-readahead.rules"
+partition_dir_path_default = "/"
+loop_dir_path_default = os.path.join(openafs_setup_globals.state_dir_path_default, "vice")
+mkfs_step_timeout_default = 3600 # formatting large devices without lazy initialization takes long
+
+# ext4 profiles by expected average volume size: many small volumes (e.g.
+# home directories) hold many small files and need more inodes (the namei
+# fileserver stores every vnode as a file), large volumes profit from fewer
+# inodes and more readahead
+PROFILE_SMALL = "small"
+PROFILE_MEDIUM = "medium"
+PROFILE_LARGE = "large"
+PROFILES = {
+    PROFILE_SMALL: {"bytes_per_inode": 8192, "readahead": 128}, # readahead in KB
+    PROFILE_MEDIUM: {"bytes_per_inode": 16384, "readahead": 512},
+    PROFILE_LARGE: {"bytes_per_inode": 65536, "readahead": 4096},
+}
+JOURNAL_MODES = set(["ordered", "writeback", "journal"])
+journal_mode_default = "ordered"
+
+def filesystem_profile(volume_size):
+    """Returns the profile name for volumes of `volume_size` MB on average."""
+    if volume_size < 1024:
+        return PROFILE_SMALL
+    elif volume_size < 50*1024:
+        return PROFILE_MEDIUM
+    return PROFILE_LARGE
+
+def partition_names():
+    """Yields the partition names in the order OpenAFS numbers them (`vicepa`
+    to `vicepz`, then `vicepaa` to `vicepiv`)."""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    for letter in letters:
+        yield "vicep%s" % (letter,)
+    for first in letters[:9]:
+        for second in letters:
+            if first == "i" and second > "v":
+                return
+            yield "vicep%s%s" % (first, second)
+
+def parse_fstab(content):
+    """Returns the list of tuples `(source, mount_point, fstype, options)` of
+    the entries of `fstab` content."""
+    ret_value = []
+    for line in content.splitlines():
+        line = line.strip()
+        if line == "" or line.startswith("#"):
+            continue
+        fields = line.split()
+        if len(fields) >= 4:
+            ret_value.append(tuple(fields[:4]))
+    return ret_value
+
+def swap_devices(swaps_file_path="/proc/swaps"):
+    if not os.path.exists(swaps_file_path):
+        return []
+    with open(swaps_file_path, "r") as swaps_file:
+        return [line.split()[0] for line in swaps_file.read().splitlines()[1:] if line.strip() != ""]
+
+def discover_devices(lsblk_output, excluded_devices=()):
+    """Returns the block devices of `lsblk -J -b -o PATH,TYPE,SIZE,FSTYPE,MOUNTPOINT`
+    output which are unused, i.e. disks and partitions without filesystem,
+    mount point and partitions of their own which aren't RAM disks (e.g.
+    `zram` swap without signature) or `excluded_devices`."""
+    ret_value = []
+    def __walk__(devices):
+        for device in devices:
+            children = device.get("children") or []
+            if device["type"] in ["disk", "part"] and len(children) == 0 and device.get("fstype") is None and device.get("mountpoint") is None and re.match("^/dev/z?ram[0-9]+$", device["path"]) is None and not device["path"] in excluded_devices:
+                ret_value.append(device["path"])
+            __walk__(children)
+    __walk__(json.loads(lsblk_output)["blockdevices"])
+    return ret_value
+
+def mkfs_cmds(source, profile, label):
+    """Formats `source` (a device or loop file) with ext4. No blocks are
+    reserved for root because the fileserver runs as root anyway and the
+    inode and journal tables are initialized immediately instead of slowing
+    down the first writes of the fileserver."""
+    return [mkfs_ext4, "-F", "-q", "-L", label, "-i", str(PROFILES[profile]["bytes_per_inode"]), "-m", "0", "-E", "lazy_itable_init=0,lazy_journal_init=0", source]
+
+def mount_options(journal_mode, loop):
+    ret_value = ["noatime", "data=%s" % (journal_mode,)]
+    if loop:
+        ret_value.insert(0, "loop")
+    return str.join(",", ret_value)
+
+def readahead_rule(uuid, readahead, partition=False):
+    """Returns the udev rule setting the readahead of the device with the
+    filesystem `uuid`. Partitions have no queue of their own, so the rule of
+    a partition sets the readahead of its disk."""
+    if partition:
+        return 'ACTION=="add|change", SUBSYSTEM=="block", ENV{ID_FS_UUID}=="%s", ENV{DEVTYPE}=="partition", RUN+="/bin/sh -c \'echo %d > /sys$devpath/../queue/read_ahead_kb\'"' % (uuid, readahead)
+    return 'ACTION=="add|change", SUBSYSTEM=="block", ENV{ID_FS_UUID}=="%s", ATTR{queue/read_ahead_kb}="%d"' % (uuid, readahead)
+
+def merge_readahead_rules(content, rules):
+    """Adds `rules` to the udev rules `content` replacing the rules for the
+    same filesystem UUIDs."""
+    uuids = [re.search('ENV\\{ID_FS_UUID\\}=="([^"]+)"', rule).group(1) for rule in rules]
+    lines = [line for line in content.splitlines() if not any(['=="%s"' % (uuid,) in line for uuid in uuids])]
+    return str.join("\n", lines+rules)+"\n"
+
+def plan_partitions(sources, fstab_entries, partition_dir_path, existing_names):
+    """Assigns the next partition names which are neither mount points of
+    `fstab_entries` nor `existing_names` in `partition_dir_path` to
+    `sources`. Returns a list of tuples `(source, mount_point)`."""
+    used_mount_points = set([entry[1] for entry in fstab_entries])
+    used_names = set(existing_names)
+    names = (name for name in partition_names() if not name in used_names and not os.path.join(partition_dir_path, name) in used_mount_points)
+    ret_value = []
+    for source in sources:
+        try:
+            ret_value.append((source, os.path.join(partition_dir_path, next(names))))
+        except StopIteration:
+            raise ValueError("no partition names left for %s" % (source,))
+    return ret_value
+
+def prepare_partitions(local_executor, sources, volume_size, journal_mode=journal_mode_default, fstab_file_path=fstab_file_path_default, readahead_rules_file_path=readahead_rules_file_path_default, partition_dir_path=partition_dir_path_default, parallel=parallel_default, check_output=True):
+    """Formats, mounts and registers `sources` (block devices or existing loop
+    files) as vice partitions. Sources registered in `fstab` already are
+    skipped, sources which fail to mount aren't registered and cause a
+    `RuntimeError` after the others have been registered. Returns the list of
+    tuples `(source, mount_point)` of the new partitions."""
+    profile = filesystem_profile(volume_size)
+    logger.info("using filesystem profile %s (%s) for volumes of %d MB" % (profile, str(PROFILES[profile]), volume_size))
+    fstab_content = ""
+    if os.path.exists(fstab_file_path):
+        with open(fstab_file_path, "r") as fstab_file:
+            fstab_content = fstab_file.read()
+    fstab_entries = parse_fstab(fstab_content)
+    registered_sources = set([entry[0] for entry in fstab_entries if os.path.basename(entry[1]).startswith("vicep")])
+    def __uuid__(source):
+        return local_executor.check_output([blkid, "-s", "UUID", "-o", "value", source]).strip()
+    def __has_signature__(source):
+        # `wipefs` lists filesystems and partition tables without changing
+        # anything and, unlike `blkid`, succeeds if there're none
+        return local_executor.check_output([wipefs, "--output", "TYPE", "--noheadings", source]).strip() != ""
+    new_sources = []
+    for source in sources:
+        if source in registered_sources:
+            logger.info("%s is already registered, skipping it" % (source,))
+            continue
+        if __has_signature__(source):
+            uuid = __uuid__(source)
+            if "UUID=%s" % (uuid,) in registered_sources:
+                logger.info("%s is already registered, skipping it" % (source,))
+                continue
+            raise ValueError("%s contains a filesystem or partition table which isn't registered as vice partition, refusing to format it" % (source,))
+        new_sources.append(source)
+    if len(new_sources) == 0:
+        return []
+    existing_names = [name for name in os.listdir(partition_dir_path) if re.match("^vicep[a-z]{1,2}$", name)]
+    partitions = plan_partitions(new_sources, fstab_entries, partition_dir_path, existing_names)
+    # devices are formatted concurrently because they're independent
+    run_parallel(lambda partition: local_executor.check_call(mkfs_cmds(partition[0], profile, os.path.basename(partition[1]))), partitions, parallel=parallel)
+    # only mounted partitions are registered, so that fstab doesn't refer to
+    # devices which can't be mounted
+    mounted_partitions = []
+    mount_failures = []
+    for (source, mount_point) in partitions:
+        if not os.path.exists(mount_point):
+            os.makedirs(mount_point)
+        try:
+            local_executor.check_call([mount, "-t", "ext4", "-o", mount_options(journal_mode, os.path.isfile(source)), source, mount_point])
+        except sp.CalledProcessError as ex:
+            logger.error("mounting %s on %s failed, not registering it: %s" % (source, mount_point, str(ex)))
+            mount_failures.append(source)
+            continue
+        mounted_partitions.append((source, mount_point))
+    fstab_lines = []
+    readahead_rules = []
+    for (source, mount_point) in mounted_partitions:
+        fstab_source = source
+        if not os.path.isfile(source):
+            # device names change between boots
+            uuid = __uuid__(source)
+            fstab_source = "UUID=%s" % (uuid,)
+            partition = local_executor.check_output([lsblk, "-n", "-d", "-o", "TYPE", source]).strip() == "part"
+            readahead_rules.append(readahead_rule(uuid, PROFILES[profile]["readahead"], partition=partition))
+            # the udev rule applies from the next boot or device change on
+            # (`blockdev` sets the readahead of the disk for partitions)
+            local_executor.check_call([blockdev, "--setra", str(PROFILES[profile]["readahead"]*2), source]) # in 512 byte sectors
+        fstab_lines.append("%s %s ext4 %s,nofail 0 2" % (fstab_source, mount_point, mount_options(journal_mode, os.path.isfile(source))))
+    if len(fstab_lines) > 0:
+        if fstab_content != "" and not fstab_content.endswith("\n"):
+            fstab_content += "\n"
+        template_helper.write_template_file(fstab_content+str.join("\n", fstab_lines)+"\n", fstab_file_path, check_output=check_output)
+    if len(readahead_rules) > 0:
+        readahead_rules_content = ""
+        if os.path.exists(readahead_rules_file_path):
+            with open(readahead_rules_file_path, "r") as readahead_rules_file:
+                readahead_rules_content = readahead_rules_file.read()
+        template_helper.write_template_file(merge_readahead_rules(readahead_rules_content, readahead_rules), readahead_rules_file_path, check_output=check_output)
+    if len(mount_failures) > 0:
+        raise RuntimeError("mounting %s failed, the formatted devices haven't been registered in fstab" % (str.join(", ", mount_failures),))
+    return mounted_partitions
+
+def create_loop_files(loop_dir_path, count, size):
+    """Creates `count` sparse files of `size` MB in `loop_dir_path` which
+    don't exist yet (named `vice-<n>.img`) and returns the pathes of all
+    `count` files."""
+    if not os.path.exists(loop_dir_path):
+        os.makedirs(loop_dir_path)
+    ret_value = []
+    for index in range(count):
+        loop_file_path = os.path.join(loop_dir_path, "vice-%d.img" % (index,))
+        if not os.path.exists(loop_file_path):
+            with open(loop_file_path, "wb") as loop_file:
+                loop_file.truncate(size*1024*1024)
+        ret_value.append(loop_file_path)
+    return ret_value
+
+@plac.annotations(volume_size=plac.Annotation("The expected average volume size in MB which selects the filesystem profile", "option", type=int),
+    devices=plac.Annotation("A comma separated list of block devices to prepare", "option"),
+    discover=plac.Annotation("A flag indicating that all unused block devices (without filesystem, partitions and mount point) ought to be prepared", "flag"),
+    loop_count=plac.Annotation("The number of loop files to prepare as stand-ins for block devices (for tests)", "option", type=int),
+    loop_size=plac.Annotation("The size of the loop files in MB", "option", type=int),
+    loop_dir_path=plac.Annotation("The directory to create the loop files in", "option"),
+    journal_mode=plac.Annotation("The ext4 journal mode of the partitions", "option", type=str, choices=JOURNAL_MODES),
+    fstab_file_path=plac.Annotation("The fstab file to register the partitions in", "option"),
+    readahead_rules_file_path=plac.Annotation("The udev rules file to persist the readahead of the devices in", "option"),
+    partition_dir_path=plac.Annotation("The directory to create the `vicepX` mount points in", "option"),
+    parallel=plac.Annotation("The maximum number of devices to format concurrently", "option", type=int),
+    skip_check_output=plac.Annotation("A flag indicating that the changes of fstab and the udev rules ought not to be checked with a difftool", "flag"),
+    step_timeout=plac.Annotation("The time in seconds formatting one device may take", "option", type=float),
+)
+def prepare_partitions_command(volume_size=1024, devices="", discover=False, loop_count=0, loop_size=1024, loop_dir_path=loop_dir_path_default, journal_mode=journal_mode_default, fstab_file_path=fstab_file_path_default, readahead_rules_file_path=readahead_rules_file_path_default, partition_dir_path=partition_dir_path_default, parallel=parallel_default, skip_check_output=False, step_timeout=mkfs_step_timeout_default):
+    local_executor = create_executor(EXECUTOR_LOCAL, "localhost", deadline=Deadline(), step_timeout=step_timeout)
+    sources = split_list(devices)
+    if discover:
+        for device in discover_devices(local_executor.check_output([lsblk, "-J", "-b", "-o", "PATH,TYPE,SIZE,FSTYPE,MOUNTPOINT"]), excluded_devices=swap_devices()):
+            if not device in sources:
+                sources.append(device)
+    if loop_count > 0:
+        sources += create_loop_files(loop_dir_path, loop_count, loop_size)
+    if len(sources) == 0:
+        raise ValueError("no devices specified, use -devices, -discover or -loop-count")
+    start_time = time.time()
+    partitions = prepare_partitions(local_executor, sources, volume_size, journal_mode=journal_mode, fstab_file_path=fstab_file_path, readahead_rules_file_path=readahead_rules_file_path, partition_dir_path=partition_dir_path, parallel=parallel, check_output=not skip_check_output)
+    for (source, mount_point) in partitions:
+        logger.info("prepared %s as %s" % (source, mount_point))
+    if len(partitions) > 0:
+        logger.info("prepared %d partitions in %f s, restart the fileserver in order to attach them" % (len(partitions), time.time()-start_time))
+    return partitions
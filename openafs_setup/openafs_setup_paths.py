@@ -0,0 +1,191 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+# Binary and configuration file pathes of the supported OpenAFS and Kerberos
+# installation layouts, shared by the setup and all maintenance commands.
+
+from __future__ import absolute_import
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+PATH_MODE_UBUNTU = "ubuntu"
+PATH_MODE_SOURCE = "source"
+PATH_MODE_TRANSARC = "transarc"
+PATH_MODES = set([PATH_MODE_UBUNTU, PATH_MODE_SOURCE, PATH_MODE_TRANSARC])
+KRB_PATH_MODE_UBUNTU = "ubuntu"
+KRB_PATH_MODE_SOURCE = "source"
+KRB_PATH_MODES = set([KRB_PATH_MODE_UBUNTU, KRB_PATH_MODE_SOURCE])
+
+# kerberos pathes should be adjusted by PATH automatically
+kadmin_local = "kadmin.local"
+krb5kdc = "krb5kdc"
+kadmind = "kadmind"
+kinit = "kinit"
+kvno = "kvno"
+kdb5_util = "kdb5_util"
+klist = "klist"
+service = "service"
+kprop = "kprop"
+kpropd = "kpropd"
+ktutil = "ktutil"
+
+def openafs_paths(path_mode):
+    """Returns a dictionary mapping binary and configuration file names to
+    their pathes for `path_mode`."""
+    if path_mode == PATH_MODE_TRANSARC:
+        return {
+            "bosserver": "/usr/afs/bin/bosserver",
+            "bos": "/usr/afs/bin/bos",
+            "asetkey": "/usr/afs/bin/asetkey",
+            "pts": "/usr/afs/bin/pts",
+            "vos": "/usr/afs/bin/vos",
+            "fs": "/usr/afs/bin/fs",
+            "udebug": "/usr/afs/bin/udebug",
+            "buserver": "/usr/afs/bin/buserver",
+            "ptserver": "/usr/afs/bin/ptserver",
+            "vlserver": "/usr/afs/bin/vlserver",
+            "fileserver": "/usr/afs/bin/fileserver",
+            "volserver": "/usr/afs/bin/volserver",
+            "salvager": "/usr/afs/bin/salvager",
+            "dafileserver": "/usr/afs/bin/fileserver",
+            "davolserver": "/usr/afs/bin/volserver",
+            "salvageserver": "/usr/afs/bin/salvageserver",
+            "dasalvager": "/usr/afs/bin/salvager",
+            "upserver": "/usr/afs/bin/upserver",
+            "keytab_file_path": "/usr/vice/etc/afs.keytab",
+            "cellservdb_server_file_path": "/usr/vice/etc/server/CellServDB",
+            "thiscell_server_file_path": "/usr/vice/etc/server/ThisCell",
+            "cellservdb_client_file_path": "/usr/vice/etc/CellServDB",
+            "thiscell_client_file_path": "/usr/vice/etc/ThisCell",
+            "cacheinfo_file_path": "/usr/vice/etc/cacheinfo",
+            "local_dir_path": "/usr/afs/local", # contains `bosserver.pid`
+            "db_dir_path": "/usr/afs/db",
+            "bosconfig_file_path": "/usr/afs/local/BosConfig",
+            "keytab_file_encryption": "aes256-cts-hmac-sha1-96:normal,aes128-cts-hmac-sha1-96:normal",
+        }
+    elif path_mode == PATH_MODE_SOURCE:
+        return {
+            "bosserver": "bosserver",
+            "bos": "bos",
+            "asetkey": "asetkey",
+            "pts": "pts",
+            "vos": "vos",
+            "fs": "fs",
+            "udebug": "udebug",
+            "buserver": "/usr/local/libexec/openafs/buserver",
+            "ptserver": "/usr/local/libexec/openafs/ptserver",
+            "vlserver": "/usr/local/libexec/openafs/vlserver",
+            "fileserver": "/usr/local/libexec/openafs/fileserver",
+            "volserver": "/usr/local/libexec/openafs/volserver",
+            "salvager": "/usr/local/libexec/openafs/salvager",
+            "dafileserver": "/usr/local/libexec/openafs/fileserver",
+            "davolserver": "/usr/local/libexec/openafs/volserver",
+            "salvageserver": "/usr/local/libexec/openafs/salvageserver",
+            "dasalvager": "/usr/local/libexec/openafs/salvager",
+            "upserver": "/usr/local/libexec/openafs/upserver",
+            "keytab_file_path": "/usr/local/etc/openafs/afs.keytab",
+            "cellservdb_server_file_path": "/usr/local/etc/openafs/server/CellServDB",
+            "thiscell_server_file_path": "/usr/local/etc/openafs/server/ThisCell",
+            "cellservdb_client_file_path": "/usr/local/etc/openafs/CellServDB",
+            "thiscell_client_file_path": "/usr/local/etc/openafs/ThisCell",
+            "cacheinfo_file_path": "/usr/local/etc/openafs/cacheinfo",
+            "local_dir_path": "/usr/local/var/openafs", # contains `bosserver.pid`
+            "db_dir_path": "/usr/local/var/openafs/db",
+            "bosconfig_file_path": "/usr/local/etc/openafs/BosConfig",
+            "keytab_file_encryption": "aes256-cts-hmac-sha1-96:normal,aes128-cts-hmac-sha1-96:normal",
+        }
+    elif path_mode == PATH_MODE_UBUNTU:
+        return {
+            "bosserver": "/usr/sbin/bosserver",
+            "bos": "/usr/bin/bos",
+            "asetkey": "/usr/sbin/asetkey",
+            "pts": "/usr/bin/pts",
+            "vos": "/usr/bin/vos",
+            "fs": "/usr/bin/fs",
+            "udebug": "/usr/bin/udebug",
+            "buserver": "/usr/lib/openafs/buserver",
+            "ptserver": "/usr/lib/openafs/ptserver",
+            "vlserver": "/usr/lib/openafs/vlserver",
+            "fileserver": "/usr/lib/openafs/fileserver",
+            "volserver": "/usr/lib/openafs/volserver",
+            "salvager": "/usr/lib/openafs/salvager",
+            "dafileserver": "/usr/lib/openafs/fileserver",
+            "davolserver": "/usr/lib/openafs/volserver",
+            "salvageserver": "/usr/lib/openafs/salvageserver",
+            "dasalvager": "/usr/lib/openafs/salvager",
+            "upserver": "/usr/lib/openafs/upserver",
+            "keytab_file_path": "/etc/openafs/afs.keytab",
+            "cellservdb_server_file_path": "/etc/openafs/server/CellServDB",
+            "thiscell_server_file_path": "/etc/openafs/server/ThisCell",
+            "cellservdb_client_file_path": "/etc/openafs/CellServDB",
+            "thiscell_client_file_path": "/etc/openafs/ThisCell",
+            "cacheinfo_file_path": "/etc/openafs/cacheinfo",
+            "local_dir_path": "/var/lib/openafs/local", # contains `bosserver.pid`
+            "db_dir_path": "/var/lib/openafs/db",
+            "bosconfig_file_path": "/etc/openafs/BosConfig",
+            "keytab_file_encryption": "des-cbc-crc:v4", # even `openafs-krb5` 1.6.15-1ubuntu1 on Ubuntu 16.04 only supports `des-cbc-crc:v4` according to `man asetkey` (reported enhancement at https://bugs.launchpad.net/ubuntu/+source/openafs/+bug/1581880)
+                # "des-cbc-crc:afs3" suggested by older version of quick start guide, seems to cause `/usr/sbin/asetkey: unknown RPC error (-1765328203) for keytab entry with Principal afs@test, kvno 2, DES-CBC-CRC/MD5/MD4`
+        }
+    else:
+        raise ValueError("path_mode '%s' isn't supported" % (path_mode,))
+
+def krb_paths(krb_path_mode):
+    """Returns a dictionary mapping Kerberos configuration file names to their
+    pathes for `krb_path_mode`."""
+    if krb_path_mode == KRB_PATH_MODE_SOURCE:
+        return {
+            "krb_acl_file_path": "/usr/local/var/krb5kdc/kadm5.acl",
+            "krb5_conf_file_path": "/usr/local/etc/krb5/krb5.conf",
+            "kdc_dir_path": "/usr/local/var/krb5kdc",
+            "kdc_db_dir_path": "/usr/local/var/krb5kdc",
+            "kdc_conf_file_path": "/usr/local/var/krb5kdc/kdc.conf",
+            "kpropd_acl_file_path": "/usr/local/var/krb5kdc/kpropd.acl",
+            "host_keytab_file_path": "/etc/krb5.keytab",
+        }
+    elif krb_path_mode == KRB_PATH_MODE_UBUNTU:
+        return {
+            "krb_acl_file_path": "/etc/kadm5.acl",
+            "krb5_conf_file_path": "/etc/krb5.conf",
+            "kdc_dir_path": "/etc/krb5kdc",
+            "kdc_db_dir_path": "/var/lib/krb5kdc", # `database_name` in Debian's `kdc.conf`
+            "kdc_conf_file_path": "/etc/krb5kdc/kdc.conf",
+            "kpropd_acl_file_path": "/etc/krb5kdc/kpropd.acl",
+            "host_keytab_file_path": "/etc/krb5.keytab",
+        }
+    else:
+        raise ValueError("krb_path_mode '%s' isn't supported" % (krb_path_mode,))
+
+def stash_file_path(krb_path_mode, krb_realm):
+    """Returns the path of the master key stash file created by `kdb5_util
+    create -s`."""
+    if krb_path_mode == KRB_PATH_MODE_UBUNTU:
+        return "/etc/krb5kdc/stash" # `key_stash_file` in Debian's `kdc.conf`
+    return os.path.join(krb_paths(krb_path_mode)["kdc_dir_path"], ".k5.%s" % (krb_realm,))
@@ -0,0 +1,169 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Import of an existing realm in one bulk step: a `kdb5_util dump` of the old
+# KDC is loaded with `kdb5_util load` and compared with a dump of the loaded
+# database afterwards. Principals without keys to keep (a plain list of names)
+# are created by one `kadmin.local` process reading all requests from stdin
+# instead of one process per principal.
+
+from __future__ import absolute_import
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+import plac
+from openafs_setup.openafs_setup_paths import KRB_PATH_MODES, stash_file_path, kadmin_local, kdb5_util
+from openafs_setup.openafs_setup_executor import EXECUTOR_LOCAL, Deadline, create_executor, run_pipeline
+from openafs_setup.openafs_setup_output import create_output_buffer, format_tail
+
+logger = logging.getLogger(__name__)
+
+load_step_timeout_default = 86400
+# fields of a `princ` record of the dump format which precede the TL data
+princ_fixed_field_count = 15
+
+def parse_dump_principal(line):
+    """Parses a `princ` record of a `kdb5_util dump` into the tuple `(name,
+    key_count, key_digest)` where `key_digest` is a digest of the key data
+    which stays the same as long as the keys and the master key are the same.
+    Returns `None` for other records (e.g. `policy`)."""
+    fields = line.rstrip("\n").split("\t")
+    if len(fields) < princ_fixed_field_count or fields[0] != "princ":
+        return None
+    tl_data_count = int(fields[3])
+    key_count = int(fields[4])
+    name = fields[6]
+    key_fields = fields[princ_fixed_field_count+3*tl_data_count:]
+    # the last field is the extra data, not part of the keys
+    key_digest = hashlib.sha1(str.join("\t", key_fields[:-1]).encode("utf-8")).hexdigest()
+    return (name, key_count, key_digest)
+
+def read_dump_principals(dump_file_path):
+    """Reads the principals of a dump file line by line into a dictionary
+    mapping names to `(key_count, key_digest)`."""
+    ret_value = {}
+    with open(dump_file_path, "r") as dump_file:
+        for line in dump_file:
+            principal = parse_dump_principal(line)
+            if principal is not None:
+                ret_value[principal[0]] = principal[1:]
+    return ret_value
+
+def compare_principals(expected, actual):
+    """Returns the tuple `(missing, changed)` of the sorted names of principals
+    of `expected` which are missing in `actual` or whose keys differ."""
+    missing = sorted([name for name in expected.keys() if not name in actual])
+    changed = sorted([name for (name, keys) in expected.items() if name in actual and actual[name] != keys])
+    return (missing, changed)
+
+def addprinc_requests(principals_file_path, krb_realm):
+    """Yields `kadmin.local` requests creating the principals listed one per
+    line in `principals_file_path` with random keys."""
+    with open(principals_file_path, "r") as principals_file:
+        for line in principals_file:
+            name = line.strip()
+            if name == "" or name.startswith("#"):
+                continue
+            if not "@" in name:
+                name = "%s@%s" % (name, krb_realm)
+            yield "addprinc -randkey %s\n" % (name,)
+
+def __run_batch__(cmds, stdin_file_path, step_name, deadline, step_timeout):
+    output_buffer = create_output_buffer(step_name)
+    try:
+        if stdin_file_path is None:
+            returncodes = run_pipeline([cmds], deadline=deadline, step_timeout=step_timeout, step_name=step_name, output_buffer=output_buffer)
+        else:
+            with open(stdin_file_path, "r") as stdin_file:
+                returncodes = run_pipeline([cmds], stdin=stdin_file, deadline=deadline, step_timeout=step_timeout, step_name=step_name, output_buffer=output_buffer)
+    finally:
+        output_buffer.close()
+    if returncodes != [0]:
+        raise RuntimeError("'%s' returned non-zero code %d, %s" % (str.join(" ", cmds), returncodes[0], format_tail(output_buffer)))
+
+@plac.annotations(krb_path_mode=plac.Annotation("The pathes to use for kerberos", "positional", type=str, choices=KRB_PATH_MODES),
+    krb_realm=plac.Annotation("The kerberos realm", "positional"),
+    dump_file_path=plac.Annotation("A `kdb5_util dump` of the old KDC to load", "option"),
+    principals_file_path=plac.Annotation("A file listing principals (one per line) to create with random keys instead of loading a dump", "option"),
+    stash_file=plac.Annotation("The master key stash file of the old KDC which is installed before the load (the dump's keys are encrypted with it)", "option"),
+    update=plac.Annotation("A flag indicating that the dump ought to be merged into the existing database instead of replacing it", "flag"),
+    step_timeout=plac.Annotation("The time in seconds the load may take", "option", type=float),
+)
+def import_realm(krb_path_mode, krb_realm, dump_file_path=None, principals_file_path=None, stash_file=None, update=False, step_timeout=load_step_timeout_default):
+    if (dump_file_path is None) == (principals_file_path is None):
+        raise ValueError("exactly one of dump_file_path and principals_file_path has to be specified")
+    deadline = Deadline()
+    local_executor = create_executor(EXECUTOR_LOCAL, "localhost", deadline=deadline, step_timeout=step_timeout)
+    start_time = time.time()
+    tmp_dir_path = tempfile.mkdtemp()
+    try:
+        if dump_file_path is not None:
+            expected_principals = read_dump_principals(dump_file_path)
+            logger.info("read %d principals from '%s' in %f s" % (len(expected_principals), dump_file_path, time.time()-start_time))
+            if stash_file is not None:
+                shutil.copy(stash_file, stash_file_path(krb_path_mode, krb_realm))
+            load_cmds = [kdb5_util, "load"]
+            if update:
+                load_cmds.append("-update")
+            load_cmds.append(dump_file_path)
+            __run_batch__(load_cmds, None, "load of %s" % (dump_file_path,), deadline, step_timeout)
+        else:
+            requests_file_path = os.path.join(tmp_dir_path, "requests")
+            request_count = 0
+            with open(requests_file_path, "w") as requests_file:
+                for request in addprinc_requests(principals_file_path, krb_realm):
+                    requests_file.write(request)
+                    request_count += 1
+            __run_batch__([kadmin_local], requests_file_path, "creation of %d principals" % (request_count,), deadline, step_timeout)
+            expected_principals = None
+        logger.info("loaded principals in %f s" % (time.time()-start_time,))
+
+        # verification with a dump of the loaded database which reproduces
+        # the key data of the imported dump as long as the master key is the
+        # same
+        verification_dump_file_path = os.path.join(tmp_dir_path, "verification")
+        local_executor.check_call([kdb5_util, "dump", verification_dump_file_path])
+        actual_principals = read_dump_principals(verification_dump_file_path)
+        if expected_principals is None:
+            expected_names = set([request.split()[-1] for request in addprinc_requests(principals_file_path, krb_realm)])
+            missing = sorted(expected_names-set(actual_principals.keys()))
+            changed = []
+            keyless = sorted([name for name in expected_names if name in actual_principals and actual_principals[name][0] == 0])
+        else:
+            (missing, changed) = compare_principals(expected_principals, actual_principals)
+            keyless = []
+        if len(missing)+len(changed)+len(keyless) > 0:
+            raise RuntimeError("import verification failed: %d principals missing (e.g. %s), %d with changed keys (e.g. %s), %d without keys (e.g. %s)" % (len(missing), str(missing[:5]), len(changed), str(changed[:5]), len(keyless), str(keyless[:5])))
+        logger.info("imported and verified %d principals (%d in the database) in %f s" % (len(expected_principals) if expected_principals is not None else len(expected_names), len(actual_principals), time.time()-start_time))
+    finally:
+        shutil.rmtree(tmp_dir_path)
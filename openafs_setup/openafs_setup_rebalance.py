@@ -0,0 +1,288 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Online rebalancing of RW volumes across the partitions of all fileservers.
+# A greedy plan moves volumes from the fullest partitions to the emptiest ones
+# as long as this reduces the imbalance (the difference of the highest and
+# lowest utilization in percent) with a bounded number of moves. The moves are
+# run with `vos move` (which keeps the volumes online) concurrently with
+# limits per server and partition and an optional bandwidth cap. The plan and the finished moves are
+# checkpointed, so that an interrupted run continues where it stopped.
+
+from __future__ import absolute_import
+import json
+import logging
+import os
+import threading
+import time
+import plac
+import openafs_setup.openafs_setup_globals as openafs_setup_globals
+from openafs_setup.openafs_setup_paths import PATH_MODES, openafs_paths
+from openafs_setup.openafs_setup_executor import EXECUTOR_LOCAL, parallel_default, Deadline, create_executor, run_parallel, ServerLimiter
+from openafs_setup.openafs_setup_vos import parse_vos_examine, parse_vos_partinfo, iter_vos_listvol
+from openafs_setup.openafs_setup_capacity import partition_key
+from openafs_setup.openafs_setup_replication import same_server
+
+logger = logging.getLogger(__name__)
+
+checkpoint_file_path_default = os.path.join(openafs_setup_globals.state_dir_path_default, "rebalance.json")
+max_moves_default = 20
+tolerance_default = 5.0 # in percent of the partition size
+min_free_default = 10.0 # in percent of the partition size
+per_server_default = 2
+per_partition_default = 1
+move_step_timeout_default = 24*3600 # moves of large volumes take hours
+
+def gather_layout(local_executor, vos, fileservers, parallel=parallel_default):
+    """Runs `vos partinfo` and `vos listvol` on all `fileservers` concurrently
+    and returns the tuple `(partitions, volumes)`. `partitions` maps
+    `server:partition` to dictionaries with the keys `server`, `partition`,
+    `total` and `used` (in KB), `volumes` is the list of the online RW volumes
+    (see `iter_vos_listvol`) with the additional key `server`."""
+    def __gather_server__(fileserver):
+        partinfo = parse_vos_partinfo(local_executor.check_output([vos, "partinfo", fileserver, "-localauth"]).splitlines())
+        volumes = [volume for volume in iter_vos_listvol(local_executor.check_output([vos, "listvol", fileserver, "-localauth"]).splitlines()) if volume["type"] == "RW" and volume["status"] == "On-line"]
+        return (partinfo, volumes)
+    server_results = run_parallel(__gather_server__, fileservers, parallel=parallel)
+    partitions = {}
+    volumes = []
+    for (fileserver, (partinfo, server_volumes)) in server_results.items():
+        for (partition, (free, total)) in partinfo.items():
+            partitions[partition_key(fileserver, partition)] = {"server": fileserver, "partition": partition, "total": total, "used": total-free}
+        for volume in server_volumes:
+            volume["server"] = fileserver
+            volumes.append(volume)
+    return (partitions, volumes)
+
+def utilization(partition):
+    if partition["total"] == 0:
+        return 0.0
+    return float(partition["used"])/partition["total"]
+
+def imbalance(partitions):
+    """The difference of the highest and lowest utilization in percent."""
+    utilizations = [utilization(partition) for partition in partitions.values() if partition["total"] > 0]
+    if len(utilizations) == 0:
+        return 0.0
+    return 100.0*(max(utilizations)-min(utilizations))
+
+def plan_moves(partitions, volumes, max_moves=max_moves_default, tolerance=tolerance_default, min_free=min_free_default):
+    """Plans at most `max_moves` moves of `volumes` (see `gather_layout`)
+    until the imbalance of `partitions` is below `tolerance` percent. Every
+    step moves the volume of the fullest partition to the partition below the
+    average utilization which reduces the sum of the squared utilizations
+    most while keeping `min_free` percent of the target free. Every volume is
+    moved once at most. Returns the list of moves which are dictionaries with
+    the keys `volume`, `size`, `from_server`, `from_partition`, `to_server`
+    and `to_partition`."""
+    partitions = dict([(key, dict(partition)) for (key, partition) in partitions.items() if partition["total"] > 0])
+    if len(partitions) < 2:
+        return []
+    average = float(sum([partition["used"] for partition in partitions.values()]))/sum([partition["total"] for partition in partitions.values()])
+    partition_volumes = {}
+    for volume in volumes:
+        partition_volumes.setdefault(partition_key(volume["server"], volume["partition"]), []).append(volume)
+    ret_value = []
+    while len(ret_value) < max_moves and imbalance(partitions) > tolerance:
+        best = None # tuple `(improvement, volume, source_key, target_key)`
+        # the fullest partition which still has volumes to move
+        for source_key in sorted(partitions.keys(), key=lambda key: utilization(partitions[key]), reverse=True):
+            if len(partition_volumes.get(source_key, [])) > 0:
+                break
+        else:
+            break
+        source = partitions[source_key]
+        for (target_key, target) in partitions.items():
+            if target_key == source_key or utilization(target) >= average:
+                continue
+            for volume in partition_volumes[source_key]:
+                if target["total"]-target["used"]-volume["size"] < target["total"]*min_free/100.0:
+                    continue
+                source_utilization = float(source["used"]-volume["size"])/source["total"]
+                target_utilization = float(target["used"]+volume["size"])/target["total"]
+                improvement = utilization(source)**2+utilization(target)**2-source_utilization**2-target_utilization**2
+                if improvement > 0 and (best is None or improvement > best[0]):
+                    best = (improvement, volume, source_key, target_key)
+        if best is None:
+            break
+        (improvement, volume, source_key, target_key) = best
+        partition_volumes[source_key].remove(volume)
+        partitions[source_key]["used"] -= volume["size"]
+        partitions[target_key]["used"] += volume["size"]
+        ret_value.append({
+            "volume": volume["name"],
+            "size": volume["size"],
+            "from_server": partitions[source_key]["server"],
+            "from_partition": partitions[source_key]["partition"],
+            "to_server": partitions[target_key]["server"],
+            "to_partition": partitions[target_key]["partition"],
+        })
+    return ret_value
+
+def planned_partitions(partitions, moves):
+    """Returns a copy of `partitions` with the usage after `moves`."""
+    ret_value = dict([(key, dict(partition)) for (key, partition) in partitions.items()])
+    for move in moves:
+        ret_value[partition_key(move["from_server"], move["from_partition"])]["used"] -= move["size"]
+        ret_value[partition_key(move["to_server"], move["to_partition"])]["used"] += move["size"]
+    return ret_value
+
+class BandwidthLimiter(object):
+    """Caps the average transfer rate by admitting transfers of `size` KB not
+    faster than `rate` KB/s allows (`vos move` can't be throttled itself)."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.next_time = 0
+        self.lock = threading.Lock()
+
+    def admit(self, size, deadline):
+        """Waits until a transfer of `size` KB may start. Returns `True` if
+        the deadline expired meanwhile."""
+        if self.rate is None:
+            return deadline.is_expired()
+        with self.lock:
+            start_time = max(time.time(), self.next_time)
+            self.next_time = start_time+float(size)/self.rate
+        while time.time() < start_time:
+            if deadline.wait(start_time-time.time()):
+                return True
+        return False
+
+def load_checkpoint(checkpoint_file_path):
+    """Returns the checkpoint dictionary with the keys `moves` and `done` (the
+    moved volumes) or `None` if there's none."""
+    if not os.path.exists(checkpoint_file_path):
+        return None
+    with open(checkpoint_file_path, "r") as checkpoint_file:
+        return json.load(checkpoint_file)
+
+def save_checkpoint(checkpoint, checkpoint_file_path):
+    checkpoint_file_parent_path = os.path.dirname(checkpoint_file_path)
+    if not os.path.exists(checkpoint_file_parent_path):
+        os.makedirs(checkpoint_file_parent_path)
+    tmp_file_path = "%s.tmp" % (checkpoint_file_path,)
+    with open(tmp_file_path, "w") as tmp_file:
+        json.dump(checkpoint, tmp_file, indent=2, sort_keys=True)
+    os.rename(tmp_file_path, checkpoint_file_path)
+
+def move_volume(local_executor, vos, move):
+    """Moves the volume of `move` unless it has been moved already (e.g. by
+    an interrupted run before the checkpoint was saved). Returns `False` if
+    the volume is neither at the source nor at the target anymore."""
+    volume_info = parse_vos_examine(local_executor.check_output([vos, "examine", move["volume"], "-localauth"]).splitlines())
+    rw_sites = [site for site in volume_info["sites"] if site["type"] == "RW"]
+    def __at__(server, partition):
+        return any([same_server(site["server"], server) and site["partition"] == partition for site in rw_sites])
+    if __at__(move["to_server"], move["to_partition"]):
+        logger.info("%s is already on %s %s" % (move["volume"], move["to_server"], move["to_partition"]))
+        return True
+    if not __at__(move["from_server"], move["from_partition"]):
+        logger.warn("%s isn't on %s %s anymore, skipping its move" % (move["volume"], move["from_server"], move["from_partition"]))
+        return False
+    local_executor.check_call([vos, "move", "-id", move["volume"], "-fromserver", move["from_server"], "-frompartition", move["from_partition"], "-toserver", move["to_server"], "-topartition", move["to_partition"], "-localauth"])
+    return True
+
+def run_moves(local_executor, vos, checkpoint, checkpoint_file_path, deadline, parallel=parallel_default, per_server=per_server_default, per_partition=per_partition_default, bandwidth=None):
+    """Runs the moves of `checkpoint` which aren't done yet concurrently.
+    Every move holds a slot of the source and target server and partition,
+    the slots are acquired in a fixed order in order to avoid deadlocks."""
+    server_limiter = ServerLimiter(per_server)
+    partition_limiter = ServerLimiter(per_partition)
+    bandwidth_limiter = BandwidthLimiter(bandwidth)
+    checkpoint_lock = threading.Lock()
+    pending_moves = [move for move in checkpoint["moves"] if not move["volume"] in checkpoint["done"]]
+    def __move__(volume):
+        move = [move for move in pending_moves if move["volume"] == volume][0]
+        semaphores = [server_limiter.semaphore(server) for server in sorted(set([move["from_server"], move["to_server"]]))]
+        semaphores += [partition_limiter.semaphore(key) for key in sorted(set([partition_key(move["from_server"], move["from_partition"]), partition_key(move["to_server"], move["to_partition"])]))]
+        acquired = []
+        try:
+            for semaphore in semaphores:
+                semaphore.acquire()
+                acquired.append(semaphore)
+            if bandwidth_limiter.admit(move["size"], deadline):
+                raise deadline.exceeded("deadline expired before the move of %s" % (volume,))
+            start_time = time.time()
+            moved = move_volume(local_executor, vos, move)
+        finally:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+        if moved:
+            logger.info("moved %s (%d K) from %s %s to %s %s in %f s" % (volume, move["size"], move["from_server"], move["from_partition"], move["to_server"], move["to_partition"], time.time()-start_time))
+        with checkpoint_lock:
+            checkpoint["done"].append(volume)
+            save_checkpoint(checkpoint, checkpoint_file_path)
+        return moved
+    return run_parallel(__move__, [move["volume"] for move in pending_moves], parallel=parallel)
+
+def format_move(move):
+    return "%s (%d K): %s %s -> %s %s" % (move["volume"], move["size"], move["from_server"], move["from_partition"], move["to_server"], move["to_partition"])
+
+@plac.annotations(path_mode=plac.Annotation("The path mode of the OpenAFS installation", "positional", type=str, choices=PATH_MODES),
+    max_moves=plac.Annotation("The maximum number of volume moves of the plan", "option", type=int),
+    tolerance=plac.Annotation("The difference of the highest and lowest partition utilization in percent which is accepted", "option", type=float),
+    min_free=plac.Annotation("The free space in percent which a target partition keeps after a move", "option", type=float),
+    parallel=plac.Annotation("The maximum number of concurrent moves", "option", type=int),
+    per_server=plac.Annotation("The maximum number of concurrent moves from or to one fileserver", "option", type=int),
+    per_partition=plac.Annotation("The maximum number of concurrent moves from or to one partition", "option", type=int),
+    bandwidth=plac.Annotation("The average transfer rate in KB/s all moves together may use (no limit if omitted)", "option", type=float),
+    checkpoint_file_path=plac.Annotation("The file recording the plan and the finished moves", "option"),
+    replan=plac.Annotation("A flag indicating that a new plan ought to be created even if the checkpoint contains unfinished moves", "flag"),
+    dry_run=plac.Annotation("A flag indicating that the plan ought to be shown only", "flag"),
+    step_timeout=plac.Annotation("The time in seconds one move may take", "option", type=float),
+    timeout=plac.Annotation("The time in seconds the whole rebalancing may take (no limit if omitted)", "option", type=float),
+    fileservers=plac.Annotation("The fileservers whose partitions ought to be balanced"),
+)
+def rebalance_volumes(path_mode, max_moves=max_moves_default, tolerance=tolerance_default, min_free=min_free_default, parallel=parallel_default, per_server=per_server_default, per_partition=per_partition_default, bandwidth=None, checkpoint_file_path=checkpoint_file_path_default, replan=False, dry_run=False, step_timeout=move_step_timeout_default, timeout=None, *fileservers):
+    vos = openafs_paths(path_mode)["vos"]
+    deadline = Deadline(timeout)
+    local_executor = create_executor(EXECUTOR_LOCAL, "localhost", deadline=deadline, step_timeout=step_timeout)
+    checkpoint = load_checkpoint(checkpoint_file_path)
+    if checkpoint is not None and not replan and len(checkpoint["done"]) < len(checkpoint["moves"]):
+        logger.info("continuing the plan of the checkpoint with %d of %d moves done" % (len(checkpoint["done"]), len(checkpoint["moves"])))
+    else:
+        if len(fileservers) == 0:
+            raise ValueError("at least one fileserver has to be specified")
+        (partitions, volumes) = gather_layout(local_executor, vos, fileservers, parallel=parallel)
+        moves = plan_moves(partitions, volumes, max_moves=max_moves, tolerance=tolerance, min_free=min_free)
+        logger.info("planned %d moves of %d K reducing the imbalance from %.1f %% to %.1f %%" % (len(moves), sum([move["size"] for move in moves]), imbalance(partitions), imbalance(planned_partitions(partitions, moves))))
+        checkpoint = {"moves": moves, "done": []}
+        if not dry_run:
+            save_checkpoint(checkpoint, checkpoint_file_path)
+    for move in checkpoint["moves"]:
+        if not move["volume"] in checkpoint["done"]:
+            logger.info("%s %s" % ("would move" if dry_run else "moving", format_move(move)))
+    if dry_run:
+        return checkpoint["moves"]
+    start_time = time.time()
+    moved = run_moves(local_executor, vos, checkpoint, checkpoint_file_path, deadline, parallel=parallel, per_server=per_server, per_partition=per_partition, bandwidth=bandwidth)
+    logger.info("moved %d volumes in %f s" % (len([volume for volume in moved if moved[volume]]), time.time()-start_time))
+    return checkpoint["moves"]
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Read-only replication of volumes: adds RO sites on every fileserver and
+# releases the volumes on a bounded worker pool. Volumes whose RW volume didn't
+# change since the last release and which have no unreleased sites are skipped.
+
+from __future__ import absolute_import
+import logging
+import json
+import os
+import threading
+import time
+import plac
+import openafs_setup.openafs_setup_globals as openafs_setup_globals
+from openafs_setup.openafs_setup_paths import PATH_MODES, openafs_paths
+from openafs_setup.openafs_setup_executor import EXECUTOR_LOCAL, parallel_default, step_timeout_default, Deadline, create_executor, run_parallel
+from openafs_setup.openafs_setup_vos import parse_vos_examine, normalize_partition
+
+logger = logging.getLogger(__name__)
+
+root_volumes = ["root.afs", "root.cell"]
+release_state_file_path_default = os.path.join(openafs_setup_globals.state_dir_path_default, "release-state.json")
+
+def same_server(server, other_server):
+    """Checks whether two server names refer to the same server assuming that
+    `vos` might report fully qualified names for short names or vice versa."""
+    server = server.lower()
+    other_server = other_server.lower()
+    return server == other_server or server.startswith("%s." % (other_server,)) or other_server.startswith("%s." % (server,))
+
+def missing_ro_sites(volume_info, fileservers):
+    """Returns the fileservers of `fileservers` which don't have a RO site of
+    the volume described by `volume_info` (see `parse_vos_examine`) on any
+    partition (OpenAFS allows only one RO site per server)."""
+    ro_sites = [site for site in volume_info["sites"] if site["type"] == "RO"]
+    return [fileserver for fileserver in fileservers if not any([same_server(site["server"], fileserver) for site in ro_sites])]
+
+def needs_release(volume_info, released_last_update):
+    """A volume needs to be released if one of its RO sites isn't up to date
+    or its RW volume changed since the last release (`released_last_update`
+    being the `Last Update` date at that time or `None`)."""
+    if any([site["flags"] is not None for site in volume_info["sites"] if site["type"] == "RO"]):
+        return True
+    return volume_info["last_update"] != released_last_update
+
+def load_release_state(release_state_file_path):
+    if not os.path.exists(release_state_file_path):
+        return {}
+    with open(release_state_file_path, "r") as release_state_file:
+        return json.load(release_state_file)
+
+def save_release_state(release_state, release_state_file_path):
+    release_state_file_parent_path = os.path.dirname(release_state_file_path)
+    if not os.path.exists(release_state_file_parent_path):
+        os.makedirs(release_state_file_parent_path)
+    tmp_file_path = "%s.tmp" % (release_state_file_path,)
+    with open(tmp_file_path, "w") as tmp_file:
+        json.dump(release_state, tmp_file, indent=2, sort_keys=True)
+    os.rename(tmp_file_path, release_state_file_path)
+
+def replicate(vos, volumes, fileservers, partition, release_state, deadline=None, step_timeout=step_timeout_default, parallel=parallel_default, force=False):
+    """Adds missing RO sites of `volumes` on `partition` of all `fileservers`
+    and releases the volumes which need it. Volumes are processed
+    concurrently, the sites of one volume are added sequentially because they
+    lock the same VLDB entry. Updates and returns `release_state`."""
+    local_executor = create_executor(EXECUTOR_LOCAL, "localhost", deadline=deadline, step_timeout=step_timeout)
+    release_state_lock = threading.Lock()
+    def __replicate_volume__(volume):
+        volume_info = parse_vos_examine(local_executor.check_output([vos, "examine", volume, "-localauth"]).splitlines())
+        new_sites = missing_ro_sites(volume_info, fileservers)
+        for fileserver in new_sites:
+            local_executor.check_call([vos, "addsite", fileserver, partition, volume, "-localauth"])
+        with release_state_lock:
+            released_last_update = release_state.get(volume)
+        if not force and len(new_sites) == 0 and not needs_release(volume_info, released_last_update):
+            logger.info("skipping release of %s which didn't change since the last release" % (volume,))
+            return False
+        local_executor.check_call([vos, "release", volume, "-localauth"])
+        with release_state_lock:
+            release_state[volume] = volume_info["last_update"]
+        return True
+    start_time = time.time()
+    released = run_parallel(__replicate_volume__, volumes, parallel=parallel)
+    logger.info("released %d of %d volumes in %f s" % (len([volume for volume in released if released[volume]]), len(volumes), time.time()-start_time))
+    return release_state
+
+@plac.annotations(path_mode=plac.Annotation("The path mode of the OpenAFS installation", "positional", type=str, choices=PATH_MODES),
+    volumes=plac.Annotation("A comma separated list of volumes to replicate in addition to `root.afs` and `root.cell`", "option"),
+    partition=plac.Annotation("The partition to add the RO sites on", "option"),
+    parallel=plac.Annotation("The maximum number of volumes to process concurrently", "option", type=int),
+    release_state_file_path=plac.Annotation("The file recording the state of the RW volumes at their last release", "option"),
+    force=plac.Annotation("A flag indicating that volumes ought to be released even if they didn't change", "flag"),
+    step_timeout=plac.Annotation("The time in seconds every command may take", "option", type=float),
+    timeout=plac.Annotation("The time in seconds the whole replication may take (no limit if omitted)", "option", type=float),
+    fileservers=plac.Annotation("The fileservers to add RO sites on"),
+)
+def replicate_volumes(path_mode, volumes="", partition="/vicepa", parallel=parallel_default, release_state_file_path=release_state_file_path_default, force=False, step_timeout=step_timeout_default, timeout=None, *fileservers):
+    if len(fileservers) == 0:
+        raise ValueError("at least one fileserver has to be specified")
+    all_volumes = list(root_volumes)
+    for volume in volumes.split(","):
+        if volume != "" and not volume in all_volumes:
+            all_volumes.append(volume)
+    release_state = load_release_state(release_state_file_path)
+    try:
+        replicate(openafs_paths(path_mode)["vos"], all_volumes, fileservers, normalize_partition(partition), release_state, deadline=Deadline(timeout), step_timeout=step_timeout, parallel=parallel, force=force)
+    finally:
+        # keeps the state of volumes released before a failure
+        save_release_state(release_state, release_state_file_path)
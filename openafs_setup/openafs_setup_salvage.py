@@ -0,0 +1,186 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Salvager parallelism of the `dafs` instance derived from the number of
+# partitions and cores, and on-demand salvages of partitions or volumes on
+# several fileservers at once.
+
+from __future__ import absolute_import
+import logging
+import os
+import re
+import threading
+import time
+import plac
+from openafs_setup.openafs_setup_globals import split_list
+from openafs_setup.openafs_setup_paths import PATH_MODES, openafs_paths
+from openafs_setup.openafs_setup_executor import EXECUTOR_LOCAL, EXECUTORS, parallel_default, Deadline, create_executor, run_parallel, ServerLimiter
+from openafs_setup.openafs_setup_vos import parse_vos_examine, parse_vos_listpart, normalize_partition
+
+logger = logging.getLogger(__name__)
+
+getconf = "getconf"
+salvager_parallel_max = 32 # limit of `salvager -parallel` and `salvageserver -parallel`
+salvageserver_parallel_min = 4 # default of `salvageserver -parallel`
+salvage_step_timeout_default = 86400
+per_server_default = 4
+orphans_default = "attach" # keeps orphaned files in the volume root instead of removing them
+
+def salvager_parallelism(partition_count, cpu_count):
+    """Returns the `-parallel` value of `salvager` which salvages one
+    partition per process, so there's no use in more processes than
+    partitions or cores."""
+    return min(max(partition_count, 1), max(cpu_count, 1), salvager_parallel_max)
+
+def salvageserver_parallelism(cpu_count):
+    """Returns the `-parallel` value of `salvageserver` which salvages single
+    volumes on demand, one per core, but at least as many as by default."""
+    return min(max(cpu_count, salvageserver_parallel_min), salvager_parallel_max)
+
+def server_cpu_count(server_executor):
+    """Returns the number of online cores of the server of
+    `server_executor`."""
+    return int(server_executor.check_output([getconf, "_NPROCESSORS_ONLN"]).strip())
+
+def local_partition_count():
+    return len([file_name for file_name in os.listdir("/") if re.match("^vicep[a-z]{1,2}$", file_name)])
+
+def dafs_instance_cmds(dafileserver, davolserver, salvageserver, dasalvager, partition_count, cpu_count):
+    """Creates the command lines of the `dafs` bos instance with salvage
+    parallelism configured for `partition_count` partitions and `cpu_count`
+    cores. Salvage logs are kept per run (`-datelog`)."""
+    salvage_options = "-datelog -orphans %s" % (orphans_default,)
+    return [dafileserver,
+        davolserver,
+        "%s -parallel %d %s" % (salvageserver, salvageserver_parallelism(cpu_count), salvage_options),
+        "%s -parallel %d %s" % (dasalvager, salvager_parallelism(partition_count, cpu_count), salvage_options)]
+
+def bos_salvage_cmds(bos, server, partition=None, volume=None, parallel=None, force_dafs=False):
+    """Creates the `bos salvage` command for `volume` on `partition`, for
+    `partition` or for all partitions of `server` if both are `None`."""
+    ret_value = [bos, "salvage", "-server", server]
+    if partition is None:
+        ret_value.append("-all")
+    else:
+        ret_value += ["-partition", partition]
+    if volume is not None:
+        ret_value += ["-volume", volume]
+    if parallel is not None:
+        ret_value += ["-parallel", str(parallel)]
+    ret_value += ["-orphans", orphans_default]
+    if force_dafs:
+        ret_value.append("-forceDAFS")
+    ret_value.append("-localauth")
+    return ret_value
+
+def volume_site(local_executor, vos, volume):
+    """Returns the tuple `(server, partition)` holding `volume` (the RW site
+    for backup volumes which are stored next to it)."""
+    volume_info = parse_vos_examine(local_executor.check_output([vos, "examine", volume, "-localauth"]).splitlines())
+    site_type = "RO" if volume.endswith(".readonly") else "RW"
+    sites = [site for site in volume_info["sites"] if site["type"] == site_type]
+    if len(sites) == 0:
+        raise ValueError("volume '%s' doesn't have a %s site" % (volume, site_type))
+    if len(sites) > 1:
+        logger.warning("salvaging only the RO site of '%s' on %s, salvage the other sites by partition" % (volume, sites[0]["server"]))
+    return (sites[0]["server"], normalize_partition(sites[0]["partition"]))
+
+class SalvageProgress(object):
+    """Logs the progress of concurrent salvages."""
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.start_time = time.time()
+        self.lock = threading.Lock()
+
+    def finished(self, description):
+        with self.lock:
+            self.done += 1
+            logger.info("salvaged %s (%d/%d after %f s)" % (description, self.done, self.total, time.time()-self.start_time))
+
+@plac.annotations(path_mode=plac.Annotation("The path mode of the OpenAFS installation", "positional", type=str, choices=PATH_MODES),
+    partitions=plac.Annotation("A comma separated list of partitions to salvage on every fileserver (all if omitted)", "option"),
+    volumes=plac.Annotation("A comma separated list of volumes to salvage instead of partitions (the fileservers are looked up)", "option"),
+    force_dafs=plac.Annotation("A flag allowing to salvage whole partitions of a demand attach fileserver which is shut down meanwhile", "flag"),
+    salvager_parallel=plac.Annotation("The number of partitions salvaged concurrently on one fileserver (the number of partitions or cores of the fileserver if omitted)", "option", type=int),
+    executor=plac.Annotation("How to run commands on the fileservers in order to count their cores (`local` counts the cores of this machine which is useful as stand-in for tests)", "option", type=str, choices=EXECUTORS),
+    parallel=plac.Annotation("The maximum number of salvages to run concurrently", "option", type=int),
+    per_server=plac.Annotation("The maximum number of volumes to salvage concurrently on one fileserver", "option", type=int),
+    step_timeout=plac.Annotation("The time in seconds one salvage may take", "option", type=float),
+    fileservers=plac.Annotation("The fileservers whose partitions ought to be salvaged"),
+)
+def salvage(path_mode, partitions="", volumes="", force_dafs=False, salvager_parallel=None, executor=EXECUTOR_LOCAL, parallel=parallel_default, per_server=per_server_default, step_timeout=salvage_step_timeout_default, *fileservers):
+    paths = openafs_paths(path_mode)
+    bos = paths["bos"]
+    vos = paths["vos"]
+    partitions = [normalize_partition(partition) for partition in split_list(partitions)]
+    volumes = split_list(volumes)
+    deadline = Deadline()
+    local_executor = create_executor(EXECUTOR_LOCAL, "localhost", deadline=deadline, step_timeout=step_timeout)
+    start_time = time.time()
+    if len(volumes) > 0:
+        # `bos salvage` runs the standalone salvager which DAFS only allows
+        # with `-forceDAFS`, the volume is offline while it's salvaged, the
+        # fileserver keeps running
+        volume_sites = run_parallel(lambda volume: volume_site(local_executor, vos, volume), volumes, parallel=parallel)
+        progress = SalvageProgress(len(volumes))
+        server_limiter = ServerLimiter(per_server)
+        def __salvage_volume__(volume):
+            (server, partition) = volume_sites[volume]
+            with server_limiter.semaphore(server):
+                local_executor.check_call(bos_salvage_cmds(bos, server, partition=partition, volume=volume, force_dafs=True))
+            progress.finished("volume %s on %s %s" % (volume, server, partition))
+        run_parallel(__salvage_volume__, volumes, parallel=parallel)
+        logger.info("salvaged %d volumes in %f s" % (len(volumes), time.time()-start_time))
+        return
+    if len(fileservers) == 0:
+        raise ValueError("at least one fileserver or volume has to be specified")
+    if not force_dafs:
+        raise ValueError("salvaging whole partitions shuts the fileserver down, confirm with -force-dafs or salvage single volumes with -volumes")
+    server_partitions = run_parallel(lambda fileserver: parse_vos_listpart(local_executor.check_output([vos, "listpart", fileserver, "-localauth"]).splitlines()), fileservers, parallel=parallel)
+    progress = SalvageProgress(len(fileservers))
+    def __salvage_server__(fileserver):
+        # the fileserver is shut down once for all partitions which are
+        # salvaged by `salvager -parallel`
+        if len(partitions) == 0 or set(server_partitions[fileserver]) <= set(partitions):
+            fileserver_parallel = salvager_parallel
+            if fileserver_parallel is None:
+                fileserver_executor = create_executor(executor, fileserver, deadline=deadline, step_timeout=step_timeout)
+                fileserver_parallel = salvager_parallelism(len(server_partitions[fileserver]), server_cpu_count(fileserver_executor))
+            local_executor.check_call(bos_salvage_cmds(bos, fileserver, parallel=fileserver_parallel, force_dafs=True))
+            progress.finished("all %d partitions on %s" % (len(server_partitions[fileserver]), fileserver))
+        else:
+            fileserver_partitions = [partition for partition in partitions if partition in server_partitions[fileserver]]
+            for partition in fileserver_partitions:
+                local_executor.check_call(bos_salvage_cmds(bos, fileserver, partition=partition, force_dafs=True))
+            progress.finished("partitions %s on %s" % (str.join(", ", fileserver_partitions), fileserver))
+    run_parallel(__salvage_server__, fileservers, parallel=parallel)
+    logger.info("salvaged %d fileservers in %f s" % (len(fileservers), time.time()-start_time))
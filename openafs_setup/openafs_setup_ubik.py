@@ -0,0 +1,168 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Waiting for the ubik database servers (ptserver, vlserver, buserver) to elect
+# a sync site after they've been (re)started. Protection and volume database
+# operations fail or stall until then.
+
+from __future__ import absolute_import
+import subprocess as sp
+import logging
+import re
+import time
+import plac
+from openafs_setup.openafs_setup_paths import PATH_MODES, openafs_paths
+from openafs_setup.openafs_setup_executor import EXECUTOR_LOCAL, step_timeout_default, Deadline, create_executor
+
+logger = logging.getLogger(__name__)
+
+UBIK_PORTS = {
+    "ptserver": 7002,
+    "vlserver": 7003,
+    "buserver": 7021,
+}
+# recovery state bits `UBIK_RECSYNCSITE` and `UBIK_RECHAVEDB` which are set
+# once the sync site found and holds the best database version
+UBIK_RECOVERY_READY = 0x1 | 0x4
+quorum_timeout_default = 300 # in seconds
+backoff_initial = 0.5
+backoff_factor = 1.5
+backoff_max = 5.0
+
+def parse_udebug(udebug_output):
+    """Parses `udebug` output into a dictionary with the keys `sync_site`
+    (whether the queried server is the sync site), `sync_host` (the sync
+    site known to the queried server or `None`), `recovery_state` (an
+    integer or `None` if not reported) and `db_version` (the version of the
+    queried server's local database as string or `None`)."""
+    ret_value = {"sync_site": False, "sync_host": None, "recovery_state": None, "db_version": None}
+    for line in udebug_output.splitlines():
+        line = line.strip()
+        if line.startswith("I am sync site"):
+            ret_value["sync_site"] = True
+            continue
+        sync_host_match = re.match("^Sync host (?P<host>\\S+) was set", line)
+        if sync_host_match is not None:
+            ret_value["sync_host"] = sync_host_match.group("host")
+            continue
+        recovery_state_match = re.match("^Recovery state (?P<state>[0-9a-fA-F]+)", line)
+        if recovery_state_match is not None:
+            ret_value["recovery_state"] = int(recovery_state_match.group("state"), 16)
+            continue
+        db_version_match = re.match("^Local db version is (?P<version>\\S+)", line)
+        if db_version_match is not None:
+            ret_value["db_version"] = db_version_match.group("version")
+    return ret_value
+
+def has_quorum(udebug_states):
+    """Checks whether the parsed `udebug` output of all database servers of a
+    service (`None` for unreachable servers) shows an elected sync site which
+    holds the database while a majority of servers is reachable. Returns the
+    sync site's server or `None`."""
+    sync_sites = [server for (server, udebug_state) in udebug_states.items() if udebug_state is not None and udebug_state["sync_site"]]
+    if len(sync_sites) != 1:
+        return None
+    sync_site = sync_sites[0]
+    recovery_state = udebug_states[sync_site]["recovery_state"]
+    if recovery_state is None or recovery_state & UBIK_RECOVERY_READY != UBIK_RECOVERY_READY:
+        return None
+    reachable_count = len([udebug_state for udebug_state in udebug_states.values() if udebug_state is not None])
+    if reachable_count*2 <= len(udebug_states):
+        # a majority of servers needs to be up in order to keep the quorum
+        return None
+    return sync_site
+
+def has_converged(udebug_states):
+    """Checks whether all database servers of a service are reachable and
+    report the same local database version, i.e. the sync site distributed
+    its database to every site."""
+    if any([udebug_state is None or udebug_state["db_version"] is None for udebug_state in udebug_states.values()]):
+        return False
+    return len(set([udebug_state["db_version"] for udebug_state in udebug_states.values()])) == 1
+
+def wait_for_quorum(udebug, db_servers, services, deadline=None, step_timeout=step_timeout_default, timeout=quorum_timeout_default, restart_time=None, converged=False):
+    """Polls `udebug` for every service of `services` on all `db_servers` with
+    exponential backoff until each has a sync site (and every server reports
+    the same database version if `converged` is `True`). The services are
+    polled together so that the time until each of them elected its sync
+    site is measured independently. Returns a dictionary mapping the services to
+    the time in seconds the election took since `restart_time` (a timestamp
+    of `time.time()` taken when the servers were (re)started, the start of
+    the wait if `None`). Raises `DeadlineExceeded` if `timeout` or `deadline`
+    expire before."""
+    if deadline is None:
+        deadline = Deadline()
+    for service in services:
+        if not service in UBIK_PORTS:
+            raise ValueError("service '%s' isn't a ubik database service (has to be one of %s)" % (service, str(sorted(UBIK_PORTS.keys()))))
+    local_executor = create_executor(EXECUTOR_LOCAL, "localhost", deadline=deadline, step_timeout=step_timeout)
+    start_time = time.time()
+    if restart_time is None:
+        restart_time = start_time
+    ret_value = {}
+    with deadline.step("ubik quorum of %s" % (str.join(", ", services),)):
+        backoff = backoff_initial
+        while True:
+            for service in [service for service in services if not service in ret_value]:
+                udebug_states = {}
+                for db_server in db_servers:
+                    try:
+                        udebug_states[db_server] = parse_udebug(local_executor.check_output([udebug, db_server, str(UBIK_PORTS[service])]))
+                    except sp.CalledProcessError as ex:
+                        logger.debug("udebug of %s on %s failed: %s" % (service, db_server, str(ex)))
+                        udebug_states[db_server] = None
+                sync_site = has_quorum(udebug_states)
+                if sync_site is None:
+                    continue
+                if converged and not has_converged(udebug_states):
+                    logger.debug("%s elected sync site %s, but not all servers have its database yet" % (service, sync_site))
+                    continue
+                ret_value[service] = time.time()-restart_time
+                logger.info("%s elected sync site %s after %f s" % (service, sync_site, ret_value[service]))
+            pending_services = [service for service in services if not service in ret_value]
+            if len(pending_services) == 0:
+                break
+            if time.time()-start_time+backoff > timeout:
+                raise deadline.exceeded("%s didn't elect a sync site within %s s" % (str.join(", ", pending_services), str(timeout)))
+            if deadline.wait(backoff):
+                deadline.check()
+            backoff = min(backoff*backoff_factor, backoff_max)
+    return ret_value
+
+@plac.annotations(path_mode=plac.Annotation("The path mode of the OpenAFS installation", "positional", type=str, choices=PATH_MODES),
+    timeout=plac.Annotation("The time in seconds to wait for the election at most", "option", type=float),
+    services=plac.Annotation("A comma separated list of ubik services to wait for", "option"),
+    converged=plac.Annotation("A flag causing to wait until all database servers report the same database version as well", "flag"),
+    db_servers=plac.Annotation("The database servers of the cell (defaults to the local machine)"),
+)
+def wait_for_quorum_command(path_mode, timeout=quorum_timeout_default, services="ptserver,vlserver", converged=False, *db_servers):
+    if len(db_servers) == 0:
+        db_servers = ["localhost"]
+    return wait_for_quorum(openafs_paths(path_mode)["udebug"], db_servers, services.split(","), timeout=timeout, converged=converged)
@@ -0,0 +1,186 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Reconciliation of Kerberos principals and protection database users, groups
+# and memberships with a desired state snapshot. The current state is read in
+# one pass per listing and indexed in sets so that only the differences are
+# applied. Users, groups and principals which are missing from the desired
+# state are only deleted on request.
+
+from __future__ import absolute_import
+import logging
+import json
+import re
+import time
+import plac
+from openafs_setup.openafs_setup_paths import PATH_MODES, openafs_paths, kadmin_local
+from openafs_setup.openafs_setup_executor import EXECUTOR_LOCAL, parallel_default, step_timeout_default, Deadline, create_executor, run_parallel
+
+logger = logging.getLogger(__name__)
+
+# entries which are created by the setup or OpenAFS itself and are never
+# removed by a reconciliation
+PROTECTED_USERS = set(["admin", "anonymous"])
+PROTECTED_GROUP_PREFIX = "system:"
+DELETE_ACTIONS = ["deletegroup", "deleteuser", "delprinc"]
+# instances of administrator principals which are written as `x.y` in the
+# protection database (user names like `jane.doe` contain dots as well)
+PTS_INSTANCES = set(["admin", "root"])
+
+def __has_instance__(name):
+    """Checks whether `name` is a principal with an instance (`x/y` in
+    Kerberos, `x.y` with one of `PTS_INSTANCES` in the protection database)
+    which belongs to a service or an administrator rather than a user."""
+    return "/" in name or ("." in name and name.rsplit(".", 1)[1] in PTS_INSTANCES)
+
+def parse_listprincs(lines):
+    """Yields the user principal names (without realm) of `listprincs`
+    output, skipping service principals like `afs/<cell>` or `K/M`."""
+    for line in lines:
+        line = line.strip()
+        if line == "" or line.startswith("Authenticating as") or "/" in line:
+            continue
+        yield line.split("@")[0]
+
+def parse_pts_listentries(lines):
+    """Yields the names of `pts listentries` output."""
+    for line in lines:
+        line_match = re.match("^(?P<name>\\S+)\\s+-?[0-9]+\\s+-?[0-9]+\\s+-?[0-9]+\\s*$", line)
+        if line_match is not None:
+            yield line_match.group("name")
+
+def parse_pts_membership(lines):
+    """Yields the members of `pts membership` output of a group."""
+    for line in lines:
+        if line.startswith("Members of") or line.strip() == "":
+            continue
+        yield line.strip()
+
+def reconcile_actions(desired_users, desired_groups, krb_users, pts_users, pts_groups, pts_memberships, delete_missing=False):
+    """Computes the actions to turn the current state (sets of Kerberos users,
+    pts users and groups and a dictionary mapping managed existing groups to
+    sets of members) into the desired one (a set of users and a dictionary
+    mapping groups to sets of members). Users, groups and principals which
+    aren't desired are only deleted if `delete_missing` is `True`, protected
+    ones and principals with an instance never. Returns a list of tuples
+    `(action, name, arguments)` in the order they need to be applied."""
+    ret_value = []
+    for user in sorted(desired_users-krb_users):
+        ret_value.append(("addprinc", user, None))
+    for user in sorted(desired_users-pts_users):
+        ret_value.append(("createuser", user, None))
+    for group in sorted(set(desired_groups.keys())-pts_groups):
+        ret_value.append(("creategroup", group, None))
+    for (group, desired_members) in sorted(desired_groups.items()):
+        current_members = pts_memberships.get(group, set())
+        members_added = desired_members-current_members
+        if len(members_added) > 0:
+            ret_value.append(("adduser", group, sorted(members_added)))
+        members_removed = current_members-desired_members
+        if len(members_removed) > 0:
+            ret_value.append(("removeuser", group, sorted(members_removed)))
+    if not delete_missing:
+        return ret_value
+    for group in sorted(pts_groups-set(desired_groups.keys())):
+        if not group.startswith(PROTECTED_GROUP_PREFIX):
+            ret_value.append(("deletegroup", group, None))
+    for user in sorted(pts_users-desired_users-PROTECTED_USERS):
+        if not __has_instance__(user):
+            ret_value.append(("deleteuser", user, None))
+    for user in sorted(krb_users-desired_users-PROTECTED_USERS):
+        if not __has_instance__(user):
+            ret_value.append(("delprinc", user, None))
+    return ret_value
+
+def __action_cmds__(action, name, arguments, pts):
+    if action == "addprinc":
+        return [kadmin_local, "-q", "addprinc -randkey %s" % (name,)]
+    elif action == "delprinc":
+        return [kadmin_local, "-q", "delprinc -force %s" % (name,)]
+    elif action == "createuser":
+        return [pts, "createuser", "-name", name, "-localauth"]
+    elif action == "creategroup":
+        return [pts, "creategroup", "-name", name, "-localauth"]
+    elif action in ["deleteuser", "deletegroup"]:
+        return [pts, "delete", "-nameorid", name, "-localauth"]
+    elif action == "adduser":
+        return [pts, "adduser", "-user"]+arguments+["-group", name, "-localauth"]
+    elif action == "removeuser":
+        return [pts, "removeuser", "-user"]+arguments+["-group", name, "-localauth"]
+    else:
+        raise ValueError("action '%s' isn't supported" % (action,))
+
+@plac.annotations(path_mode=plac.Annotation("The path mode of the OpenAFS installation", "positional", type=str, choices=PATH_MODES),
+    desired_state_file_path=plac.Annotation("A JSON file containing the desired state as `{\"users\": [<user>, ...], \"groups\": {<group>: [<member>, ...], ...}}`", "positional"),
+    dry_run=plac.Annotation("A flag indicating that the actions ought to be logged only", "flag"),
+    delete_missing=plac.Annotation("A flag indicating that users, groups and principals which aren't in the desired state ought to be deleted", "flag"),
+    max_deletions=plac.Annotation("The maximum number of deletions, the reconciliation is aborted before applying any action if more are necessary", "option", type=int),
+    parallel=plac.Annotation("The maximum number of group memberships to read concurrently", "option", type=int),
+    step_timeout=plac.Annotation("The time in seconds every command may take", "option", type=float),
+)
+def reconcile_users(path_mode, desired_state_file_path, dry_run=False, delete_missing=False, max_deletions=None, parallel=parallel_default, step_timeout=step_timeout_default):
+    """Reconciles Kerberos principals and protection database users, groups
+    and memberships with a desired state. Every run lists all principals,
+    users and groups once and reads the membership of every desired group
+    which exists (one `pts membership` per group, `-parallel` at a time)
+    because changes made outside of the reconciliation can only be detected
+    that way, i.e. the run time grows with the number of desired groups."""
+    pts = openafs_paths(path_mode)["pts"]
+    start_time = time.time()
+    with open(desired_state_file_path, "r") as desired_state_file:
+        desired_state = json.load(desired_state_file)
+    desired_users = set(desired_state.get("users", []))
+    desired_groups = dict([(group, set(members)) for (group, members) in desired_state.get("groups", {}).items()])
+    unknown_members = set([member for members in desired_groups.values() for member in members])-desired_users-PROTECTED_USERS
+    if len(unknown_members) > 0:
+        raise ValueError("group members %s aren't desired users" % (str(sorted(unknown_members)),))
+
+    deadline = Deadline()
+    local_executor = create_executor(EXECUTOR_LOCAL, "localhost", deadline=deadline, step_timeout=step_timeout)
+    krb_users = set(parse_listprincs(local_executor.check_output([kadmin_local, "-q", "listprincs"]).splitlines()))
+    pts_users = set(parse_pts_listentries(local_executor.check_output([pts, "listentries", "-users", "-localauth"]).splitlines()))
+    pts_groups = set(parse_pts_listentries(local_executor.check_output([pts, "listentries", "-groups", "-localauth"]).splitlines()))
+    # memberships are only relevant for desired groups which exist already
+    def __membership__(group):
+        return set(parse_pts_membership(local_executor.check_output([pts, "membership", "-nameorid", group, "-localauth"]).splitlines()))
+    pts_memberships = run_parallel(__membership__, sorted(set(desired_groups.keys()) & pts_groups), parallel=parallel)
+    logger.info("read %d principals, %d users and %d groups in %f s" % (len(krb_users), len(pts_users), len(pts_groups), time.time()-start_time))
+
+    actions = reconcile_actions(desired_users, desired_groups, krb_users, pts_users, pts_groups, pts_memberships, delete_missing=delete_missing)
+    deletion_count = len([action for (action, name, arguments) in actions if action in DELETE_ACTIONS])
+    if max_deletions is not None and deletion_count > max_deletions:
+        raise ValueError("reconciliation requires %d deletions which exceeds the maximum of %d" % (deletion_count, max_deletions))
+    for (action, name, arguments) in actions:
+        if dry_run:
+            logger.info("would %s %s%s" % (action, name, "" if arguments is None else " %s" % (str(arguments),)))
+        else:
+            local_executor.check_call(__action_cmds__(action, name, arguments, pts))
+    logger.info("%s %d actions in %f s" % ("planned" if dry_run else "applied", len(actions), time.time()-start_time))
+    return actions
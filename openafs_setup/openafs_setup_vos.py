@@ -0,0 +1,121 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#    Dieses Programm ist Freie Software: Sie können es unter den Bedingungen
+#    der GNU General Public License, wie von der Free Software Foundation,
+#    Version 3 der Lizenz oder (nach Ihrer Wahl) jeder neueren
+#    veröffentlichten Version, weiterverbreiten und/oder modifizieren.
+#
+#    Dieses Programm wird in der Hoffnung, dass es nützlich sein wird, aber
+#    OHNE JEDE GEWÄHRLEISTUNG, bereitgestellt; sogar ohne die implizite
+#    Gewährleistung der MARKTFÄHIGKEIT oder EIGNUNG FÜR EINEN BESTIMMTEN ZWECK.
+#    Siehe die GNU General Public License für weitere Details.
+#
+#    Sie sollten eine Kopie der GNU General Public License zusammen mit diesem
+#    Programm erhalten haben. Wenn nicht, siehe <http://www.gnu.org/licenses/>.
+
+
+# Parsers for the output of `vos` commands which are shared by the volume
+# management commands.
+
+from __future__ import absolute_import
+import re
+
+def parse_vos_examine(lines):
+    """Parses `vos examine` output into a dictionary with the keys `name`,
+    `id`, `type`, `size` (in KB), `status`, `last_update` (the string after
+    `Last Update` or `None`) and `sites` (a list of dictionaries with the keys
+    `server`, `partition`, `type` (`RW`, `RO` or `BK`) and `flags` (e.g.
+    `Not released`, `Old release` or `None`))."""
+    ret_value = {"name": None, "id": None, "type": None, "size": None, "status": None, "last_update": None, "sites": []}
+    for line in lines:
+        header_match = re.match("^(?P<name>\\S+)\\s+(?P<id>[0-9]+)\\s+(?P<type>RW|RO|BK)\\s+(?P<size>[0-9]+) K\\s+(?P<status>\\S+)", line)
+        if header_match is not None and ret_value["name"] is None:
+            ret_value["name"] = header_match.group("name")
+            ret_value["id"] = int(header_match.group("id"))
+            ret_value["type"] = header_match.group("type")
+            ret_value["size"] = int(header_match.group("size"))
+            ret_value["status"] = header_match.group("status")
+            continue
+        last_update_match = re.match("^\\s+Last Update\\s+(?P<date>.+?)\\s*$", line)
+        if last_update_match is not None and ret_value["last_update"] is None:
+            ret_value["last_update"] = last_update_match.group("date")
+            continue
+        site = parse_vldb_site(line)
+        if site is not None:
+            ret_value["sites"].append(site)
+    return ret_value
+
+def parse_vldb_site(line):
+    """Parses a site line of `vos examine` or `vos listvldb` output (`server
+    <server> partition <partition> <type> Site[ -- <flags>]`) into a
+    dictionary or returns `None` if `line` isn't a site line."""
+    site_match = re.match("^\\s+server (?P<server>\\S+) partition (?P<partition>\\S+) (?P<type>RW|RO|BK) Site(\\s+--\\s+(?P<flags>.+?))?\\s*$", line)
+    if site_match is None:
+        return None
+    return {
+        "server": site_match.group("server"),
+        "partition": site_match.group("partition"),
+        "type": site_match.group("type"),
+        "flags": site_match.group("flags"),
+    }
+
+def normalize_partition(partition):
+    """Converts the partition notations `a`, `vicepa` and `/vicepa` to
+    `/vicepa`."""
+    if partition.startswith("/vicep"):
+        return partition
+    if partition.startswith("vicep"):
+        return "/%s" % (partition,)
+    return "/vicep%s" % (partition,)
+
+def parse_vos_listpart(lines):
+    """Returns the list of partitions of `vos listpart` output."""
+    ret_value = []
+    for line in lines:
+        ret_value += re.findall("/vicep[a-z]{1,2}", line)
+    return ret_value
+
+def parse_vos_partinfo(lines):
+    """Parses `vos partinfo` output into a dictionary mapping partitions to
+    tuples `(free, total)` in KB."""
+    ret_value = {}
+    for line in lines:
+        partinfo_match = re.match("^Free space on partition (?P<partition>/vicep[a-z]{1,2}): (?P<free>[0-9]+) K blocks out of total (?P<total>[0-9]+)", line.strip())
+        if partinfo_match is not None:
+            ret_value[partinfo_match.group("partition")] = (int(partinfo_match.group("free")), int(partinfo_match.group("total")))
+    return ret_value
+
+def iter_vos_listvol(lines):
+    """Parses `vos listvol` output and yields a dictionary with the keys
+    `name`, `id`, `type`, `size` (in KB), `status` and `partition` per
+    volume."""
+    partition = None
+    for line in lines:
+        partition_match = re.match("^Total number of volumes on server \\S+ partition (?P<partition>/vicep[a-z]{1,2}):", line)
+        if partition_match is not None:
+            partition = partition_match.group("partition")
+            continue
+        header_match = re.match("^(?P<name>\\S+)\\s+(?P<id>[0-9]+)\\s+(?P<type>RW|RO|BK)\\s+(?P<size>[0-9]+) K\\s+(?P<status>\\S+)", line)
+        if header_match is not None:
+            yield {
+                "name": header_match.group("name"),
+                "id": int(header_match.group("id")),
+                "type": header_match.group("type"),
+                "size": int(header_match.group("size")),
+                "status": header_match.group("status"),
+                "partition": partition,
+            }